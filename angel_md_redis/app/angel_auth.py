@@ -1,8 +1,15 @@
 import pyotp
 from SmartApi import SmartConnect
 from .config import ANGEL_API_KEY, ANGEL_CLIENT_CODE, ANGEL_PIN, ANGEL_TOTP_SECRET
+from .session_cache import SessionManager, auth_header, make_entry
 
-def login():
+_manager = None
+
+
+def _generate_session():
+    """
+    Full login: generateSession with TOTP. -> (SmartConnect, session cache entry)
+    """
     if not (ANGEL_API_KEY and ANGEL_CLIENT_CODE and ANGEL_PIN and ANGEL_TOTP_SECRET):
         raise RuntimeError("Missing Angel env vars. Check .env.example")
 
@@ -19,5 +26,23 @@ def login():
     if not jwt or not feed:
         raise RuntimeError(f"Missing jwt/feed token: {sess}")
 
-    auth_token = jwt if str(jwt).lower().startswith("bearer ") else f"Bearer {jwt}"
-    return obj, auth_token, feed
+    return obj, make_entry(ANGEL_CLIENT_CODE, jwt, sess["data"].get("refreshToken"), feed)
+
+
+def session_manager() -> SessionManager:
+    global _manager
+    if _manager is None:
+        _manager = SessionManager(_generate_session)
+    return _manager
+
+
+def login(force: bool = False):
+    """
+    -> (SmartConnect, "Bearer <jwt>", feed_token)
+
+    Reuses the cached session (SESSION_CACHE) across components and restarts;
+    force=True after an auth failure gets a fresh one (shared if another
+    process just renewed it).
+    """
+    obj, entry = session_manager().get(force=force)
+    return obj, auth_header(entry["jwt"]), entry["feed"]
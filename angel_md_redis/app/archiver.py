@@ -1,4 +1,6 @@
 import os
+import queue
+import threading
 import time
 from datetime import datetime, timezone
 from pathlib import Path
@@ -15,6 +17,14 @@ except Exception as e:
         "pyarrow is required for Parquet archiving. Install: pip install pyarrow pandas"
     ) from e
 
+from .hot_tier import HotTierWriter, stream_folder
+from .manifest import WATERMARK_NAME, ManifestCache, StreamWatermark, fsync_dir, fsync_path, parse_id
+from .catalog import Catalog
+from .redis_store import ShardRouter, shard_stream
+from .config import OPT_SHARDS, SHARD_REDIS_URLS
+from .schemas import SCHEMAS, explode_greeks, stream_kind, stream_table
+from .profiling import Profiler, clock
+
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
@@ -63,12 +73,37 @@ class StreamParquetArchiver:
     Reads from a stream using a consumer group, batches messages,
     writes Parquet files to disk, then XACKs those message IDs.
 
+    Flushes are double-buffered: a full buffer is handed to a background
+    writer thread and reading continues into a fresh one. At most
+    `max_inflight` buffers may be queued; beyond that `_flush()` blocks,
+    which is the backpressure on the Redis reader. IDs of a buffer are
+    XACKed by the writer only after its files are fsynced and renamed.
+
     Output partitioning:
       data_lake/
         stream=md_ticks_opt/
           dt=YYYY-MM-DD/
             underlying=IOC/   (or symbol=...)
               part-<ts>-<n>.parquet
+
+    Every partition folder has a commit manifest (app/manifest.py) with the
+    Redis ID range of each file, and the stream folder a watermark of the
+    highest fully committed ID. Batches redelivered after a crash between
+    write and XACK are skipped and ACKed, so committed files never hold an
+    ID twice.
+
+    Known streams are written with the typed schemas in app/schemas.py
+    (numbers as int64/float64, symbols dictionary-encoded, "" as null);
+    md:greeks:snap is exploded to one row per contract.
+
+    With `hot_dir` set, batches are appended to the Arrow IPC hot tier
+    (one segment per stream/day, see app/hot_tier.py) instead of Parquet
+    parts; `run_hot_compact.py` turns a finished day into the layout above.
+
+    With `shard` set (OPT_SHARDS > 1), the archiver reads `{stream}:{shard}`
+    from that shard's Redis endpoint and writes into the unsharded layout
+    above. Shards split by underlying and so do partition folders, so each
+    folder still has a single writer.
     """
 
     def __init__(
@@ -84,6 +119,10 @@ class StreamParquetArchiver:
         partition_by_symbol: bool = True,
         compression: str = "zstd",
         delete_after_ack: bool = False,
+        max_inflight: int = 2,
+        fsync: bool = True,
+        hot_dir: Optional[str] = None,
+        shard: Optional[int] = None,
     ):
         self.stream = stream
         self.group = group
@@ -97,21 +136,64 @@ class StreamParquetArchiver:
         self.partition_by_symbol = bool(partition_by_symbol)
         self.compression = compression
         self.delete_after_ack = bool(delete_after_ack)
+        self.max_inflight = max(1, int(max_inflight))
+        self.fsync = bool(fsync)
+
+        # Typed columns for known streams (app/schemas.py); others stay as strings
+        self.kind = stream_kind(stream)
+        self.explode_greeks = self.kind == "greeks"
+
+        self.hot: Optional[HotTierWriter] = None
+        if hot_dir:
+            self.hot = HotTierWriter(hot_dir, stream, fsync=self.fsync)
 
         redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        # physical stream read from Redis; self.stream names the lake folder
+        self.read_stream = stream
+        self.shard = shard
+        if shard is not None:
+            if OPT_SHARDS <= 1 or not self.partition_by_symbol:
+                raise ValueError("shard needs OPT_SHARDS > 1 and partition_by_symbol (one writer per folder)")
+            redis_url = ShardRouter(stream, OPT_SHARDS, SHARD_REDIS_URLS).url(shard)
+            self.read_stream = shard_stream(stream, shard)
         self.r = redis.from_url(redis_url, decode_responses=False)
 
         self._buf_rows: List[Dict[str, Any]] = []
         self._buf_ids: List[str] = []
+        self._last_id = "0"
         self._last_flush = time.time()
 
+        # Background writer: (rows, ids) buffers waiting to be written + ACKed
+        self._write_q: "queue.Queue[Optional[Tuple[List[Dict[str, Any]], List[str]]]]" = queue.Queue(
+            maxsize=self.max_inflight
+        )
+        self._writer_error: Optional[BaseException] = None
+        self._writer: Optional[threading.Thread] = None
+        self._part_seq = 0
+
         # Controls which "day" each message is assigned to (default: UTC).
         # Example: ARCHIVE_TZ=Asia/Kolkata
         self.partition_tz = _validate_tz_name(os.getenv("ARCHIVE_TZ", "UTC"))
 
         self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.manifests = ManifestCache(fsync=self.fsync)
+        self.watermark = StreamWatermark(
+            self.out_dir / stream_folder(stream),
+            fsync=self.fsync,
+            name=WATERMARK_NAME if shard is None else f"_watermark.{shard}.json",
+        )
+        # data_lake/_catalog.sqlite: per-file stats + token bloom for query planning (app/catalog.py)
+        self.catalog: Optional[Catalog] = Catalog(str(self.out_dir)) if os.getenv("ARCHIVE_CATALOG", "1") == "1" else None
         self._ensure_group()
 
+        # stage timings (reader and writer thread) + on-demand stack sampling (app/profiling.py)
+        self.prof = Profiler("archiver", tag=self.read_stream)
+        self._sp_read = self.prof.stage("read")        # XREADGROUP, incl. blocking
+        self._sp_ingest = self.prof.stage("ingest")
+        self._sp_handoff = self.prof.stage("handoff")  # _flush blocked on max_inflight
+        self._sp_write = self.prof.stage("write")      # Parquet / hot tier, fsync, manifest
+        self._sp_ack = self.prof.stage("ack")          # watermark + XACK
+
     # ---------------------------
     # Redis consumer group helpers
     # ---------------------------
@@ -121,8 +203,8 @@ class StreamParquetArchiver:
         Create consumer group if missing. mkstream=True creates stream if absent.
         """
         try:
-            self.r.xgroup_create(self.stream, self.group, id="0", mkstream=True)
-            print(f"[ARCHIVER] created group '{self.group}' for stream '{self.stream}'")
+            self.r.xgroup_create(self.read_stream, self.group, id="0", mkstream=True)
+            print(f"[ARCHIVER] created group '{self.group}' for stream '{self.read_stream}'")
         except redis.exceptions.ResponseError as e:
             msg = str(e)
             if "BUSYGROUP" in msg:
@@ -136,31 +218,54 @@ class StreamParquetArchiver:
           - '>' for new messages
           - '0' to read pending (PEL)
         """
-        return self.r.xreadgroup(
+        t = clock()
+        resp = self.r.xreadgroup(
             groupname=self.group,
             consumername=self.consumer,
-            streams={self.stream: stream_id},
+            streams={self.read_stream: stream_id},
             count=self.read_count,
             block=self.block_ms if stream_id == ">" else 0,
         )
+        self._sp_read.lap(t, sum(len(msgs) for _s, msgs in resp or ()))
+        return resp
 
     # ---------------------------
     # Parquet writing
     # ---------------------------
 
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        if self.kind in SCHEMAS:
+            return stream_table(df, self.kind)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
     def _append_parquet(self, folder: Path, df: pd.DataFrame) -> None:
-        folder.mkdir(parents=True, exist_ok=True)
+        manifest = self.manifests.get(folder)
+        table = manifest.new_rows(self._to_table(df))
+        if table.num_rows == 0:
+            return
 
-        # atomic-ish write: write tmp then rename
+        # atomic-ish write: write tmp then rename, committed in the manifest after
+        folder.mkdir(parents=True, exist_ok=True)
         ts = int(time.time() * 1000)
-        tmp_path = folder / f".tmp-part-{ts}.parquet"
-        final_path = folder / f"part-{ts}.parquet"
+        self._part_seq += 1
+        tmp_path = folder / f".tmp-part-{ts}-{self._part_seq}.parquet"
+        final_path = folder / f"part-{ts}-{self._part_seq}.parquet"
 
-        table = pa.Table.from_pandas(df, preserve_index=False)
+        manifest.begin(final_path.name)
         pq.write_table(table, tmp_path, compression=self.compression)
+        if self.fsync:
+            fsync_path(tmp_path)
         tmp_path.replace(final_path)
+        if self.fsync:
+            fsync_dir(folder)
+        nbytes = final_path.stat().st_size
+        rec = manifest.commit(final_path.name, table, nbytes)
+        if self.catalog is not None:
+            self.catalog.add(final_path, table, nbytes, rec)
 
     def _write_batch(self, rows: List[Dict[str, Any]]) -> None:
+        if self.explode_greeks:
+            rows = explode_greeks(rows)
         if not rows:
             return
 
@@ -171,9 +276,6 @@ class StreamParquetArchiver:
             df["ts_recv"] = int(time.time() * 1000)
         df["ts_recv"] = pd.to_numeric(df["ts_recv"], errors="coerce").fillna(int(time.time() * 1000)).astype("int64")
 
-        # Stream partition name safe for folders
-        stream_folder = f"stream={self.stream.replace(':', '_')}"
-
         # Optional: partition by underlying/symbol
         key_col: Optional[str] = None
         if self.partition_by_symbol:
@@ -188,9 +290,15 @@ class StreamParquetArchiver:
             ts = ts.dt.tz_convert(self.partition_tz)
         df["_dt"] = ts.dt.strftime("%Y-%m-%d")
 
+        if self.hot is not None:
+            for dt_str, part_dt in df.groupby("_dt", sort=True):
+                part_dt = part_dt.drop(columns=["_dt"], errors="ignore")
+                self.hot.append(dt_str, self._to_table(part_dt))
+            return
+
         for dt_str, part_dt in df.groupby("_dt", sort=True):
             part_dt = part_dt.drop(columns=["_dt"], errors="ignore")
-            base = self.out_dir / stream_folder / f"dt={dt_str}"
+            base = self.out_dir / stream_folder(self.stream) / f"dt={dt_str}"
 
             if key_col:
                 for key, part_sym in part_dt.groupby(key_col, sort=False):
@@ -204,34 +312,111 @@ class StreamParquetArchiver:
     # ---------------------------
 
     def _flush(self) -> None:
+        """
+        Hand the current buffer to the background writer and start a fresh one.
+        Blocks while `max_inflight` buffers are already queued (backpressure).
+        """
+        self._raise_writer_error()
         if not self._buf_rows:
             self._last_flush = time.time()
             return
 
-        # Write first; ACK only if write succeeds
-        self._write_batch(self._buf_rows)
+        self._start_writer()
+        t = clock()
+        self._write_q.put((self._buf_rows, self._buf_ids))
+        self._sp_handoff.lap(t, len(self._buf_rows))
+
+        # Swap in fresh buffers; the writer owns the old ones now
+        self._buf_rows = []
+        self._buf_ids = []
+        self._last_flush = time.time()
+
+    def _commit_buffer(self, rows: List[Dict[str, Any]], ids: List[str]) -> None:
+        # IDs arrive in stream order: only a redelivered batch starts at/below the watermark
+        if ids and parse_id(ids[0]) <= self.watermark.id:
+            wm = self.watermark.id
+            rows = [r for r in rows if parse_id(r["_redis_id"]) > wm]
+            print(f"[ARCHIVER] stream={self.stream}: {len(ids) - len(rows)} redelivered IDs already committed")
+
+        # Write first; advance the watermark and ACK only if the write succeeds
+        t = clock()
+        self._write_batch(rows)
+        t = self._sp_write.lap(t, len(rows))
+        if ids:
+            self.watermark.advance(parse_id(ids[-1]))
 
         # ACK IDs
-        if self._buf_ids:
-            self.r.xack(self.stream, self.group, *self._buf_ids)
+        if ids:
+            self.r.xack(self.read_stream, self.group, *ids)
             if self.delete_after_ack:
                 # Optional cleanup (usually not required)
-                self.r.xdel(self.stream, *self._buf_ids)
+                self.r.xdel(self.read_stream, *ids)
+            self._sp_ack.lap(t, len(ids))
 
-        self._buf_rows.clear()
-        self._buf_ids.clear()
-        self._last_flush = time.time()
+    def _writer_loop(self) -> None:
+        while True:
+            item = self._write_q.get()
+            try:
+                if item is None:
+                    return
+                if self._writer_error is not None:
+                    # Leave remaining buffers un-ACKed; they are redelivered on restart
+                    continue
+                rows, ids = item
+                self._commit_buffer(rows, ids)
+            except BaseException as e:
+                print(f"[ARCHIVER] writer failed stream={self.stream}: {e!r}")
+                self._writer_error = e
+            finally:
+                self._write_q.task_done()
+
+    def _start_writer(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            return
+        self._writer = threading.Thread(
+            target=self._writer_loop, name=f"archiver-writer-{self.stream}", daemon=True
+        )
+        self._writer.start()
+
+    def _raise_writer_error(self) -> None:
+        if self._writer_error is not None:
+            raise RuntimeError(f"archiver writer failed for stream={self.stream}") from self._writer_error
+
+    def _wait_writes(self) -> None:
+        """
+        Block until every handed-off buffer is written and ACKed.
+        """
+        self._write_q.join()
+        self._raise_writer_error()
+
+    def close(self) -> None:
+        """
+        Flush what is buffered, wait for in-flight writes and stop the writer.
+        """
+        self._flush()
+        self._wait_writes()
+        if self._writer is not None and self._writer.is_alive():
+            self._write_q.put(None)
+            self._writer.join()
+        if self.hot is not None:
+            self.hot.close()
+        if self.catalog is not None:
+            self.catalog.close()
+        self.prof.stop()
 
     def _ingest_messages(self, resp) -> int:
+        t = clock()
         n = 0
         for _stream_name, msgs in resp:
             for msg_id, fields in msgs:
                 row = _decode_dict(fields)
                 row["_redis_id"] = _decode(msg_id)
-                row["_stream"] = self.stream
+                row["_stream"] = self.read_stream
                 self._buf_rows.append(row)
-                self._buf_ids.append(_decode(msg_id))
+                self._buf_ids.append(row["_redis_id"])
+                self._last_id = row["_redis_id"]
                 n += 1
+        self._sp_ingest.lap(t, n)
         return n
 
     # ---------------------------
@@ -240,29 +425,40 @@ class StreamParquetArchiver:
 
     def run_forever(self) -> None:
         print(
-            f"[ARCHIVER] running stream={self.stream} group={self.group} consumer={self.consumer} "
-            f"batch_size={self.batch_size} flush_sec={self.flush_sec}"
+            f"[ARCHIVER] running stream={self.read_stream} group={self.group} consumer={self.consumer} "
+            f"batch_size={self.batch_size} flush_sec={self.flush_sec} max_inflight={self.max_inflight}"
         )
+        self.prof.start()
 
-        # 1) Drain pending (if any) first
-        while True:
-            resp = self._xreadgroup("0")
-            got = self._ingest_messages(resp) if resp else 0
-            if got == 0:
-                break
-            if len(self._buf_rows) >= self.batch_size:
-                self._flush()
-
-        self._flush()
-
-        # 2) Tail new messages forever
-        while True:
-            resp = self._xreadgroup(">")
-            if resp:
-                self._ingest_messages(resp)
-
-            # flush conditions
-            if len(self._buf_rows) >= self.batch_size:
-                self._flush()
-            elif (time.time() - self._last_flush) >= self.flush_sec:
-                self._flush()
+        try:
+            # 1) Drain pending (if any) first. The cursor moves past what was read:
+            # handed-off buffers are ACKed asynchronously, so "0" would return them again.
+            cursor = "0"
+            while True:
+                resp = self._xreadgroup(cursor)
+                got = self._ingest_messages(resp) if resp else 0
+                if got == 0:
+                    break
+                cursor = self._last_id
+                if len(self._buf_rows) >= self.batch_size:
+                    self._flush()
+
+            self._flush()
+            # Pending entries must be durable before tailing, otherwise the
+            # "0" read above would see them again after a crash mid-write.
+            self._wait_writes()
+
+            # 2) Tail new messages forever
+            while True:
+                resp = self._xreadgroup(">")
+                if resp:
+                    self._ingest_messages(resp)
+
+                # flush conditions
+                if len(self._buf_rows) >= self.batch_size:
+                    self._flush()
+                elif (time.time() - self._last_flush) >= self.flush_sec:
+                    self._flush()
+        finally:
+            if self._writer_error is None:
+                self.close()
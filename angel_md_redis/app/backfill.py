@@ -0,0 +1,335 @@
+import datetime as dt
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .config import BACKFILL_REQ_PER_SEC, BACKFILL_WORKERS, BACKFILL_MAX_RETRIES
+from .schemas import CANDLES_SCHEMA, to_table
+
+# getCandleData: max days per request for each interval
+MAX_DAYS = {
+    "ONE_MINUTE": 30,
+    "THREE_MINUTE": 60,
+    "FIVE_MINUTE": 100,
+    "TEN_MINUTE": 100,
+    "FIFTEEN_MINUTE": 200,
+    "THIRTY_MINUTE": 200,
+    "ONE_HOUR": 400,
+    "ONE_DAY": 2000,
+}
+
+SESSION_OPEN = "09:15"
+SESSION_CLOSE = "15:30"
+
+# error codes / messages that mean "slow down", retried with backoff
+_RATE_LIMITED = ("AB1004", "AB2001", "exceeding access rate", "too many requests")
+
+
+class RateLimiter:
+    """
+    Thread-safe pacing: at most `per_sec` acquires per second across all
+    workers. `penalize()` pushes every worker back after a rate-limit reply.
+    """
+
+    def __init__(self, per_sec: float):
+        self.interval = 1.0 / max(float(per_sec), 0.01)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            t = max(self._next, now)
+            self._next = t + self.interval
+        if t > now:
+            time.sleep(t - now)
+
+    def penalize(self, sec: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + sec)
+
+
+class Checkpoint:
+    """
+    Finished trading days per instrument (instrument_key -> merged [first, last]
+    ISO day ranges) in a JSON file, rewritten atomically after every chunk.
+    Output files are one per (token, day), so a chunk written but not yet
+    checkpointed is simply rewritten on resume, and a later run over an
+    overlapping range skips the days already done.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.done: Dict[str, List[List[str]]] = {}
+        if self.path.exists():
+            try:
+                done = json.loads(self.path.read_text(encoding="utf-8")).get("done") or {}
+            except Exception as e:
+                print(f"[BACKFILL] ignoring unreadable checkpoint {self.path}: {e}")
+                done = {}
+            if isinstance(done, list):
+                # older checkpoints: one "exchange:token:interval:from:to" key per window
+                for old in done:
+                    key, _, d1 = str(old).rpartition(":")
+                    key, _, d0 = key.rpartition(":")
+                    self._add(key, d0, d1)
+            else:
+                self.done = {k: [list(x) for x in v] for k, v in done.items()}
+
+    def has(self, key: str, day: dt.date) -> bool:
+        d = day.isoformat()
+        return any(a <= d <= b for a, b in self.done.get(key, ()))
+
+    def _add(self, key: str, d0: str, d1: str) -> None:
+        spans = sorted(self.done.get(key, []) + [[d0, d1]])
+        merged = [spans[0]]
+        for a, b in spans[1:]:
+            last = merged[-1]
+            if dt.date.fromisoformat(a) <= dt.date.fromisoformat(last[1]) + dt.timedelta(days=1):
+                last[1] = max(last[1], b)
+            else:
+                merged.append([a, b])
+        self.done[key] = merged
+
+    def mark(self, key: str, d0: dt.date, d1: dt.date) -> None:
+        with self._lock:
+            self._add(key, d0.isoformat(), d1.isoformat())
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".tmp-{self.path.name}")
+            tmp.write_text(json.dumps({"done": self.done}, sort_keys=True), encoding="utf-8")
+            tmp.replace(self.path)
+
+
+def date_chunks(start: dt.date, end: dt.date, max_days: int) -> List[Tuple[dt.date, dt.date]]:
+    """
+    [start, end] inclusive -> consecutive windows of at most `max_days` days.
+    """
+    out = []
+    cur = start
+    while cur <= end:
+        stop = min(cur + dt.timedelta(days=max_days - 1), end)
+        out.append((cur, stop))
+        cur = stop + dt.timedelta(days=1)
+    return out
+
+
+def pending_chunks(start: dt.date, end: dt.date, max_days: int, done: Callable[[dt.date], bool]) -> List[Tuple[dt.date, dt.date]]:
+    """
+    date_chunks over the runs of days in [start, end] that are not `done`.
+    """
+    out: List[Tuple[dt.date, dt.date]] = []
+    run_start = None
+    day = start
+    while day <= end + dt.timedelta(days=1):
+        missing = day <= end and not done(day)
+        if missing and run_start is None:
+            run_start = day
+        elif not missing and run_start is not None:
+            out.extend(date_chunks(run_start, day - dt.timedelta(days=1), max_days))
+            run_start = None
+        day += dt.timedelta(days=1)
+    return out
+
+
+def instrument_key(inst: Dict[str, str], interval: str) -> str:
+    return f"{inst['exchange']}:{inst['token']}:{interval}"
+
+
+def parse_candles(data: Iterable[list], inst: Dict[str, str], interval: str) -> List[Dict[str, Any]]:
+    """
+    getCandleData rows ["2024-01-02T09:15:00+05:30", o, h, l, c, v] -> records.
+    `_dt` is the exchange-local trading date (partition).
+    """
+    out = []
+    for row in data or []:
+        if not row or len(row) < 6:
+            continue
+        ts = dt.datetime.fromisoformat(str(row[0]))
+        out.append({
+            "ts": int(ts.timestamp() * 1000),
+            "token": inst["token"],
+            "symbol": inst.get("symbol", ""),
+            "underlying": inst.get("underlying", ""),
+            "exchange": inst["exchange"],
+            "interval": interval,
+            "o": row[1], "h": row[2], "l": row[3], "c": row[4],
+            "vol": row[5],
+            "_dt": str(row[0])[:10],
+        })
+    return out
+
+
+class CandleBackfiller:
+    """
+    Historical candles for many instruments -> data_lake/, concurrently.
+
+    client: anything with getCandleData(params) -> {"status", "data", ...}
+      (a logged-in SmartConnect, or a stub in tests).
+    instruments: [{"token", "exchange", "symbol", "underlying"?}, ...]
+
+    Every (instrument, date window) is one request, paced by a shared
+    RateLimiter across `workers` threads and retried with backoff on
+    rate-limit replies and errors. Finished trading days go to the
+    checkpoint (today's only once the day is over), so a rerun, or a run over
+    an overlapping range, only fetches the days that are missing.
+
+    Output (typed CANDLES_SCHEMA):
+      data_lake/
+        stream=hist_candles_ONE_MINUTE/
+          dt=YYYY-MM-DD/
+            underlying=IOC/   (options; symbol=... for equities)
+              part-bf-<token>.parquet   (one per token and day, replaced on refetch)
+    """
+
+    def __init__(
+        self,
+        client,
+        interval: str = "ONE_MINUTE",
+        out_dir: str = "data_lake",
+        workers: int = BACKFILL_WORKERS,
+        req_per_sec: float = BACKFILL_REQ_PER_SEC,
+        max_retries: int = BACKFILL_MAX_RETRIES,
+        checkpoint_path: Optional[str] = None,
+        compression: str = "zstd",
+    ):
+        if interval not in MAX_DAYS:
+            raise ValueError(f"Unknown interval {interval!r}, expected one of {sorted(MAX_DAYS)}")
+        self.client = client
+        self.interval = interval
+        self.out_dir = Path(out_dir)
+        self.workers = max(1, int(workers))
+        self.limiter = RateLimiter(req_per_sec)
+        self.max_retries = max(0, int(max_retries))
+        self.compression = compression
+        self.folder = self.out_dir / f"stream=hist_candles_{interval}"
+        self.checkpoint = Checkpoint(Path(checkpoint_path) if checkpoint_path else self.folder / "_checkpoint.json")
+
+    def _fetch(self, inst: Dict[str, str], d0: dt.date, d1: dt.date) -> list:
+        params = {
+            "exchange": inst["exchange"],
+            "symboltoken": inst["token"],
+            "interval": self.interval,
+            "fromdate": f"{d0.isoformat()} {SESSION_OPEN}",
+            "todate": f"{d1.isoformat()} {SESSION_CLOSE}",
+        }
+        for attempt in range(self.max_retries + 1):
+            backoff = min(30.0, 0.5 * 2 ** attempt)
+            self.limiter.acquire()
+            try:
+                resp = self.client.getCandleData(params) or {}
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"[BACKFILL] {inst['token']} {d0}..{d1} error: {e} (retry in {backoff:.1f}s)")
+                time.sleep(backoff)
+                continue
+
+            if resp.get("status"):
+                return resp.get("data") or []
+            msg = f"{resp.get('errorcode', '')} {resp.get('message', '')}"
+            if any(s.lower() in msg.lower() for s in _RATE_LIMITED):
+                self.limiter.penalize(backoff)
+                continue
+            if "no data" in msg.lower():
+                return []
+            if attempt == self.max_retries:
+                raise RuntimeError(f"getCandleData failed: {msg.strip()}")
+            time.sleep(backoff)
+        raise RuntimeError("getCandleData: still rate limited after retries")
+
+    def _write(self, inst: Dict[str, str], rows: List[Dict[str, Any]]) -> None:
+        if inst.get("underlying"):
+            part = f"underlying={inst['underlying']}"
+        else:
+            part = f"symbol={inst.get('symbol') or inst['token']}"
+
+        df = pd.DataFrame(rows)
+        for dt_str, g in df.groupby("_dt", sort=True):
+            folder = self.folder / f"dt={dt_str}" / part
+            folder.mkdir(parents=True, exist_ok=True)
+            name = f"part-bf-{inst['token']}.parquet"
+            tmp = folder / f".tmp-{name}"
+            table = to_table(g.drop(columns=["_dt"]), CANDLES_SCHEMA)
+            pq.write_table(table, tmp, compression=self.compression)
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            tmp.replace(folder / name)
+            # files of older runs were named per window start; this day's rows now live in `name`
+            for old in folder.glob(f"part-bf-{inst['token']}-*.parquet"):
+                old.unlink()
+
+    def _run_chunk(self, inst: Dict[str, str], d0: dt.date, d1: dt.date, key: str) -> int:
+        rows = parse_candles(self._fetch(inst, d0, d1), inst, self.interval)
+        if rows:
+            self._write(inst, rows)
+        # today's candles are still coming in: leave today to the next run
+        last = min(d1, dt.date.today() - dt.timedelta(days=1))
+        if last >= d0:
+            self.checkpoint.mark(key, d0, last)
+        return len(rows)
+
+    def run(self, instruments: List[Dict[str, str]], start: dt.date, end: dt.date) -> Dict[str, int]:
+        days = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+        jobs, skipped = [], 0
+        for inst in instruments:
+            key = instrument_key(inst, self.interval)
+            done = {day for day in days if self.checkpoint.has(key, day)}
+            skipped += len(done)
+            for d0, d1 in pending_chunks(start, end, MAX_DAYS[self.interval], done.__contains__):
+                jobs.append((inst, d0, d1, key))
+
+        stats = {"requests": len(jobs), "skipped": skipped, "rows": 0, "failed": 0}
+        print(f"[BACKFILL] {len(instruments)} instruments {start}..{end} {self.interval}: "
+              f"{len(jobs)} requests ({skipped} instrument-days already done), workers={self.workers}")
+
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as pool:
+            futs = {pool.submit(self._run_chunk, *job): job for job in jobs}
+            for i, fut in enumerate(as_completed(futs), 1):
+                inst, d0, d1, _ = futs[fut]
+                try:
+                    stats["rows"] += fut.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"[BACKFILL] FAILED {inst.get('symbol') or inst['token']} {d0}..{d1}: {e}")
+                if i % 50 == 0 or i == len(jobs):
+                    print(f"[BACKFILL] {i}/{len(jobs)} requests, {stats['rows']} candles, {time.time() - t0:.0f}s")
+        return stats
+
+
+def equity_instruments(symbols: List[str]) -> List[Dict[str, str]]:
+    """
+    symbols.txt names -> NSE equity instruments via ScripMaster.
+    """
+    from .scripmaster import load_scripmaster, resolve_eq_tokens
+
+    eq_map = resolve_eq_tokens(load_scripmaster(), symbols)
+    missing = [s for s in symbols if s not in eq_map]
+    if missing:
+        print(f"[BACKFILL] no NSE token for: {', '.join(missing)}")
+    return [{"token": v["token"], "exchange": v["exchange"], "symbol": s} for s, v in eq_map.items()]
+
+
+def option_instruments(rs) -> List[Dict[str, str]]:
+    """
+    Option contracts the producer resolved (meta:opt:{token} hashes).
+    """
+    out = []
+    for key in rs.r.scan_iter(match="meta:opt:*", count=1000):
+        m = rs.hgetall(key)
+        tok = m.get("token") or key.rsplit(":", 1)[-1]
+        out.append({
+            "token": tok,
+            "exchange": m.get("exchange") or "NFO",
+            "symbol": m.get("tradingsymbol", ""),
+            "underlying": m.get("underlying", ""),
+        })
+    return out
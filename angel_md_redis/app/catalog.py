@@ -0,0 +1,292 @@
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .manifest import MANIFEST_NAME
+
+CATALOG_NAME = "_catalog.sqlite"
+
+# columns identifying an instrument, first present wins
+TOKEN_COLUMNS = ("token", "tradingsymbol", "symbol")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path      TEXT PRIMARY KEY,   -- relative to the lake root
+    stream    TEXT NOT NULL,      -- folder name, e.g. stream=md_ticks_opt
+    dt        TEXT NOT NULL,
+    part_key  TEXT,               -- underlying / symbol
+    part_val  TEXT,
+    rows      INTEGER NOT NULL,
+    bytes     INTEGER NOT NULL,
+    min_ts    INTEGER,
+    max_ts    INTEGER,
+    min_id    TEXT,
+    max_id    TEXT,
+    n_tokens  INTEGER,
+    bloom     BLOB,
+    added_ms  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_stream_dt_ts ON files (stream, dt, part_val, min_ts);
+
+-- which partitions of a day hold a token (exact; the per-file bloom narrows further)
+CREATE TABLE IF NOT EXISTS part_tokens (
+    stream    TEXT NOT NULL,
+    token     TEXT NOT NULL,
+    dt        TEXT NOT NULL,
+    part_val  TEXT NOT NULL,      -- '' when the stream is not partitioned
+    PRIMARY KEY (stream, token, dt, part_val)
+) WITHOUT ROWID;
+"""
+
+
+class Bloom:
+    """
+    Bloom filter over token strings, sized for `n` items at `fp` false positives.
+    Serialized as k (1 byte) + bit array.
+    """
+
+    def __init__(self, n: int, fp: float = 0.01, k: Optional[int] = None, bits: Optional[bytearray] = None):
+        n = max(1, n)
+        if bits is None:
+            m = max(64, int(-n * math.log(fp) / (math.log(2) ** 2)))
+            bits = bytearray((m + 7) // 8)
+        self.bits = bits
+        self.m = len(bits) * 8
+        self.k = k or max(1, round(self.m / n * math.log(2)))
+
+    def _positions(self, item: str):
+        d = hashlib.blake2b(str(item).encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(d[:8], "little")
+        h2 = int.from_bytes(d[8:], "little") | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.m
+
+    def add(self, item: str) -> None:
+        for p in self._positions(item):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.k]) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, b: bytes) -> "Bloom":
+        return cls(1, k=b[0], bits=bytearray(b[1:]))
+
+
+def table_tokens(table: pa.Table) -> List[str]:
+    for col in TOKEN_COLUMNS:
+        if col in table.column_names:
+            arr = table[col]
+            if pa.types.is_dictionary(arr.type):
+                arr = pc.cast(arr, pa.string())
+            return [t for t in pc.unique(arr).to_pylist() if t is not None]
+    return []
+
+
+def _days_between(t0_ms: int, t1_ms: int, max_days: int = 400) -> List[str]:
+    d0 = datetime.fromtimestamp(t0_ms / 1000.0, tz=timezone.utc).date() - timedelta(days=1)
+    d1 = datetime.fromtimestamp(t1_ms / 1000.0, tz=timezone.utc).date() + timedelta(days=1)
+    n = (d1 - d0).days + 1
+    if n > max_days:
+        return []
+    return [(d0 + timedelta(days=i)).isoformat() for i in range(n)]
+
+
+class Catalog:
+    """
+    SQLite index of every committed lake file (data_lake/_catalog.sqlite),
+    filled by the archiver as files are committed: stream, dt, partition,
+    rows, bytes, min/max ts_recv, Redis ID range and a bloom filter of the
+    tokens in the file.
+
+    `plan()` answers "which files can hold token X between t0 and t1" from
+    the index alone: part_tokens maps the token to its (dt, partition)s, the
+    (stream, dt, part_val, min_ts) index gives the files in the time range and
+    the bloom drops files of that partition without the token. No directory
+    listing, no Parquet footers.
+    WAL mode, so the per-stream archivers can write concurrently.
+    """
+
+    def __init__(self, root: str = "data_lake", path: Optional[str] = None):
+        self.root = Path(root)
+        self.path = Path(path) if path else self.root / CATALOG_NAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def _rel(self, path: Path) -> str:
+        try:
+            return str(Path(path).relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def add(self, path: Path, table: pa.Table, nbytes: int, rec: Optional[dict] = None) -> None:
+        """
+        path: the committed file; table: its rows; rec: the manifest commit record.
+        """
+        rec = rec or {}
+        rel = self._rel(path)
+        parts = Path(rel).parts
+        stream = next((p for p in parts if p.startswith("stream=")), "")
+        dt = next((p.split("=", 1)[1] for p in parts if p.startswith("dt=")), "")
+        key, val = None, ""
+        if len(parts) >= 2 and "=" in parts[-2] and not parts[-2].startswith(("dt=", "stream=")):
+            key, val = parts[-2].split("=", 1)
+
+        min_ts, max_ts = rec.get("min_ts"), rec.get("max_ts")
+        if min_ts is None:
+            for col in ("ts_recv", "ts"):
+                if col in table.column_names and table.num_rows:
+                    mm = pc.min_max(table[col])
+                    min_ts, max_ts = mm["min"].as_py(), mm["max"].as_py()
+                    break
+
+        tokens = table_tokens(table)
+        bloom = Bloom(len(tokens))
+        for t in tokens:
+            bloom.add(t)
+
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (rel, stream, dt, key, val, table.num_rows, int(nbytes), min_ts, max_ts,
+                 rec.get("min_id"), rec.get("max_id"), len(tokens), bloom.to_bytes(), int(time.time() * 1000)),
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO part_tokens VALUES (?,?,?,?)",
+                [(stream, str(t), dt, val) for t in tokens],
+            )
+            self.db.commit()
+
+    def plan(
+        self,
+        stream: str,
+        t0_ms: Optional[int] = None,
+        t1_ms: Optional[int] = None,
+        token: Optional[str] = None,
+        part_val: Optional[str] = None,
+        dt_from: Optional[str] = None,
+        dt_to: Optional[str] = None,
+    ) -> List[Path]:
+        """
+        Files of `stream` (config name like md:ticks:opt, or the folder name)
+        that may contain rows of `token` with ts in [t0_ms, t1_ms].
+        """
+        folder = stream if stream.startswith("stream=") else f"stream={stream.replace(':', '_')}"
+        days: List[str] = []
+        if dt_from is None and dt_to is None and t0_ms is not None and t1_ms is not None:
+            # explicit dt list (+-1 day for ARCHIVE_TZ) turns into index equality probes
+            days = _days_between(t0_ms, t1_ms)
+
+        if token is not None:
+            # exact token -> (dt, partition) first, then files of those partitions only
+            sql = ("SELECT f.path, f.bloom FROM part_tokens t JOIN files f"
+                   " ON f.stream = t.stream AND f.dt = t.dt AND f.part_val = t.part_val"
+                   " WHERE t.stream = ? AND t.token = ?")
+            args: list = [folder, str(token)]
+            col = "t."
+        else:
+            sql = "SELECT f.path, f.bloom FROM files f WHERE f.stream = ?"
+            args = [folder]
+            col = "f."
+        if days:
+            sql += f" AND {col}dt IN ({','.join('?' * len(days))})"
+            args.extend(days)
+        if dt_from is not None:
+            sql += f" AND {col}dt >= ?"
+            args.append(dt_from)
+        if dt_to is not None:
+            sql += f" AND {col}dt <= ?"
+            args.append(dt_to)
+        if part_val is not None:
+            sql += f" AND {col}part_val = ?"
+            args.append(part_val)
+        if t0_ms is not None:
+            sql += " AND f.max_ts >= ?"
+            args.append(int(t0_ms))
+        if t1_ms is not None:
+            sql += " AND f.min_ts <= ?"
+            args.append(int(t1_ms))
+        sql += " ORDER BY f.dt, f.min_ts"
+
+        with self._lock:
+            rows = self.db.execute(sql, args).fetchall()
+        out = []
+        for rel, blob in rows:
+            if token is not None and blob and str(token) not in Bloom.from_bytes(blob):
+                continue
+            out.append(self.root / rel)
+        return out
+
+    def read(self, stream: str, t0_ms: int, t1_ms: int, token: Optional[str] = None, columns=None, **kw) -> Optional[pa.Table]:
+        """
+        plan() + read only the matching files, filtered to the exact rows.
+        """
+        tables = []
+        for path in self.plan(stream, t0_ms, t1_ms, token=token, **kw):
+            t = pq.read_table(path, columns=columns)
+            ts_col = "ts_recv" if "ts_recv" in t.column_names else "ts"
+            mask = pc.and_(pc.greater_equal(t[ts_col], t0_ms), pc.less_equal(t[ts_col], t1_ms))
+            if token is not None and "token" in t.column_names:
+                mask = pc.and_(mask, pc.equal(pc.cast(t["token"], pa.string()), str(token)))
+            tables.append(t.filter(mask))
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options="permissive")
+
+    def remove_missing(self) -> int:
+        with self._lock:
+            rows = self.db.execute("SELECT path FROM files").fetchall()
+            gone = [(r[0],) for r in rows if not (self.root / r[0]).exists()]
+            self.db.executemany("DELETE FROM files WHERE path = ?", gone)
+            # part_tokens is only a pre-filter: stale rows cost a join miss, not a wrong answer
+            self.db.commit()
+        return len(gone)
+
+    def close(self) -> None:
+        with self._lock:
+            self.db.close()
+
+
+def rebuild_catalog(root: str = "data_lake", catalog: Optional[Catalog] = None) -> int:
+    """
+    (Re)index every committed file from the partition manifests, reading each
+    file once. For lakes written before the catalog existed.
+    """
+    cat = catalog or Catalog(root)
+    n = 0
+    for manifest in Path(root).glob(f"stream=*/dt=*/**/{MANIFEST_NAME}"):
+        folder = manifest.parent
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("op") != "commit":
+                continue
+            path = folder / rec["file"]
+            if not path.exists():
+                continue
+            names = pq.ParquetFile(path).schema_arrow.names
+            cols = [c for c in (*TOKEN_COLUMNS, "ts_recv", "ts") if c in names]
+            cat.add(path, pq.read_table(path, columns=cols), path.stat().st_size, rec)
+            n += 1
+    cat.remove_missing()
+    return n
+
@@ -0,0 +1,192 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import (
+    STREAM_OPT, STREAM_CHAIN, STREAM_MAXLEN_CHAIN, CHAIN_PUBLISH_MS,
+)
+from .redis_store import RedisStore
+from .utils import now_ms, safe_float
+
+CE, PE = 0, 1
+
+
+class ChainState:
+    """
+    One (underlying, expiry) option chain as dense arrays indexed by strike slot.
+
+    oi[side, k] / vol[side, k] hold the latest value per contract; totals and the
+    max-pain vector are updated by the delta of each tick:
+      pain[j] = sum_k oi_ce[k] * max(0, K_j - k) + oi_pe[k] * max(0, k - K_j)
+    so an OI tick costs one O(n_strikes) vector add, never a full recompute.
+    Walls (argmax OI per side) and max pain (argmin pain) are read at publish time.
+    """
+
+    def __init__(self, underlying: str, expiry: str):
+        self.underlying = underlying
+        self.expiry = expiry
+        self.strikes = np.zeros(0, dtype=np.float64)
+        self.oi = np.zeros((2, 0), dtype=np.float64)
+        self.vol = np.zeros((2, 0), dtype=np.float64)
+        self.oi_tot = np.zeros(2, dtype=np.float64)
+        self.vol_tot = np.zeros(2, dtype=np.float64)
+        self.pain = np.zeros(0, dtype=np.float64)
+        # payoff per unit OI: _w[CE][:, k] = max(0, K - k), _w[PE][:, k] = max(0, k - K)
+        self._w = np.zeros((2, 0, 0), dtype=np.float64)
+        self.dirty = False
+        self.last_publish = 0.0
+
+    def _strike_slot(self, strike: float) -> int:
+        i = int(np.searchsorted(self.strikes, strike))
+        if i < len(self.strikes) and self.strikes[i] == strike:
+            return i
+
+        # New strike: insert and rebuild the payoff matrices once (rare)
+        self.strikes = np.insert(self.strikes, i, strike)
+        self.oi = np.insert(self.oi, i, 0.0, axis=1)
+        self.vol = np.insert(self.vol, i, 0.0, axis=1)
+        K = self.strikes[:, None]
+        k = self.strikes[None, :]
+        self._w = np.stack([np.maximum(0.0, K - k), np.maximum(0.0, k - K)])
+        self.pain = self._w[CE] @ self.oi[CE] + self._w[PE] @ self.oi[PE]
+        return i
+
+    def update(self, strike: float, side: int, oi: Optional[float], vol: Optional[float]) -> None:
+        k = self._strike_slot(strike)
+        if oi is not None:
+            d = oi - self.oi[side, k]
+            if d:
+                self.oi[side, k] = oi
+                self.oi_tot[side] += d
+                self.pain += d * self._w[side][:, k]
+                self.dirty = True
+        if vol is not None:
+            d = vol - self.vol[side, k]
+            if d:
+                self.vol[side, k] = vol
+                self.vol_tot[side] += d
+                self.dirty = True
+
+    def snapshot(self) -> Dict[str, str]:
+        n = len(self.strikes)
+        out = {
+            "ts_recv": str(now_ms()),
+            "underlying": self.underlying,
+            "expiry": self.expiry,
+            "n_strikes": str(n),
+            "oi_ce": f"{self.oi_tot[CE]:.0f}",
+            "oi_pe": f"{self.oi_tot[PE]:.0f}",
+            "vol_ce": f"{self.vol_tot[CE]:.0f}",
+            "vol_pe": f"{self.vol_tot[PE]:.0f}",
+            "pcr_oi": f"{self.oi_tot[PE] / self.oi_tot[CE]:.4f}" if self.oi_tot[CE] > 0 else "",
+            "pcr_vol": f"{self.vol_tot[PE] / self.vol_tot[CE]:.4f}" if self.vol_tot[CE] > 0 else "",
+            "call_wall": "", "call_wall_oi": "",
+            "put_wall": "", "put_wall_oi": "",
+            "max_pain": "",
+        }
+        if n:
+            c, p = int(np.argmax(self.oi[CE])), int(np.argmax(self.oi[PE]))
+            out["call_wall"], out["call_wall_oi"] = f"{self.strikes[c]:g}", f"{self.oi[CE, c]:.0f}"
+            out["put_wall"], out["put_wall_oi"] = f"{self.strikes[p]:g}", f"{self.oi[PE, p]:.0f}"
+            if self.oi_tot.sum() > 0:
+                out["max_pain"] = f"{self.strikes[int(np.argmin(self.pain))]:g}"
+        return out
+
+
+class ChainAggregator:
+    """
+    md:ticks:opt -> per-chain PCR, OI walls and max pain.
+    Publishes changed chains at most every CHAIN_PUBLISH_MS to:
+      - STREAM_CHAIN (md:chain:agg)
+      - md:chain:latest:{UNDERLYING}:{EXPIRY_ISO} (JSON, latest state)
+    """
+
+    def __init__(self, group: str = "chain", consumer: str = "chain-1"):
+        self.rs = RedisStore()
+        self.group = group
+        self.consumer = consumer
+        self.rs.ensure_group(STREAM_OPT, group)
+
+        self.chains: Dict[Tuple[str, str], ChainState] = {}
+        # token -> (underlying, expiry, strike, side) from ticks or meta:opt:{token}
+        self._meta: Dict[str, Optional[Tuple[str, str, float, int]]] = {}
+
+    def _contract(self, f: Dict[str, str]) -> Optional[Tuple[str, str, float, int]]:
+        tok = f.get("token", "")
+        if tok in self._meta:
+            return self._meta[tok]
+        src = f if f.get("underlying") and f.get("strike") else self.rs.hgetall(f"meta:opt:{tok}")
+        strike = safe_float(src.get("strike"))
+        cp = str(src.get("cp") or "").upper()
+        c = None
+        if src.get("underlying") and src.get("expiry") and strike is not None and cp in ("CE", "PE"):
+            c = (src["underlying"], src["expiry"], strike, CE if cp == "CE" else PE)
+        self._meta[tok] = c
+        return c
+
+    def seed_from_meta(self) -> int:
+        """
+        Pre-create strike slots for every subscribed contract (meta:opt:*), so
+        chains are complete before all of them have ticked.
+        """
+        n = 0
+        for key in self.rs.r.scan_iter(match="meta:opt:*", count=1000):
+            tok = key.rsplit(":", 1)[-1]
+            self._meta.pop(tok, None)
+            c = self._contract({"token": tok})
+            if c:
+                self._chain(c[0], c[1])._strike_slot(c[2])
+                n += 1
+        return n
+
+    def _chain(self, underlying: str, expiry: str) -> ChainState:
+        k = (underlying, expiry)
+        st = self.chains.get(k)
+        if st is None:
+            st = self.chains[k] = ChainState(underlying, expiry)
+        return st
+
+    def ingest(self, f: Dict[str, str]) -> None:
+        c = self._contract(f)
+        if not c:
+            return
+        underlying, expiry, strike, side = c
+        oi = safe_float(f.get("oi") or None)
+        vol = safe_float(f.get("vol") or None)
+        self._chain(underlying, expiry).update(strike, side, oi, vol)
+
+    def publish_due(self) -> int:
+        now = time.time()
+        pipe = None
+        n = 0
+        for st in self.chains.values():
+            if not st.dirty or (now - st.last_publish) * 1000.0 < CHAIN_PUBLISH_MS:
+                continue
+            snap = st.snapshot()
+            pipe = pipe or self.rs.pipeline()
+            pipe.xadd(STREAM_CHAIN, snap, maxlen=STREAM_MAXLEN_CHAIN, approximate=True)
+            pipe.set(f"md:chain:latest:{st.underlying}:{st.expiry}", json.dumps(snap, separators=(",", ":")), ex=3600)
+            st.dirty = False
+            st.last_publish = now
+            n += 1
+        if pipe is not None:
+            pipe.execute()
+        return n
+
+    def run_forever(self):
+        seeded = self.seed_from_meta()
+        print(f"[CHAIN] reading {STREAM_OPT} -> {STREAM_CHAIN} (seeded {seeded} contracts, {len(self.chains)} chains)")
+        block_ms = max(50, min(1000, CHAIN_PUBLISH_MS))
+        while True:
+            resp = self.rs.xreadgroup(self.group, self.consumer, {STREAM_OPT: ">"}, count=2000, block_ms=block_ms)
+            for stream, msgs in resp or []:
+                ids: List[str] = []
+                for msg_id, fields in msgs:
+                    self.ingest(fields)
+                    ids.append(msg_id)
+                if ids:
+                    # the shard stream when OPT_SHARDS > 1
+                    self.rs.xack(stream, self.group, *ids)
+            self.publish_due()
@@ -13,6 +13,12 @@ def env_int(name: str, default: int) -> int:
     except:
         return default
 
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except:
+        return default
+
 def env_str(name: str, default: str = "") -> str:
     return (os.getenv(name, default) or "").strip()
 
@@ -21,24 +27,159 @@ ANGEL_CLIENT_CODE = env_str("ANGEL_CLIENT_CODE")
 ANGEL_PIN = env_str("ANGEL_PIN")
 ANGEL_TOTP_SECRET = env_str("ANGEL_TOTP_SECRET")
 
+# Angel session cache (app/session_cache.py): file | redis | off
+SESSION_CACHE = env_str("SESSION_CACHE", "file").lower()
+SESSION_CACHE_FILE = env_str("SESSION_CACHE_FILE", str(BASE_DIR / ".angel_session.json"))
+# renew this long before the jwt expires
+SESSION_REFRESH_MARGIN_SEC = env_int("SESSION_REFRESH_MARGIN_SEC", 1800)
+# assumed lifetime when the jwt carries no exp claim
+SESSION_TTL_SEC = env_int("SESSION_TTL_SEC", 6 * 3600)
+
 REDIS_URL = env_str("REDIS_URL", "redis://localhost:6379/0")
+# connection pool size per endpoint of AsyncRedisStore (coroutines sharing one event loop)
+REDIS_ASYNC_MAX_CONNECTIONS = env_int("REDIS_ASYNC_MAX_CONNECTIONS", 32)
 
 WS_WARMUP_SEC = env_int("WS_WARMUP_SEC", 8)
 STRIKES_AROUND = env_int("STRIKES_AROUND", 0)
 MAX_WS_SUBS = env_int("MAX_WS_SUBS", 950)
 SUBSCRIBE_MODE = env_str("SUBSCRIBE_MODE", "SNAP_QUOTE").upper()
+# 1 = decode binary WS frames with app/tick_decoder.py instead of SmartWebSocketV2's dict parser
+WS_NATIVE_DECODE = env_int("WS_NATIVE_DECODE", 0)
+# append raw WS frames to this file (for bench_tick_decoder.py validation)
+WS_RECORD_FRAMES = env_str("WS_RECORD_FRAMES", "")
 
 STREAM_EQ = env_str("STREAM_EQ", "md:ticks:eq")
 STREAM_OPT = env_str("STREAM_OPT", "md:ticks:opt")
 STREAM_GREEKS = env_str("STREAM_GREEKS", "md:greeks:snap")
 STREAM_OPT_FEATURES = env_str("STREAM_OPT_FEATURES", "md:features:opt")
+STREAM_DEPTH_EQ = env_str("STREAM_DEPTH_EQ", "md:depth:eq")
+STREAM_DEPTH_OPT = env_str("STREAM_DEPTH_OPT", "md:depth:opt")
+STREAM_CHAIN = env_str("STREAM_CHAIN", "md:chain:agg")
+
+# sharded option ticks (app/redis_store.py ShardRouter): >1 = STREAM_OPT:{shard} by hash of underlying,
+# shard i on SHARD_REDIS_URLS[i % len] (comma-separated, default REDIS_URL)
+OPT_SHARDS = env_int("OPT_SHARDS", 0)
+SHARD_REDIS_URLS = [u.strip() for u in env_str("SHARD_REDIS_URLS").split(",") if u.strip()] or [REDIS_URL]
 
 STREAM_MAXLEN_EQ = env_int("STREAM_MAXLEN_EQ", 3_000_000)
 STREAM_MAXLEN_OPT = env_int("STREAM_MAXLEN_OPT", 8_000_000)
 STREAM_MAXLEN_GREEKS = env_int("STREAM_MAXLEN_GREEKS", 100_000)
 STREAM_MAXLEN_FEATURES = env_int("STREAM_MAXLEN_FEATURES", 8_000_000)
+STREAM_MAXLEN_DEPTH = env_int("STREAM_MAXLEN_DEPTH", 4_000_000)
+STREAM_MAXLEN_CHAIN = env_int("STREAM_MAXLEN_CHAIN", 500_000)
+
+# active/standby producers (app/failover.py): 1 = publish only while holding the Redis lease
+PRODUCER_HA = env_int("PRODUCER_HA", 0)
+PRODUCER_LEASE_KEY = env_str("PRODUCER_LEASE_KEY", "md:producer:leader")
+PRODUCER_LEASE_MS = env_int("PRODUCER_LEASE_MS", 800)
+# per-token tick signatures remembered for de-duplication across a handover
+DEDUPE_KEEP = env_int("DEDUPE_KEEP", 32)
+DEDUPE_TTL_MS = env_int("DEDUPE_TTL_MS", 10_000)
+
+# same-host latest-tick table (app/shm_ticks.py): 1 = producer keeps it in an mmap'd file
+SHM_TICKS = env_int("SHM_TICKS", 0)
+SHM_TICKS_PATH = env_str("SHM_TICKS_PATH", "/dev/shm/angel_md_ticks")
+# initial slots; the table doubles once 90% are in use
+SHM_TICKS_CAPACITY = env_int("SHM_TICKS_CAPACITY", 2048)
+
+# Redis memory / consumer lag backpressure (app/pressure.py): degrade levels conflate -> lean -> ltp_only
+PRESSURE_MONITOR = env_int("PRESSURE_MONITOR", 1)
+PRESSURE_SAMPLE_SEC = env_float("PRESSURE_SAMPLE_SEC", 2.0)
+# thresholds per level: fraction of maxmemory (or PRESSURE_MAX_MEMORY_MB, or host RAM) / group lag in entries
+PRESSURE_MEM_LEVELS = [float(x) for x in env_str("PRESSURE_MEM_LEVELS", "0.60,0.75,0.85").split(",") if x.strip()]
+PRESSURE_LAG_LEVELS = [float(x) for x in env_str("PRESSURE_LAG_LEVELS", "500000,2000000,4000000").split(",") if x.strip()]
+PRESSURE_MAX_MEMORY_MB = env_int("PRESSURE_MAX_MEMORY_MB", 0)
+PRESSURE_HYSTERESIS = env_float("PRESSURE_HYSTERESIS", 0.85)
+PRESSURE_HOLD_SEC = env_float("PRESSURE_HOLD_SEC", 30.0)
+# groups with no consumers, or whose consumers have all been idle this long, don't count toward lag
+PRESSURE_GROUP_IDLE_MS = env_int("PRESSURE_GROUP_IDLE_MS", 60000)
+# per-token min publish interval at level conflate (x4 from lean)
+PRESSURE_CONFLATE_MS = env_int("PRESSURE_CONFLATE_MS", 250)
+
+STREAM_EVENTS = env_str("STREAM_EVENTS", "md:events")
+STREAM_MAXLEN_EVENTS = env_int("STREAM_MAXLEN_EVENTS", 10_000)
+
+# intraday universe refresh (app/universe.py): symbols.txt / ScripMaster changes and expiry rollover, no restart
+UNIVERSE_REFRESH = env_int("UNIVERSE_REFRESH", 1)
+UNIVERSE_REFRESH_SEC = env_float("UNIVERSE_REFRESH_SEC", 30.0)
+# conditional ScripMaster download every N seconds (0 = only reload when the cache file changes)
+SCRIPMASTER_CHECK_SEC = env_int("SCRIPMASTER_CHECK_SEC", 1800)
+# IST time after which an expiring series rolls to the next expiry
+EXPIRY_ROLL_TIME = env_str("EXPIRY_ROLL_TIME", "15:30")
+# meta:opt:{token} of unsubscribed contracts expires after this (late consumers still resolve it)
+RETIRED_META_TTL_SEC = env_int("RETIRED_META_TTL_SEC", 86400)
+
+# silent-token watchdog (app/watchdog.py): resubscribe tokens silent far beyond their usual inter-tick gap
+WATCHDOG = env_int("WATCHDOG", 1)
+WATCHDOG_SWEEP_SEC = env_float("WATCHDOG_SWEEP_SEC", 5.0)
+# silent = no tick for max(WATCHDOG_MIN_SILENCE_SEC, WATCHDOG_GAP_MULT x EWMA mean gap)
+WATCHDOG_GAP_MULT = env_float("WATCHDOG_GAP_MULT", 20.0)
+WATCHDOG_MIN_SILENCE_SEC = env_float("WATCHDOG_MIN_SILENCE_SEC", 30.0)
+# minimum silence for tokens with too few ticks for a gap estimate (incl. none since subscribing)
+WATCHDOG_NEVER_SEC = env_float("WATCHDOG_NEVER_SEC", 300.0)
+WATCHDOG_COOLDOWN_SEC = env_float("WATCHDOG_COOLDOWN_SEC", 120.0)
+# more than this fraction silent at once = market closed / feed down: don't resubscribe
+WATCHDOG_MAX_SILENT_FRAC = env_float("WATCHDOG_MAX_SILENT_FRAC", 0.5)
+WATCHDOG_PUBLISH_SEC = env_float("WATCHDOG_PUBLISH_SEC", 30.0)
+
+# profiling (app/profiling.py): per-stage timings in md:prof:spans:{component}:{pid} every N seconds
+PROFILE_PUBLISH_SEC = env_float("PROFILE_PUBLISH_SEC", 10.0)
+# producer ticks are timed 1 in N (0 = never); batch stages are timed every batch
+PROFILE_TICK_SAMPLE = env_int("PROFILE_TICK_SAMPLE", 16)
+# stack sampler: started by SIGUSR1 or SET md:prof:ctl:{component} <seconds>, polled every N seconds
+PROFILE_CONTROL_POLL_SEC = env_float("PROFILE_CONTROL_POLL_SEC", 1.0)
+PROFILE_SAMPLE_MS = env_float("PROFILE_SAMPLE_MS", 10.0)
+PROFILE_SECONDS = env_int("PROFILE_SECONDS", 30)
+PROFILE_MAX_SECONDS = env_int("PROFILE_MAX_SECONDS", 300)
+# the sampler sleeps long enough to stay under this share of wall time
+PROFILE_MAX_OVERHEAD = env_float("PROFILE_MAX_OVERHEAD", 0.05)
+# distinct stacks kept per dump (the rest count as "[other]")
+PROFILE_MAX_STACKS = env_int("PROFILE_MAX_STACKS", 20000)
+PROFILE_DIR = env_str("PROFILE_DIR", str(BASE_DIR / "profiles"))
+
+# chain aggregates (app/chain.py): publish a changed chain at most every N ms
+CHAIN_PUBLISH_MS = env_int("CHAIN_PUBLISH_MS", 1000)
+
+# 1 = publish best-5 depth (SNAP_QUOTE only) to STREAM_DEPTH_*, packed, changed books only
+CAPTURE_DEPTH = env_int("CAPTURE_DEPTH", 0)
 
 GREEKS_POLL_SEC = env_int("GREEKS_POLL_SEC", 30)
+# per-contract greeks hash: {GREEKS_HASH_PREFIX}:{UNDERLYING}:{EXPIRY_ISO} -> {contract key: json}
+GREEKS_HASH_PREFIX = env_str("GREEKS_HASH_PREFIX", "md:greeks:c")
+# publish the whole chain to STREAM_GREEKS every N polls (other polls carry changes only)
+GREEKS_KEYFRAME_EVERY = env_int("GREEKS_KEYFRAME_EVERY", 20)
+# priority scheduler (GreeksPoller.run_scheduled): REST budget and age bounds per (underlying, expiry)
+GREEKS_SCHEDULER = env_int("GREEKS_SCHEDULER", 1)
+GREEKS_REQ_PER_SEC = env_float("GREEKS_REQ_PER_SEC", 8.0)
+GREEKS_MIN_AGE_SEC = env_float("GREEKS_MIN_AGE_SEC", 3.0)
+GREEKS_MAX_AGE_SEC = env_float("GREEKS_MAX_AGE_SEC", 120.0)
+GREEKS_ACTIVITY_SAMPLE = env_int("GREEKS_ACTIVITY_SAMPLE", 5000)
+GREEKS_REPORT_SEC = env_int("GREEKS_REPORT_SEC", 60)
+# run_scheduled raises after this many failed requests in a row (errors, empty replies), so the caller logs in again (0 = never)
+GREEKS_MAX_FAILURES = env_int("GREEKS_MAX_FAILURES", 10)
+# IV smile fitting (app/vol_surface.py)
+VOLSURF_MIN_POINTS = env_int("VOLSURF_MIN_POINTS", 5)
+VOLSURF_REFRESH_SEC = env_int("VOLSURF_REFRESH_SEC", 2)
+# 1 = also keep the legacy md:greeks:latest:* JSON blob
+GREEKS_LATEST_JSON = env_int("GREEKS_LATEST_JSON", 0)
+
+# historical candle backfill (app/backfill.py); getCandleData allows ~3 req/s
+BACKFILL_REQ_PER_SEC = env_float("BACKFILL_REQ_PER_SEC", 3.0)
+BACKFILL_WORKERS = env_int("BACKFILL_WORKERS", 4)
+BACKFILL_MAX_RETRIES = env_int("BACKFILL_MAX_RETRIES", 5)
+
+# training-set export (app/ml_export.py): md:features:opt windows -> .npy shards in EXPORT_DIR
+EXPORT_DIR = env_str("EXPORT_DIR", "data_ml")
+# resampling grid step, window length and stride (in steps)
+EXPORT_STEP_MS = env_int("EXPORT_STEP_MS", 1000)
+EXPORT_WINDOW = env_int("EXPORT_WINDOW", 120)
+EXPORT_STRIDE = env_int("EXPORT_STRIDE", 10)
+# forward-fill a contract's last row for at most this long (0 = no limit); windows with staler steps are dropped
+EXPORT_FFILL_MS = env_int("EXPORT_FFILL_MS", 30_000)
+# comma-separated feature columns (default: every numeric column but timestamps)
+EXPORT_FEATURES = env_str("EXPORT_FEATURES", "")
+# worker processes, one (day, underlying) partition each (0 = CPU count)
+EXPORT_WORKERS = env_int("EXPORT_WORKERS", 0)
 
 X_CLIENT_LOCAL_IP = env_str("X_CLIENT_LOCAL_IP", "127.0.0.1")
 X_CLIENT_PUBLIC_IP = env_str("X_CLIENT_PUBLIC_IP", "")
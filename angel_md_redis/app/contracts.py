@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional
+
+EQ = 0
+OPT = 1
+
+# Tick payload field order (the XADD field order, unchanged from the dict-built payloads)
+EQ_FIELDS = ("ts_recv", "ts_exch", "token", "symbol", "ltp", "o", "h", "l", "c", "vol", "tbq", "tsq")
+OPT_FIELDS = (
+    "ts_recv", "ts_exch", "token", "underlying", "tradingsymbol", "expiry", "strike", "cp",
+    "ltp", "oi", "vol", "o", "h", "l", "c", "tbq", "tsq",
+)
+
+
+class Contract:
+    """
+    One subscribed token. Static fields are stringified once at registration;
+    `template` is the tick payload with them filled in (dynamic fields ""),
+    so an emit is one C-level dict copy plus the per-tick assignments.
+    The day's open/high/low/close rarely change: `ohlc` holds the last raw
+    values and the template their strings, re-formatted only on change.
+    A retired contract (`active` False) keeps its slot; its ticks are dropped.
+    """
+
+    __slots__ = ("slot", "kind", "token", "symbol", "underlying", "tradingsymbol",
+                 "expiry", "strike", "cp", "exchange", "template", "ohlc", "last_pub", "active")
+
+    def __init__(self, slot: int, kind: int, token: str, symbol: str = "", underlying: str = "",
+                 tradingsymbol: str = "", expiry: str = "", strike="", cp: str = "", exchange: str = ""):
+        self.slot = slot
+        self.kind = kind
+        self.token = str(token)
+        self.symbol = str(symbol)
+        self.underlying = str(underlying)
+        self.tradingsymbol = str(tradingsymbol)
+        self.expiry = str(expiry)
+        self.strike = str(strike)
+        self.cp = str(cp)
+        self.exchange = str(exchange)
+        self.ohlc = None
+        self.last_pub = 0.0     # monotonic time of the last XADD (conflation under pressure)
+        self.active = True
+        if kind == EQ:
+            self.template = dict.fromkeys(EQ_FIELDS, "")
+            self.template.update(token=self.token, symbol=self.symbol)
+        else:
+            self.template = dict.fromkeys(OPT_FIELDS, "")
+            self.template.update(
+                token=self.token, underlying=self.underlying, tradingsymbol=self.tradingsymbol,
+                expiry=self.expiry, strike=self.strike, cp=self.cp,
+            )
+
+    def set_ohlc(self, ohlc: tuple, fmt) -> None:
+        self.ohlc = ohlc
+        t = self.template
+        t["o"], t["h"], t["l"], t["c"] = fmt(ohlc[0]), fmt(ohlc[1]), fmt(ohlc[2]), fmt(ohlc[3])
+
+    def meta(self) -> Dict[str, str]:
+        """
+        meta:opt:{token} / meta:eq:{token} hash fields.
+        """
+        if self.kind == EQ:
+            return {"symbol": self.symbol, "tradingsymbol": self.tradingsymbol, "exchange": self.exchange}
+        return {
+            "underlying": self.underlying,
+            "tradingsymbol": self.tradingsymbol,
+            "expiry": self.expiry,
+            "strike": self.strike,
+            "cp": self.cp,
+            "exchange": self.exchange,
+        }
+
+
+class ContractRegistry:
+    """
+    Subscribed tokens -> dense integer slots (registration order), one
+    Contract per slot. `get(token)` is the single lookup of the emit path;
+    `by_slot[i]` serves callers that already have a slot (TickSlots,
+    registered in the same order, hands out the same numbers).
+    Slots are never reused: `retire()` deactivates a contract, registering
+    the token again revives it in its old slot.
+    """
+
+    def __init__(self):
+        self.by_slot: List[Contract] = []
+        self._by_token: Dict[str, Contract] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_slot)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._by_token
+
+    def get(self, token: str) -> Optional[Contract]:
+        return self._by_token.get(token)
+
+    def register(self, kind: int, token: str, **static) -> Contract:
+        c = self._by_token.get(str(token))
+        if c is not None:
+            c.active = True
+            return c
+        c = Contract(len(self.by_slot), kind, token, **static)
+        self.by_slot.append(c)
+        self._by_token[c.token] = c
+        return c
+
+    def register_option(self, c: dict) -> Contract:
+        """
+        A build_atm_option_tokens() contract dict.
+        """
+        return self.register(
+            OPT, c["token"], underlying=c["underlying"], tradingsymbol=c["tradingsymbol"],
+            expiry=c["expiry"], strike=c["strike"], cp=c["cp"], exchange=c.get("exchange") or "NFO",
+        )
+
+    def retire(self, token: str) -> Optional[Contract]:
+        c = self._by_token.get(str(token))
+        if c is not None:
+            c.active = False
+        return c
+
+    def active(self, kind: Optional[int] = None) -> List[Contract]:
+        return [c for c in self.by_slot if c.active and (kind is None or c.kind == kind)]
+
+    def tokens(self, kind: Optional[int] = None) -> List[str]:
+        return [c.token for c in self.active(kind)]
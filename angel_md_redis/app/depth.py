@@ -0,0 +1,127 @@
+import base64
+import struct
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .tick_decoder import MODE_SNAP, SNAP_DTYPE
+
+# Packed best-5 book, little-endian, 116 bytes (156 chars base64 in the stream field "d"):
+#   bid_px[5] i32 paise, bid_qty[5] i32, bid_n[5] u16,
+#   ask_px[5] i32 paise, ask_qty[5] i32, ask_n[5] u16,
+#   upper circuit, lower circuit, 52w high, 52w low: i32 paise
+DEPTH_PACK = struct.Struct("<5i5i5H5i5i5H4i")
+
+DEPTH_NP_DTYPE = np.dtype([
+    ("bid_px", "<i4", (5,)),
+    ("bid_qty", "<i4", (5,)),
+    ("bid_n", "<u2", (5,)),
+    ("ask_px", "<i4", (5,)),
+    ("ask_qty", "<i4", (5,)),
+    ("ask_n", "<u2", (5,)),
+    ("levels", "<i4", (4,)),
+])
+assert DEPTH_NP_DTYPE.itemsize == DEPTH_PACK.size
+
+# 10 x (flag u16, qty i64, price i64, orders u16) starting at byte 147 of a SNAP_QUOTE frame
+_FRAME_BOOK = struct.Struct("<" + "HqqH" * 10)
+_FRAME_BOOK_OFF = SNAP_DTYPE.fields["depth"][1]
+_FRAME_LEVELS = struct.Struct("<qqqq")
+_FRAME_LEVELS_OFF = SNAP_DTYPE.fields["uc"][1]
+
+_I32_MAX = 2**31 - 1
+
+
+def _i32(x) -> int:
+    x = int(x or 0)
+    return x if -_I32_MAX <= x <= _I32_MAX else 0
+
+
+def _pack(bids: List[tuple], asks: List[tuple], levels: tuple) -> bytes:
+    """
+    bids/asks: [(price_paise, qty, orders), ...] best first, up to 5.
+    """
+    bids = (list(bids) + [(0, 0, 0)] * 5)[:5]
+    asks = (list(asks) + [(0, 0, 0)] * 5)[:5]
+    return DEPTH_PACK.pack(
+        *[_i32(b[0]) for b in bids], *[_i32(b[1]) for b in bids], *[min(int(b[2] or 0), 65535) for b in bids],
+        *[_i32(a[0]) for a in asks], *[_i32(a[1]) for a in asks], *[min(int(a[2] or 0), 65535) for a in asks],
+        *[_i32(v) for v in levels],
+    )
+
+
+def depth_from_dict(data: Dict) -> Optional[bytes]:
+    """
+    Packed book from a SmartWebSocketV2 SNAP_QUOTE dict (None for other modes).
+    """
+    if "best_5_buy_data" not in data:
+        return None
+    bids = [(d.get("price"), d.get("quantity"), d.get("no of orders")) for d in data.get("best_5_buy_data") or []]
+    asks = [(d.get("price"), d.get("quantity"), d.get("no of orders")) for d in data.get("best_5_sell_data") or []]
+    levels = (
+        data.get("upper_circuit_limit"), data.get("lower_circuit_limit"),
+        data.get("52_week_high_price"), data.get("52_week_low_price"),
+    )
+    return _pack(bids, asks, levels)
+
+
+def depth_from_frame(buf) -> Optional[bytes]:
+    """
+    Packed book straight from SNAP_QUOTE frame bytes (or TickSlots.raw(slot)).
+    """
+    if len(buf) < SNAP_DTYPE.itemsize or buf[0] != MODE_SNAP:
+        return None
+    raw = _FRAME_BOOK.unpack_from(buf, _FRAME_BOOK_OFF)
+    bids, asks = [], []
+    for i in range(0, 40, 4):
+        flag, qty, price, orders = raw[i:i + 4]
+        (bids if flag == 1 else asks).append((price, qty, orders))
+    return _pack(bids, asks, _FRAME_LEVELS.unpack_from(buf, _FRAME_LEVELS_OFF))
+
+
+def encode_depth(packed: bytes) -> str:
+    return base64.b64encode(packed).decode("ascii")
+
+
+def decode_depth_column(values: List[Optional[str]]) -> np.ndarray:
+    """
+    Stream field "d" for many rows -> structured array (DEPTH_NP_DTYPE), one
+    frombuffer over the concatenated bytes. Bad/missing rows are all zeros.
+    """
+    blank = bytes(DEPTH_PACK.size)
+    chunks = []
+    for v in values:
+        try:
+            b = base64.b64decode(v) if v else blank
+        except Exception:
+            b = blank
+        chunks.append(b if len(b) == DEPTH_PACK.size else blank)
+    return np.frombuffer(b"".join(chunks), dtype=DEPTH_NP_DTYPE, count=len(chunks))
+
+
+_FRAME_LEVEL = struct.Struct("<HqqH")
+
+
+def top_of_book_from_frame(buf) -> Optional[tuple]:
+    """
+    (bid_px, bid_qty, ask_px, ask_qty) in paise from SNAP_QUOTE frame bytes, without
+    unpacking the whole book (None for other modes).
+    """
+    if len(buf) < SNAP_DTYPE.itemsize or buf[0] != MODE_SNAP:
+        return None
+    bid = ask = (0, 0)
+    for i in (0, 5):
+        flag, qty, price, _n = _FRAME_LEVEL.unpack_from(buf, _FRAME_BOOK_OFF + i * _FRAME_LEVEL.size)
+        if flag == 1:
+            bid = (price, qty)
+        else:
+            ask = (price, qty)
+    return bid[0], bid[1], ask[0], ask[1]
+
+
+def top_of_book_from_dict(data: Dict) -> Optional[tuple]:
+    if "best_5_buy_data" not in data:
+        return None
+    b = (data.get("best_5_buy_data") or [{}])[0]
+    a = (data.get("best_5_sell_data") or [{}])[0]
+    return b.get("price") or 0, b.get("quantity") or 0, a.get("price") or 0, a.get("quantity") or 0
@@ -0,0 +1,206 @@
+import os
+import socket
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from .config import PRODUCER_LEASE_KEY, PRODUCER_LEASE_MS, DEDUPE_KEEP, DEDUPE_TTL_MS
+from .redis_store import RedisStore
+
+# Renew only if we still own the lease (compare-and-pexpire)
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: dedupe list, stream. ARGV: sig, keep, ttl_ms, maxlen, field, value, ...
+# XADD unless `sig` is among the last `keep` signatures seen for this token.
+_DEDUPE_XADD = """
+if redis.call('LPOS', KEYS[1], ARGV[1]) then
+  return 0
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', unpack(ARGV, 5))
+return 1
+"""
+
+DEDUPE_PREFIX = "md:dedupe"
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaderLease:
+    """
+    Redis lease for active/standby producers: SET key node NX PX ttl.
+
+    The leader renews every ttl/4; a standby retries acquisition every
+    ttl/10, so a crashed leader is replaced about `ttl` after its last renewal
+    (`stop()` releases the lease, handing over immediately). `is_leader` is also bounded
+    by a local deadline (last successful renewal + ttl), so a leader that
+    cannot reach Redis stops publishing before anyone else can take over.
+    """
+
+    def __init__(self, rs: Optional[RedisStore] = None, key: str = PRODUCER_LEASE_KEY,
+                 node_id: Optional[str] = None, ttl_ms: int = PRODUCER_LEASE_MS,
+                 on_change: Optional[Callable[[bool], None]] = None):
+        self.rs = rs or RedisStore()
+        self.key = key
+        self.node_id = node_id or default_node_id()
+        self.ttl_ms = max(100, int(ttl_ms))
+        self.on_change = on_change
+        self._renew = self.rs.r.register_script(_RENEW)
+        self._release = self.rs.r.register_script(_RELEASE)
+        self._valid_until = 0.0
+        self._leader = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.acquired_at: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader and time.monotonic() < self._valid_until
+
+    def _set_leader(self, leader: bool) -> None:
+        if leader == self._leader:
+            return
+        self._leader = leader
+        self.acquired_at = time.time() if leader else None
+        print(f"[HA] {self.node_id} is now {'LEADER' if leader else 'STANDBY'}")
+        if self.on_change is not None:
+            self.on_change(leader)
+
+    def tick(self) -> bool:
+        """
+        One acquire/renew attempt. Returns is_leader.
+        """
+        t0 = time.monotonic()
+        try:
+            if self._leader:
+                ok = bool(self._renew(keys=[self.key], args=[self.node_id, self.ttl_ms]))
+                if not ok:
+                    self._valid_until = 0.0  # someone else holds it now
+            else:
+                ok = bool(self.rs.r.set(self.key, self.node_id, nx=True, px=self.ttl_ms))
+        except Exception as e:
+            print(f"[HA] lease error: {e!r}")
+            ok = False
+        if ok:
+            self._valid_until = t0 + self.ttl_ms / 1000.0
+        self._set_leader(time.monotonic() < self._valid_until)
+        return self.is_leader
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(self.ttl_ms / (4000.0 if self._leader else 10000.0))
+
+    def start(self) -> "LeaderLease":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="leader-lease", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, release: bool = True) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        if release and self._leader:
+            try:
+                self._release(keys=[self.key], args=[self.node_id])
+            except Exception:
+                pass
+        self._set_leader(False)
+
+
+def tick_signature(tok: str, payload: Dict[str, str]) -> str:
+    """
+    token + exchange timestamp + payload digest (ts_recv excluded: it differs per node).
+    """
+    body = "|".join(f"{k}={v}" for k, v in payload.items() if k != "ts_recv")
+    return f"{payload.get('ts_exch', '')}:{zlib.crc32(body.encode()):08x}"
+
+
+class DedupPublisher:
+    """
+    XADD for active/standby producers: only while holding the lease, and
+    atomically skipped (Lua) when the same tick signature was among the last
+    `keep` published for that token.
+
+    A standby keeps the ticks of the last `replay_ms` (default 2 x lease TTL)
+    and replays them when it takes over: whatever the old leader already
+    published is skipped by the signature check, the rest fills the gap
+    between the crash and the takeover.
+    """
+
+    def __init__(self, rs: RedisStore, lease: LeaderLease, keep: int = DEDUPE_KEEP,
+                 ttl_ms: int = DEDUPE_TTL_MS, replay_ms: Optional[int] = None):
+        self.rs = rs
+        self.lease = lease
+        self.keep = max(1, int(keep))
+        self.ttl_ms = int(ttl_ms)
+        self.replay_sec = (2 * lease.ttl_ms if replay_ms is None else replay_ms) / 1000.0
+        self._xadd = rs.r.register_script(_DEDUPE_XADD)
+        self._backlog: deque = deque()   # (monotonic, stream, tok, payload, maxlen, client)
+        self.published = 0
+        self.duplicates = 0
+        self.replayed = 0
+
+    def _args(self, tok: str, payload: Dict[str, str], maxlen: int) -> list:
+        args = [tick_signature(tok, payload), self.keep, self.ttl_ms, maxlen]
+        for k, v in payload.items():
+            args.append(k)
+            args.append(v)
+        return args
+
+    def _replay(self) -> None:
+        backlog, self._backlog = self._backlog, deque()
+        # one pipeline per Redis endpoint (sharded streams may live on several)
+        pipes: Dict[int, object] = {}
+        for _t, stream, tok, payload, maxlen, client in backlog:
+            c = client or self.rs.r
+            pipe = pipes.get(id(c))
+            if pipe is None:
+                pipe = pipes[id(c)] = c.pipeline(transaction=False)
+            self._xadd(keys=[f"{DEDUPE_PREFIX}:{stream}:{tok}", stream], args=self._args(tok, payload, maxlen), client=pipe)
+        res = [x for pipe in pipes.values() for x in pipe.execute()]
+        n = sum(1 for x in res if x)
+        self.replayed += n
+        self.published += n
+        self.duplicates += len(res) - n
+        print(f"[HA] takeover replay: {n} of {len(res)} buffered ticks were missing")
+
+    def xadd(self, stream: str, tok: str, payload: Dict[str, str], maxlen: int, client=None) -> bool:
+        """
+        client: Redis connection holding `stream` (a shard endpoint), default rs.r.
+        The dedupe list lives next to the stream, so the script stays single-node.
+        """
+        if not self.lease.is_leader:
+            now = time.monotonic()
+            self._backlog.append((now, stream, tok, payload, maxlen, client))
+            while self._backlog and now - self._backlog[0][0] > self.replay_sec:
+                self._backlog.popleft()
+            return False
+        if self._backlog:
+            self._replay()
+        ok = bool(self._xadd(keys=[f"{DEDUPE_PREFIX}:{stream}:{tok}", stream], args=self._args(tok, payload, maxlen),
+                             client=client or self.rs.r))
+        if ok:
+            self.published += 1
+        else:
+            self.duplicates += 1
+        return ok
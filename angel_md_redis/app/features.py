@@ -0,0 +1,204 @@
+import math
+import os
+from array import array
+from typing import Dict, List, Sequence
+
+NAN = float("nan")
+
+
+def _parse_windows(raw: str) -> List[int]:
+    out = []
+    for x in (raw or "").split(","):
+        try:
+            v = int(x.strip())
+        except ValueError:
+            continue
+        if v > 0 and v not in out:
+            out.append(v)
+    return out
+
+
+TICK_WINDOWS = _parse_windows(os.getenv("FEATURE_TICK_WINDOWS", "10,50"))
+TIME_WINDOWS_SEC = _parse_windows(os.getenv("FEATURE_TIME_WINDOWS_SEC", "30,300"))
+
+# Joined rows get these float columns (app/schemas.py stores them as float64)
+FEATURE_PREFIXES = ("ret_", "oichg_", "vwap_", "rv_", "imb_", "oidev_")
+
+
+def _fmt(x: float) -> str:
+    return "" if x != x else f"{x:.8g}"
+
+
+class RollingFeatureEngine:
+    """
+    Incremental per-token features, O(1) per tick, fixed state per token.
+
+    Tick windows N (FEATURE_TICK_WINDOWS), from a ring of the last max(N) ticks:
+      ret_{N}t    log(ltp / ltp N ticks ago)
+      oichg_{N}t  oi - oi N ticks ago
+    Time windows T seconds (FEATURE_TIME_WINDOWS_SEC), exponentially decayed
+    with time constant T so no history is kept (means are over the ticks that
+    carry the value, each with its own decayed weight):
+      vwap_{T}s   sum(px * dvol) / sum(dvol)
+      rv_{T}s     sqrt(sum of squared log returns)
+      imb_{T}s    mean of (tbq - tsq) / (tbq + tsq)
+      oidev_{T}s  oi - mean(oi)
+
+    State lives in flat `array('d')` buffers indexed by token slot (not per-token
+    objects); capacity doubles when new tokens show up.
+    """
+
+    def __init__(self, tick_windows: Sequence[int] = None, time_windows_sec: Sequence[int] = None, capacity: int = 1024):
+        self.tick_windows = list(TICK_WINDOWS if tick_windows is None else tick_windows)
+        self.time_windows = list(TIME_WINDOWS_SEC if time_windows_sec is None else time_windows_sec)
+        self.ring = max(self.tick_windows) + 1 if self.tick_windows else 1
+        self.k = len(self.time_windows)
+        self._inv_tau = [1.0 / t for t in self.time_windows]
+
+        self.names: List[str] = (
+            [f"ret_{n}t" for n in self.tick_windows]
+            + [f"oichg_{n}t" for n in self.tick_windows]
+            + [f"vwap_{t}s" for t in self.time_windows]
+            + [f"rv_{t}s" for t in self.time_windows]
+            + [f"imb_{t}s" for t in self.time_windows]
+            + [f"oidev_{t}s" for t in self.time_windows]
+        )
+
+        self._slot: Dict[str, int] = {}
+        self.capacity = 0
+        self._alloc(max(1, int(capacity)))
+
+    def _alloc(self, capacity: int) -> None:
+        def grow(buf, width, fill):
+            extra = array("d", [fill]) * ((capacity - self.capacity) * width)
+            if buf is None:
+                return extra
+            buf.extend(extra)
+            return buf
+
+        g = getattr
+        self.last_ts = grow(g(self, "last_ts", None), 1, NAN)       # sec
+        self.last_px = grow(g(self, "last_px", None), 1, NAN)
+        self.last_vol = grow(g(self, "last_vol", None), 1, NAN)     # cumulative day volume
+        self.n_ticks = grow(g(self, "n_ticks", None), 1, 0.0)
+        self.ring_px = grow(g(self, "ring_px", None), self.ring, NAN)
+        self.ring_oi = grow(g(self, "ring_oi", None), self.ring, NAN)
+        self.ew_pv = grow(g(self, "ew_pv", None), self.k, 0.0)
+        self.ew_v = grow(g(self, "ew_v", None), self.k, 0.0)
+        self.ew_r2 = grow(g(self, "ew_r2", None), self.k, 0.0)
+        self.ew_imb = grow(g(self, "ew_imb", None), self.k, 0.0)
+        self.ew_oi = grow(g(self, "ew_oi", None), self.k, 0.0)
+        self.ew_w_imb = grow(g(self, "ew_w_imb", None), self.k, 0.0)  # decayed count of ticks with imb
+        self.ew_w_oi = grow(g(self, "ew_w_oi", None), self.k, 0.0)    # decayed count of ticks with oi
+        self.capacity = capacity
+
+    def slot(self, token: str) -> int:
+        s = self._slot.get(token)
+        if s is None:
+            s = len(self._slot)
+            if s >= self.capacity:
+                self._alloc(2 * self.capacity)
+            self._slot[token] = s
+        return s
+
+    def memory_bytes(self) -> int:
+        per_slot = 4 + 2 * self.ring + 7 * self.k
+        return per_slot * 8 * self.capacity
+
+    def update(self, token: str, ts_ms: float, px: float, vol: float, oi: float, tbq: float, tsq: float) -> List[str]:
+        """
+        Feed one tick (NaN for missing numbers); returns formatted values for `names`.
+        """
+        s = self.slot(token)
+        ts = ts_ms / 1000.0
+
+        prev_ts = self.last_ts[s]
+        prev_px = self.last_px[s]
+        dt = ts - prev_ts if prev_ts == prev_ts else 0.0
+        if dt < 0:
+            dt = 0.0
+
+        r = math.log(px / prev_px) if (px > 0 and prev_px > 0) else 0.0
+        prev_vol = self.last_vol[s]
+        dvol = vol - prev_vol if (vol == vol and prev_vol == prev_vol and vol > prev_vol) else 0.0
+        imb = (tbq - tsq) / (tbq + tsq) if (tbq == tbq and tsq == tsq and tbq + tsq > 0) else NAN
+
+        # --- tick windows (ring buffer) ---
+        n = int(self.n_ticks[s])
+        base = s * self.ring
+        pos = n % self.ring
+        self.ring_px[base + pos] = px
+        self.ring_oi[base + pos] = oi
+        out: List[str] = []
+        rets, oichg = [], []
+        for w in self.tick_windows:
+            if n >= w:
+                j = base + (n - w) % self.ring
+                p0, o0 = self.ring_px[j], self.ring_oi[j]
+                rets.append(_fmt(math.log(px / p0)) if (px > 0 and p0 > 0) else "")
+                oichg.append(_fmt(oi - o0))
+            else:
+                rets.append("")
+                oichg.append("")
+        out.extend(rets)
+        out.extend(oichg)
+
+        # --- time windows (exponential decay) ---
+        kb = s * self.k
+        vwap, rv, imbs, oidev = [], [], [], []
+        for i in range(self.k):
+            j = kb + i
+            d = math.exp(-dt * self._inv_tau[i]) if dt > 0 else 1.0
+            if px == px and dvol > 0:
+                self.ew_pv[j] = self.ew_pv[j] * d + px * dvol
+                self.ew_v[j] = self.ew_v[j] * d + dvol
+            else:
+                self.ew_pv[j] *= d
+                self.ew_v[j] *= d
+            self.ew_r2[j] = self.ew_r2[j] * d + r * r
+            if imb == imb:
+                self.ew_imb[j] = self.ew_imb[j] * d + imb
+                self.ew_w_imb[j] = self.ew_w_imb[j] * d + 1.0
+            else:
+                self.ew_imb[j] *= d
+                self.ew_w_imb[j] *= d
+            if oi == oi:
+                self.ew_oi[j] = self.ew_oi[j] * d + oi
+                self.ew_w_oi[j] = self.ew_w_oi[j] * d + 1.0
+            else:
+                self.ew_oi[j] *= d
+                self.ew_w_oi[j] *= d
+            w_imb, w_oi = self.ew_w_imb[j], self.ew_w_oi[j]
+
+            vwap.append(_fmt(self.ew_pv[j] / self.ew_v[j]) if self.ew_v[j] > 0 else "")
+            rv.append(_fmt(math.sqrt(self.ew_r2[j])))
+            imbs.append(_fmt(self.ew_imb[j] / w_imb) if w_imb > 0 else "")
+            oidev.append(_fmt(oi - self.ew_oi[j] / w_oi) if (oi == oi and w_oi > 0) else "")
+        out.extend(vwap)
+        out.extend(rv)
+        out.extend(imbs)
+        out.extend(oidev)
+
+        self.n_ticks[s] = n + 1
+        self.last_ts[s] = ts
+        if px == px:
+            self.last_px[s] = px
+        if vol == vol:
+            self.last_vol[s] = vol
+        return out
+
+
+def tick_numbers(f: Dict[str, str]) -> tuple:
+    """
+    (ts_ms, ltp, vol, oi, tbq, tsq) floats from a joined/tick row, NaN if missing.
+    """
+    def num(k):
+        try:
+            return float(f.get(k) or "nan")
+        except ValueError:
+            return NAN
+
+    ts = num("ts_exch")
+    if ts != ts or ts <= 0:
+        ts = num("ts_recv")
+    return ts, num("ltp"), num("vol"), num("oi"), num("tbq"), num("tsq")
@@ -1,12 +1,43 @@
 import time
 import json
+import asyncio
+import inspect
 import datetime as dt
-from typing import Dict
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
 
-from .redis_store import RedisStore
-from .config import STREAM_GREEKS, STREAM_MAXLEN_GREEKS
+from .redis_store import AsyncRedisStore, RedisStore
+from .config import (
+    STREAM_GREEKS, STREAM_MAXLEN_GREEKS, STREAM_OPT,
+    GREEKS_HASH_PREFIX, GREEKS_KEYFRAME_EVERY, GREEKS_LATEST_JSON,
+    GREEKS_REQ_PER_SEC, GREEKS_MIN_AGE_SEC, GREEKS_MAX_AGE_SEC,
+    GREEKS_ACTIVITY_SAMPLE, GREEKS_REPORT_SEC, GREEKS_MAX_FAILURES,
+)
 from .angel_rest import fetch_option_greeks
-from .utils import now_ms
+from .utils import now_ms, greeks_contract_key
+from .profiling import Profiler, clock
+
+
+# hash "{UNDERLYING}:{EXPIRY_ISO}" -> ts_ms of the last successful greeks fetch
+GREEKS_UPDATED_KEY = "md:greeks:updated"
+# hash UNDERLYING -> json greeks age percentiles (seconds)
+GREEKS_AGE_KEY = "md:greeks:age"
+
+# ticks/sec credited to every pair so idle chains still age towards GREEKS_MAX_AGE_SEC
+ACTIVITY_FLOOR = 0.05
+ACTIVITY_REFRESH_SEC = 5.0
+# a failing pair waits FAILED_RETRY_SEC, doubling per failure in a row up to FAILED_RETRY_MAX_SEC
+FAILED_RETRY_SEC = 5.0
+FAILED_RETRY_MAX_SEC = 600.0
+
+# error codes / messages of a rejected session: retrying with the same token is pointless
+_AUTH_ERRORS = ("AG8001", "AG8002", "AG8003", "invalid token", "token expired", "unauthorized")
+
+
+class GreeksAuthError(RuntimeError):
+    """
+    The optionGreek API rejected the session; log in again.
+    """
 
 
 def iso_to_expirydate(iso_date: str) -> str:
@@ -16,41 +47,436 @@ def iso_to_expirydate(iso_date: str) -> str:
     return d0.strftime("%d%b%Y").upper()
 
 
+def _stream_id_ms(msg_id) -> int:
+    return int(str(msg_id).split("-", 1)[0])
+
+
+def _percentile(sorted_vals: list, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def greeks_hash_key(underlying: str, expiry_iso: str) -> str:
+    return f"{GREEKS_HASH_PREFIX}:{underlying}:{expiry_iso}"
+
+
 class GreeksPoller:
-    def __init__(self, auth_token: str):
+    def __init__(self, auth_token: str, rs: Optional[RedisStore] = None, prof: Optional[Profiler] = None):
         self.auth_token = auth_token
-        self.rs = RedisStore()
+        self.rs = rs or RedisStore()
+
+        # (underlying, expiry) -> {contract key: compact json} as last published
+        self._last: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._polls: Dict[Tuple[str, str], int] = {}
+
+        # scheduler state (run_scheduled)
+        self._updated: Dict[Tuple[str, str], float] = {}     # last successful fetch, epoch sec
+        self._retry_at: Dict[Tuple[str, str], float] = {}    # failed pairs wait until
+        self._failed_at: Dict[Tuple[str, str], float] = {}   # last failure of a pair, epoch sec
+        self._pair_failures: Dict[Tuple[str, str], int] = {}  # failures in a row per pair
+        self._activity: Dict[Tuple[str, str], float] = {}    # option ticks/sec (smoothed)
+        self._age_samples: Dict[str, Deque[float]] = {}
+        self._failures = 0                                   # failed polls in a row, not per-pair rejections
+        self.fetched = 0                                     # successful chain fetches (runners watch it for progress)
+
+        # stage timings + on-demand stack sampling (app/profiling.py)
+        self.prof = prof or Profiler("greeks", self.rs.r)
+        self._sp_fetch = self.prof.stage("fetch")        # REST round trip, items = contracts
+        self._sp_publish = self.prof.stage("publish")
+        self._sp_wait = self.prof.stage("wait")          # request budget sleep
+
+    def _queue_publish(self, pipe, underlying: str, expiry_iso: str, data_list: list) -> Tuple[tuple, dict, int]:
+        """
+        Publish only contracts whose greeks changed since the last poll:
+          - HSET {GREEKS_HASH_PREFIX}:{U}:{E} contract -> json (changed only)
+          - XADD STREAM_GREEKS with kind=delta (changed rows) or kind=full
+            (whole chain, every GREEKS_KEYFRAME_EVERY polls)
+        Queues the writes on `pipe`; -> (pair, published contracts, number
+        changed). Record the contracts in self._last once the pipe executed.
+        """
+        k = (underlying, expiry_iso)
+        prev = self._last.get(k, {})
+
+        cur: Dict[str, str] = {}
+        for it in data_list or []:
+            norm = {str(a).lower(): b for a, b in (it or {}).items()}
+            key = greeks_contract_key(norm)
+            if key:
+                cur[key] = json.dumps(norm, separators=(",", ":"), sort_keys=True)
+
+        changed = {c: v for c, v in cur.items() if prev.get(c) != v}
+        removed = [c for c in prev if c not in cur]
+
+        n_poll = self._polls.get(k, 0)
+        self._polls[k] = n_poll + 1
+        full = (not prev) or (GREEKS_KEYFRAME_EVERY > 0 and n_poll % GREEKS_KEYFRAME_EVERY == 0)
+
+        hkey = greeks_hash_key(underlying, expiry_iso)
+        if changed:
+            pipe.hset(hkey, mapping=changed)
+        if removed:
+            pipe.hdel(hkey, *removed)
+        pipe.expire(hkey, 3600)
+        pipe.hset(GREEKS_UPDATED_KEY, f"{underlying}:{expiry_iso}", str(now_ms()))
+
+        if changed or removed or full:
+            rows = cur if full else changed
+            payload = {
+                "ts_recv": str(now_ms()),
+                "underlying": underlying,
+                "expiry": expiry_iso,  # keep ISO for joining
+                "kind": "full" if full else "delta",
+                "n_total": str(len(cur)),
+                "data_json": "[" + ",".join(rows.values()) + "]",
+            }
+            pipe.xadd(STREAM_GREEKS, payload, maxlen=STREAM_MAXLEN_GREEKS, approximate=True)
+
+        if GREEKS_LATEST_JSON:
+            # legacy whole-chain cache
+            pipe.set(f"md:greeks:latest:{underlying}:{expiry_iso}",
+                     json.dumps(data_list, separators=(",", ":")), ex=3600)
+        return k, cur, len(changed)
+
+    def _publish(self, underlying: str, expiry_iso: str, data_list: list) -> int:
+        """
+        -> number of changed contracts (see _queue_publish).
+        """
+        pipe = self.rs.pipeline()
+        k, cur, n = self._queue_publish(pipe, underlying, expiry_iso, data_list)
+        pipe.execute()
+        self._last[k] = cur
+        return n
+
+    def _poll_pair(self, underlying: str, expiry_iso: str) -> bool:
+        t = clock()
+        res = fetch_option_greeks(self.auth_token, underlying, iso_to_expirydate(expiry_iso))
+        data, t = self._fetched(underlying, expiry_iso, res, t)
+        if data is None:
+            return False
+        self._publish(underlying, expiry_iso, data)
+        self._published(underlying, expiry_iso, data, t)
+        return True
+
+    def _fetched(self, underlying: str, expiry_iso: str, res: Optional[dict], t: float) -> Tuple[Optional[list], float]:
+        """
+        -> (chain rows, or None when the reply was rejected; stage clock).
+        """
+        data = (res or {}).get("data") or []
+        t = self._sp_fetch.lap(t, len(data))
+        if not res or not res.get("status"):
+            self._rejected(underlying, expiry_iso, res)
+            return None, t
+        return data, t
+
+    def _published(self, underlying: str, expiry_iso: str, data: list, t: float) -> None:
+        self._sp_publish.lap(t, len(data))
+        self._updated[(underlying, expiry_iso)] = time.time()
+        self.fetched += 1
+
+    def _rejected(self, underlying: str, expiry_iso: str, res: Optional[dict]) -> None:
+        """
+        Logs a status:false reply. Returns for an answer about this chain (e.g.
+        no data for the underlying); raises GreeksAuthError for a rejected
+        session and RuntimeError for an empty or non-JSON reply.
+        """
+        msg = f"{(res or {}).get('errorcode', '')} {(res or {}).get('message', '')}".strip() or "empty response"
+        print(f"[GREEKS] {underlying} {expiry_iso}: {msg}")
+        if any(s.lower() in msg.lower() for s in _AUTH_ERRORS):
+            raise GreeksAuthError(msg)
+        if not res or msg.startswith("Non-JSON"):
+            raise RuntimeError(msg)
+
+    def _polled(self, k: Tuple[str, str], ok: bool, suspect: bool = False) -> None:
+        """
+        Scheduler bookkeeping after a poll. A failed pair backs off
+        exponentially. Failures that may be the session's (`suspect`: errors,
+        empty replies, not a status:false answer about the chain) raise after
+        GREEKS_MAX_FAILURES in a row so the caller can log in again.
+        """
+        if ok:
+            self._failures = 0
+            self._pair_failures.pop(k, None)
+            self._failed_at.pop(k, None)
+            return
+        now = time.time()
+        n = self._pair_failures.get(k, 0) + 1
+        self._pair_failures[k] = n
+        self._failed_at[k] = now
+        self._retry_at[k] = now + min(FAILED_RETRY_SEC * 2 ** min(n - 1, 16), FAILED_RETRY_MAX_SEC)
+        if not suspect:
+            return
+        self._failures += 1
+        if GREEKS_MAX_FAILURES > 0 and self._failures >= GREEKS_MAX_FAILURES:
+            n, self._failures = self._failures, 0
+            raise RuntimeError(f"{n} greeks polls failed in a row")
 
     def poll_once(self, active_expiry: Dict[str, str], per_request_sleep: float = 0.12):
         """
         active_expiry: {"IOC":"2026-01-27", ...}
         Writes:
-          - STREAM_GREEKS (snapshots)
-          - md:greeks:latest:{UNDERLYING}:{EXPIRY_ISO} (cached JSON list)
+          - STREAM_GREEKS (changed contracts; full chain on keyframes)
+          - {GREEKS_HASH_PREFIX}:{UNDERLYING}:{EXPIRY_ISO} (per-contract hash for joiner)
         """
+        self.prof.start()
         for underlying, expiry_iso in (active_expiry or {}).items():
             try:
-                expirydate = iso_to_expirydate(expiry_iso)
-                res = fetch_option_greeks(self.auth_token, underlying, expirydate)
+                self._poll_pair(underlying, expiry_iso)
+                time.sleep(per_request_sleep)
+            except GreeksAuthError:
+                raise
+            except Exception as e:
+                print(f"[GREEKS] {underlying} {expiry_iso} error: {e!r}")
+                time.sleep(0.5)
+
+    # ---------------------------
+    # Priority scheduler
+    # ---------------------------
+
+    def _load_updated(self) -> None:
+        """
+        Pick up fetch times from a previous run so a restart doesn't refetch everything.
+        """
+        self._set_updated(self.rs.hgetall(GREEKS_UPDATED_KEY))
+
+    def _set_updated(self, mapping: dict) -> None:
+        for field, ts in (mapping or {}).items():
+            underlying, _, expiry_iso = str(field).partition(":")
+            try:
+                self._updated.setdefault((underlying, expiry_iso), int(ts) / 1000.0)
+            except ValueError:
+                pass
 
-                if not res or not res.get("status"):
-                    time.sleep(per_request_sleep)
-                    continue
+    def _set_activity(self, entries: list) -> None:
+        """
+        Option ticks/sec per (underlying, expiry), from the newest
+        GREEKS_ACTIVITY_SAMPLE entries of STREAM_OPT (bounded cost per refresh).
+        """
+        counts: Dict[Tuple[str, str], int] = {}
+        span = 1.0
+        if entries:
+            span = max(1.0, (now_ms() - _stream_id_ms(entries[-1][0])) / 1000.0)
+            for _msg_id, f in entries:
+                k = (f.get("underlying", ""), f.get("expiry", ""))
+                counts[k] = counts.get(k, 0) + 1
 
-                data_list = res.get("data", [])
-                data_json = json.dumps(data_list, separators=(",", ":"))
+        for k in set(self._activity) | set(counts):
+            rate = counts.get(k, 0) / span
+            self._activity[k] = 0.5 * self._activity.get(k, rate) + 0.5 * rate
 
-                payload = {
-                    "ts_recv": str(now_ms()),
-                    "underlying": underlying,
-                    "expiry": expiry_iso,  # keep ISO for joining
-                    "data_json": data_json,
-                }
-                self.rs.xadd(STREAM_GREEKS, payload, maxlen=STREAM_MAXLEN_GREEKS)
+    def _pick_next(self, pairs: list, now: float) -> Optional[Tuple[str, str]]:
+        """
+        Highest score = (seconds since last greeks) x (option ticks/sec): roughly
+        how many ticks the current greeks are behind. Pairs older than
+        GREEKS_MAX_AGE_SEC go first regardless; pairs younger than
+        GREEKS_MIN_AGE_SEC are not refetched. A pair that never fetched and
+        keeps failing ages from its last failure, without the max-age jump.
+        """
+        best, best_score = None, 0.0
+        for k in pairs:
+            if self._retry_at.get(k, 0) > now:
+                continue
+            since = self._updated.get(k)
+            if since is None:
+                since = self._failed_at.get(k, 0.0)
+            age = now - since
+            if age < GREEKS_MIN_AGE_SEC:
+                continue
+            if age >= GREEKS_MAX_AGE_SEC and k not in self._failed_at:
+                score = 1e12 + age
+            else:
+                score = age * (self._activity.get(k, 0.0) + ACTIVITY_FLOOR)
+            if score > best_score:
+                best, best_score = k, score
+        return best
 
-                # cache latest for joiner
-                self.rs.set_latest(f"md:greeks:latest:{underlying}:{expiry_iso}", data_json, ex_sec=3600)
+    def _schedule_start(self) -> None:
+        now = time.time()
+        self._interval = 1.0 / max(GREEKS_REQ_PER_SEC, 0.01)
+        self._pairs: list = []
+        self._last_refresh = 0.0
+        self._last_report = now
+        self._next_req = now
 
-                time.sleep(per_request_sleep)
-            except Exception:
+    def _due(self, now: float) -> Tuple[bool, bool]:
+        """
+        -> (refresh the pairs and activity now, report ages now).
+        """
+        refresh = now - self._last_refresh >= ACTIVITY_REFRESH_SEC
+        report = now - self._last_report >= GREEKS_REPORT_SEC
+        if refresh:
+            self._last_refresh = now
+        if report:
+            self._last_report = now
+        return refresh, report
+
+    def _refreshed(self, active: Optional[Dict[str, str]], entries: list, now: float) -> None:
+        self._pairs = list((active or {}).items())
+        self._set_activity(entries)
+        self._sample_ages(self._pairs, now)
+
+    def _plan(self, now: float) -> Tuple[Optional[Tuple[str, str]], float]:
+        """
+        -> (pair to poll, seconds to wait before it). With nothing due the
+        pair is None and the wait is a short idle.
+        """
+        k = self._pick_next(self._pairs, now)
+        if k is None:
+            return None, min(0.5, self._interval)
+        wait = max(0.0, self._next_req - now)
+        self._next_req = max(self._next_req + self._interval, now + wait)
+        return k, wait
+
+    def _sample_ages(self, pairs: list, now: float) -> None:
+        for k in pairs:
+            if k in self._updated:
+                self._age_samples.setdefault(k[0], deque(maxlen=720)).append(now - self._updated[k])
+
+    def age_percentiles(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for underlying, samples in self._age_samples.items():
+            vals = sorted(samples)
+            if not vals:
+                continue
+            out[underlying] = {
+                "p50": round(_percentile(vals, 0.50), 2),
+                "p90": round(_percentile(vals, 0.90), 2),
+                "p99": round(_percentile(vals, 0.99), 2),
+                "max": round(vals[-1], 2),
+                "n": len(vals),
+            }
+        return out
+
+    def _age_report(self) -> Optional[Dict[str, str]]:
+        stats = self.age_percentiles()
+        if not stats:
+            return None
+        worst = sorted(stats.items(), key=lambda kv: kv[1]["p90"], reverse=True)[:5]
+        print("[GREEKS] age p90 (worst): " + ", ".join(f"{u}={v['p90']}s" for u, v in worst))
+        return {u: json.dumps(v, separators=(",", ":")) for u, v in stats.items()}
+
+    def _report_ages(self) -> None:
+        report = self._age_report()
+        if report:
+            self.rs.hset_meta(GREEKS_AGE_KEY, report)
+
+    def run_scheduled(self, get_active: Callable[[], Dict[str, str]]):
+        """
+        Spend GREEKS_REQ_PER_SEC requests on the (underlying, expiry) pairs whose
+        greeks are most stale relative to their option tick activity.
+        Raises GreeksAuthError on a rejected session and RuntimeError after
+        GREEKS_MAX_FAILURES failed requests in a row (per-chain status:false
+        answers only back that pair off); the caller logs in again.
+        get_active: returns {"IOC": "2026-01-27", ...} (e.g. md:active_expiry)
+        """
+        self._load_updated()
+        self.prof.start()
+        self._schedule_start()
+
+        while True:
+            now = time.time()
+            refresh, report = self._due(now)
+            if refresh:
+                self._refreshed(get_active(), self.rs.xrevrange(STREAM_OPT, count=GREEKS_ACTIVITY_SAMPLE), now)
+            if report:
+                self._report_ages()
+
+            k, wait = self._plan(now)
+            if k is None:
+                time.sleep(wait)
+                continue
+            if wait > 0:
+                t = clock()
+                time.sleep(wait)
+                self._sp_wait.lap(t)
+
+            try:
+                ok = self._poll_pair(*k)
+            except GreeksAuthError:
+                raise
+            except Exception as e:
+                print(f"[GREEKS] {k[0]} {k[1]} error: {e!r}")
                 time.sleep(0.5)
+                self._polled(k, False, suspect=True)
+            else:
+                self._polled(k, ok)
+
+
+class AsyncGreeksPoller(GreeksPoller):
+    """
+    GreeksPoller for a shared event loop (run_async.py): poll_once_async and
+    run_scheduled_async await Redis on AsyncRedisStore, wait with asyncio
+    sleeps and run the REST call (requests, blocking) in the loop's default
+    executor. Scheduling and bookkeeping are GreeksPoller's own steps.
+    """
+
+    def __init__(self, auth_token: str, rs: Optional[AsyncRedisStore] = None, prof: Optional[Profiler] = None):
+        # the profiler publishes from its own thread: give it a blocking client
+        super().__init__(auth_token, rs=rs or AsyncRedisStore(), prof=prof or Profiler("greeks"))
+
+    async def _poll_pair_async(self, underlying: str, expiry_iso: str) -> bool:
+        t = clock()
+        res = await asyncio.to_thread(fetch_option_greeks, self.auth_token, underlying, iso_to_expirydate(expiry_iso))
+        data, t = self._fetched(underlying, expiry_iso, res, t)
+        if data is None:
+            return False
+        pipe = self.rs.pipeline()
+        k, cur, _n = self._queue_publish(pipe, underlying, expiry_iso, data)
+        await pipe.execute()
+        self._last[k] = cur
+        self._published(underlying, expiry_iso, data, t)
+        return True
+
+    async def poll_once_async(self, active_expiry: Dict[str, str], per_request_sleep: float = 0.12):
+        self.prof.start()
+        for underlying, expiry_iso in (active_expiry or {}).items():
+            try:
+                await self._poll_pair_async(underlying, expiry_iso)
+                await asyncio.sleep(per_request_sleep)
+            except GreeksAuthError:
+                raise
+            except Exception as e:
+                print(f"[GREEKS] {underlying} {expiry_iso} error: {e!r}")
+                await asyncio.sleep(0.5)
+
+    async def run_scheduled_async(self, get_active: Callable[[], Dict[str, str]]):
+        """
+        run_scheduled on the event loop; get_active may be a coroutine function.
+        """
+        self._set_updated(await self.rs.hgetall(GREEKS_UPDATED_KEY))
+        self.prof.start()
+        self._schedule_start()
+
+        while True:
+            now = time.time()
+            refresh, report = self._due(now)
+            if refresh:
+                active = get_active()
+                if inspect.isawaitable(active):
+                    active = await active
+                self._refreshed(active, await self.rs.xrevrange(STREAM_OPT, count=GREEKS_ACTIVITY_SAMPLE), now)
+            if report:
+                ages = self._age_report()
+                if ages:
+                    await self.rs.hset_meta(GREEKS_AGE_KEY, ages)
+
+            k, wait = self._plan(now)
+            if k is None:
+                await asyncio.sleep(wait)
+                continue
+            if wait > 0:
+                t = clock()
+                await asyncio.sleep(wait)
+                self._sp_wait.lap(t)
+
+            try:
+                ok = await self._poll_pair_async(*k)
+            except GreeksAuthError:
+                raise
+            except Exception as e:
+                print(f"[GREEKS] {k[0]} {k[1]} error: {e!r}")
+                await asyncio.sleep(0.5)
+                self._polled(k, False, suspect=True)
+            else:
+                self._polled(k, ok)
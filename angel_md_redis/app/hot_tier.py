@@ -0,0 +1,275 @@
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .manifest import PartitionManifest, fsync_dir, fsync_path
+
+# Arrow IPC *stream* format: append-only and readable while the writer is still
+# appending (the file format / Feather v2 footer only exists after close).
+SEGMENT_SUFFIX = ".arrows"
+# compaction leaves segments written to within this many seconds for its next run
+SETTLE_SEC = 60.0
+
+
+def stream_folder(stream: str) -> str:
+    return f"stream={stream.replace(':', '_')}"
+
+
+def _null_to_string(table: pa.Table) -> pa.Table:
+    """
+    All-empty columns come out of pandas as the `null` type; pin them to string
+    so consecutive batches keep the same schema and stay in one segment.
+    """
+    if not any(pa.types.is_null(f.type) for f in table.schema):
+        return table
+    fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+class _Segment:
+    def __init__(self, path: Path, schema: pa.Schema):
+        self.path = path
+        self.schema = schema
+        self.f = open(path, "wb")
+        self.writer = pa.ipc.new_stream(self.f, schema)
+
+    def write(self, table: pa.Table, fsync: bool) -> None:
+        self.writer.write_table(table)
+        self.f.flush()
+        if fsync:
+            os.fsync(self.f.fileno())
+
+    def size(self) -> int:
+        return self.f.tell()
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        finally:
+            self.f.close()
+
+
+class HotTierWriter:
+    """
+    Intraday hot tier: uncompressed Arrow IPC stream segments per stream/day.
+
+      hot/
+        stream=md_ticks_opt/
+          dt=YYYY-MM-DD/
+            seg-<pid>-<ms>.arrows
+
+    Each archiver process appends to its own segment; a segment rolls when the
+    schema changes or it grows past `max_segment_bytes`. Readers memory-map the
+    segments (see `read_hot`) while they are being written.
+
+    Rows arriving late for an older day than the newest one written go to a
+    fresh segment that is closed right away, so compaction of that day (again,
+    on its next run) never unlinks a file still being appended to. A segment
+    compaction removed underneath is not written to again.
+    """
+
+    def __init__(self, root: str, stream: str, fsync: bool = True, max_segment_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.stream = stream
+        self.fsync = bool(fsync)
+        self.max_segment_bytes = int(max_segment_bytes)
+        self._open: Dict[str, _Segment] = {}
+        self._latest = ""
+        self._seq = 0
+
+    def _new_segment(self, dt_str: str, schema: pa.Schema) -> _Segment:
+        folder = self.root / stream_folder(self.stream) / f"dt={dt_str}"
+        folder.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        path = folder / f"seg-{os.getpid()}-{int(time.time() * 1000)}-{self._seq}{SEGMENT_SUFFIX}"
+        return _Segment(path, schema)
+
+    def append(self, dt_str: str, table: pa.Table) -> None:
+        table = _null_to_string(table)
+
+        # A new day means older days are done for this process
+        if dt_str > self._latest:
+            self._latest = dt_str
+            for old in [d for d in self._open if d < dt_str]:
+                self._open.pop(old).close()
+
+        seg = self._open.get(dt_str)
+        if seg is not None and (not seg.schema.equals(table.schema) or seg.size() >= self.max_segment_bytes
+                                or os.fstat(seg.f.fileno()).st_nlink == 0):
+            seg.close()
+            seg = None
+        if seg is None:
+            seg = self._new_segment(dt_str, table.schema)
+            self._open[dt_str] = seg
+
+        seg.write(table, self.fsync)
+        if dt_str < self._latest:
+            # late rows: that day may be compacted any time, leave nothing open in it
+            self._open.pop(dt_str).close()
+
+    def close(self) -> None:
+        for seg in self._open.values():
+            seg.close()
+        self._open.clear()
+
+
+def hot_segments(root: str, stream: str, dt_str: str) -> List[Path]:
+    folder = Path(root) / stream_folder(stream) / f"dt={dt_str}"
+    if not folder.exists():
+        return []
+    return sorted(folder.glob(f"seg-*{SEGMENT_SUFFIX}"))
+
+
+def _read_segment(path: Path) -> List[pa.RecordBatch]:
+    """
+    Zero-copy read of every complete batch. The last batch of a segment that is
+    still being written may be torn; it is skipped until the next read.
+    """
+    batches: List[pa.RecordBatch] = []
+    try:
+        reader = pa.ipc.open_stream(pa.memory_map(str(path), "r"))
+    except (pa.ArrowInvalid, OSError):
+        # writer has not finished the schema message yet
+        return batches
+    while True:
+        try:
+            batches.append(reader.read_next_batch())
+        except StopIteration:
+            break
+        except (pa.ArrowInvalid, OSError):
+            break
+    return batches
+
+
+def read_hot(root: str, stream: str, dt_str: str, columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+    """
+    Memory-mapped view over a stream's hot segments for one day.
+    """
+    return _read_segments(hot_segments(root, stream, dt_str), columns)
+
+
+def _read_segments(paths: List[Path], columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+    tables = []
+    for path in paths:
+        batches = _read_segment(path)
+        if batches:
+            t = pa.Table.from_batches(batches)
+            if columns:
+                t = t.select([c for c in columns if c in t.column_names])
+            tables.append(t)
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def compact_hot_day(
+    root: str,
+    out_dir: str,
+    stream: str,
+    dt_str: str,
+    partition_by_symbol: bool = True,
+    compression: str = "zstd",
+    remove: bool = True,
+    catalog=None,
+) -> int:
+    """
+    End-of-day: hot segments -> sorted Parquet in the regular lake layout
+    (stream=/dt=/underlying=). Rows are de-duplicated on _redis_id, so a day
+    can be compacted again after a crash. Returns rows written.
+    Only compact finished days. Segments written to in the last SETTLE_SEC
+    are left for the next run, and so are rows that arrive late for the day
+    (new segments): compacting the day again adds them to the lake, with
+    the rows already committed skipped by the manifests.
+    catalog: app.catalog.Catalog to index the new files in.
+    """
+    now = time.time()
+    segments, recent = [], 0
+    for path in hot_segments(root, stream, dt_str):
+        try:
+            settled = now - path.stat().st_mtime >= SETTLE_SEC
+        except FileNotFoundError:
+            continue
+        if settled:
+            segments.append(path)
+        else:
+            recent += 1
+    if recent:
+        print(f"[HOT] stream={stream} dt={dt_str}: {recent} segment(s) written in the last {SETTLE_SEC:.0f}s left for the next run")
+    table = _read_segments(segments)
+    if table is None or table.num_rows == 0:
+        return 0
+
+    sort_keys: List[Tuple[str, str]] = [("ts_recv", "ascending")]
+    if "_redis_id" in table.column_names:
+        # one row per Redis ID, keep the first; IDs are per physical stream (shards)
+        rownum = pa.array(range(table.num_rows), type=pa.int64())
+        keys = [k for k in ("_stream", "_redis_id") if k in table.column_names]
+        first = (
+            pa.table({**{k: table[k] for k in keys}, "_i": rownum})
+            .group_by(keys)
+            .aggregate([("_i", "min")])
+        )
+        # order is restored by the sort below
+        table = table.take(first["_i_min"])
+        sort_keys.append(("_redis_id", "ascending"))
+    table = table.sort_by(sort_keys)
+
+    key_col: Optional[str] = None
+    if partition_by_symbol:
+        for cand in ("underlying", "symbol"):
+            if cand in table.column_names:
+                key_col = cand
+                break
+
+    base = Path(out_dir) / stream_folder(stream) / f"dt={dt_str}"
+    ts = int(time.time() * 1000)
+    parts: List[Tuple[Path, pa.Table]] = []
+    if key_col:
+        for key in pc.unique(table[key_col]).to_pylist():
+            mask = pc.is_null(table[key_col]) if key is None else pc.equal(table[key_col], key)
+            parts.append((base / f"{key_col}={str(key)}", table.filter(mask)))
+    else:
+        parts.append((base, table))
+
+    for folder, part in parts:
+        # rows an earlier (interrupted) compaction already committed are skipped
+        manifest = PartitionManifest(folder)
+        manifest.recover()
+        part = manifest.new_rows(part)
+        if part.num_rows == 0:
+            continue
+        folder.mkdir(parents=True, exist_ok=True)
+        name = f"part-eod-{ts}.parquet"
+        tmp_path = folder / f".tmp-{name}"
+        manifest.begin(name)
+        pq.write_table(part, tmp_path, compression=compression)
+        # durable before the manifest commit: the hot segments are unlinked below
+        fsync_path(tmp_path)
+        tmp_path.replace(folder / name)
+        fsync_dir(folder)
+        nbytes = (folder / name).stat().st_size
+        rec = manifest.commit(name, part, nbytes)
+        if catalog is not None:
+            catalog.add(folder / name, part, nbytes, rec)
+
+    if remove:
+        for path in segments:
+            path.unlink(missing_ok=True)
+        try:
+            segments[0].parent.rmdir()
+        except OSError:
+            pass
+
+    return table.num_rows
+
+
+def hot_days(root: str, stream: str) -> List[str]:
+    folder = Path(root) / stream_folder(stream)
+    if not folder.exists():
+        return []
+    return sorted(p.name.split("=", 1)[1] for p in folder.glob("dt=*") if p.is_dir())
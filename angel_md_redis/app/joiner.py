@@ -1,11 +1,16 @@
 import os
 import json
 import time
-from typing import Dict, Any, Tuple
+from operator import is_not
+from typing import Dict, Any, List, Optional, Tuple
 
+import numpy as np
 import redis
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+from .utils import option_contract_key, safe_float
+from .features import RollingFeatureEngine, tick_numbers
+from .redis_store import AsyncRedisStore, RedisStore
+from .profiling import Profiler, clock
 
 TICKS_STREAM = os.getenv("TICKS_STREAM_OPT", "md:ticks:opt")
 OUT_STREAM = os.getenv("FEATURES_STREAM_OPT", "md:features:opt")
@@ -14,8 +19,23 @@ OUT_MAXLEN = int(os.getenv("FEATURES_STREAM_MAXLEN", "500000"))
 GROUP = os.getenv("JOINER_GROUP", "joiner")
 CONSUMER = os.getenv("JOINER_CONSUMER", "joiner-1")
 
-# refresh greeks cache at most every N seconds per (underlying, expiry)
-GREEKS_REFRESH_SEC = float(os.getenv("GREEKS_REFRESH_SEC", "3.0"))
+# per-contract greeks hash written by GreeksPoller: {prefix}:{UNDERLYING}:{EXPIRY_ISO}
+GREEKS_HASH_PREFIX = os.getenv("GREEKS_HASH_PREFIX", "md:greeks:c")
+
+# 1 = add rolling-window features (app/features.py) to every joined row
+FEATURES_ENABLED = os.getenv("FEATURES_ENABLED", "1") == "1"
+
+# sharded ticks (OPT_SHARDS > 1): shards this worker reads, e.g. "0,1" (empty = all)
+JOINER_SHARDS = [int(x) for x in os.getenv("JOINER_SHARDS", "").split(",") if x.strip()] or None
+
+# 1 = add iv_fit from the fitted smile (run_vol_surface.py) for every row
+JOINER_IV_FIT = os.getenv("JOINER_IV_FIT", "0") == "1"
+
+# how often to check md:greeks:updated for re-polled chains (0 = every batch)
+JOINER_GREEKS_REFRESH_MS = int(os.getenv("JOINER_GREEKS_REFRESH_MS", "0"))
+
+# (underlying, expiry) -> ts of the last poll; written by GreeksPoller with each chain
+GREEKS_UPDATED_KEY = "md:greeks:updated"
 
 
 def _ensure_group(r: redis.Redis, stream: str, group: str):
@@ -31,85 +51,380 @@ def _lower_keys(d: Dict[str, Any]) -> Dict[str, Any]:
     return {str(k).lower(): v for k, v in d.items()}
 
 
+# contract fields the producer drops from tick payloads under Redis pressure (LEAN and above)
+STATIC_FIELDS = ("tradingsymbol", "expiry", "strike", "cp", "exchange")
+
+# greeks columns of a joined row
+GREEK_FIELDS = ("iv", "delta", "gamma", "theta", "vega")
+
+
+def _greek_strings(raw: str) -> List[str]:
+    try:
+        g = json.loads(raw) or {}
+    except Exception:
+        g = {}
+    return [str(g.get("iv") or g.get("impliedvolatility") or ""), str(g.get("delta") or ""),
+            str(g.get("gamma") or ""), str(g.get("theta") or ""), str(g.get("vega") or "")]
+
+
+class GreeksTable:
+    """
+    Greeks of every chain the joiner has seen, laid out for batch lookups.
+
+    vals is a NumPy object array [row, GREEK_FIELDS] of the output strings
+    (row 0 = unknown contract, all ""). Each chain's contract keys
+    (tradingsymbol and strike+cp) map to a fixed row, and (token, expiry) ->
+    row is resolved once, so a batch is one list lookup plus one fancy index.
+
+    A chain is reloaded (one HGETALL) when md:greeks:updated shows a poll newer
+    than the one loaded, checked at most every JOINER_GREEKS_REFRESH_MS; only
+    values that changed are decoded.
+    """
+
+    def __init__(self, r: redis.Redis, capacity: int = 4096):
+        self.r = r
+        self.vals = np.full((max(capacity, 2), len(GREEK_FIELDS)), "", dtype=object)
+        self.n = 1
+        self._free: List[int] = []
+        self._keys: Dict[Tuple[str, str], Dict[str, int]] = {}   # chain -> contract key -> row
+        self._loaded: Dict[Tuple[str, str], Optional[str]] = {}  # chain -> md:greeks:updated value loaded
+        self._raw: Dict[int, str] = {}                           # row -> JSON its strings came from
+        self._rows: Dict[Tuple[str, str], int] = {}              # (token, expiry) -> row
+        self._updated: Dict[str, str] = {}
+        self._checked = 0.0
+
+    def _alloc(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self.n == len(self.vals):
+            grown = np.full((2 * len(self.vals), len(GREEK_FIELDS)), "", dtype=object)
+            grown[:self.n] = self.vals
+            self.vals = grown
+        self.n += 1
+        return self.n - 1
+
+    def _chain_keys(self, chains: List[Tuple[str, str]]) -> List[str]:
+        return [f"{GREEKS_HASH_PREFIX}:{u}:{e}" for u, e in chains]
+
+    def _apply(self, chains: List[Tuple[str, str]], mappings: List[dict]) -> None:
+        reshaped = False
+        for chain, mapping in zip(chains, mappings):
+            mapping = mapping or {}
+            self._loaded[chain] = self._updated.get(f"{chain[0]}:{chain[1]}")
+            keys = self._keys.setdefault(chain, {})
+            for key, raw in mapping.items():
+                row = keys.get(key)
+                if row is None:
+                    row = keys[key] = self._alloc()
+                    reshaped = True
+                if self._raw.get(row) != raw:
+                    self.vals[row] = _greek_strings(raw)
+                    self._raw[row] = raw
+            for key in [k for k in keys if k not in mapping]:
+                row = keys.pop(key)
+                self.vals[row] = ""
+                self._raw.pop(row, None)
+                self._free.append(row)
+                reshaped = True
+        if reshaped:
+            # contracts came or went: resolve tokens again
+            self._rows.clear()
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if (now - self._checked) * 1000.0 < JOINER_GREEKS_REFRESH_MS:
+            return False
+        self._checked = now
+        return True
+
+    def _plan(self, rows: List[Dict[str, Any]], updated: Optional[dict]) -> Tuple[list, List[Tuple[str, str]]]:
+        """
+        -> (ids, chains to (re)load): loaded chains polled since, plus new
+        chains of contracts not resolved yet.
+        """
+        chains = []
+        if updated is not None:
+            self._updated = updated
+            chains = [c for c, ts in self._loaded.items() if updated.get(f"{c[0]}:{c[1]}") != ts]
+        ids = [(f.get("token"), f.get("expiry")) for f in rows]
+        get = self._rows.get
+        if None in map(get, ids):
+            new = {(str(f.get("underlying", "")), str(f.get("expiry", ""))) for f, i in zip(rows, ids) if get(i) is None}
+            chains += sorted(c for c in new if c[0] and c[1] and c not in self._loaded)
+        return ids, chains
+
+    def _resolve(self, f: Dict[str, Any]) -> int:
+        keys = self._keys.get((str(f.get("underlying", "")), str(f.get("expiry", ""))))
+        if not keys:
+            return 0
+        tsym = f.get("tradingsymbol", "")
+        row = keys.get(str(tsym)) if tsym else None
+        if row is None:
+            row = keys.get(option_contract_key(f.get("strike"), f.get("cp")), 0)
+        return row
+
+    def _gather(self, rows: List[Dict[str, Any]], ids: list) -> np.ndarray:
+        idx = list(map(self._rows.get, ids))
+        if None in idx:
+            for i, row in enumerate(idx):
+                if row is None:
+                    idx[i] = self._resolve(rows[i])
+                    if ids[i][0]:
+                        self._rows[ids[i]] = idx[i]
+        return self.vals.take(idx, axis=0)
+
+    def lookup(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        -> [len(rows), GREEK_FIELDS] output strings ("" for unknown contracts).
+        Looked up by tradingsymbol first, then by strike+cp.
+        """
+        updated = (self.r.hgetall(GREEKS_UPDATED_KEY) or {}) if self._due() else None
+        ids, chains = self._plan(rows, updated)
+        if chains:
+            pipe = self.r.pipeline(transaction=False)
+            for key in self._chain_keys(chains):
+                pipe.hgetall(key)
+            self._apply(chains, pipe.execute())
+        return self._gather(rows, ids)
+
+    async def lookup_async(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        # lookup() over a redis.asyncio client
+        updated = (await self.r.hgetall(GREEKS_UPDATED_KEY) or {}) if self._due() else None
+        ids, chains = self._plan(rows, updated)
+        if chains:
+            pipe = self.r.pipeline(transaction=False)
+            for key in self._chain_keys(chains):
+                pipe.hgetall(key)
+            self._apply(chains, await pipe.execute())
+        return self._gather(rows, ids)
+
+
 class OptionsGreeksJoiner:
-    def __init__(self):
-        self.r = redis.from_url(REDIS_URL, decode_responses=True)
-        _ensure_group(self.r, TICKS_STREAM, GROUP)
+    def __init__(self, shards=JOINER_SHARDS, consumer: str = CONSUMER):
+        # tick streams may be sharded over several Redis endpoints; greeks and output stay on self.r
+        self.rs = RedisStore()
+        self.r = self.rs.r
+        self.consumer = consumer
+        self.streams = self.rs.shard_streams(TICKS_STREAM, shards)
+        for s in self.streams:
+            _ensure_group(self.rs.client_for(s), s, GROUP)
+        self._init_join(Profiler("joiner", self.r))
+
+    def _init_join(self, prof: Profiler):
+        self.features = RollingFeatureEngine() if FEATURES_ENABLED else None
+        self._meta: Dict[str, Dict[str, str]] = {}
+        self._lower_ok = set()    # tick field names known to be lower-case
+        self.greeks = GreeksTable(self.r)
 
-        self._cache: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
-        self._cache_t: Dict[Tuple[str, str], float] = {}
+        self.surface = None
+        if JOINER_IV_FIT:
+            from .vol_surface import VolSurfaceReader
+            self.surface = VolSurfaceReader()
 
-    def _load_greeks_map(self, underlying: str, expiry: str) -> Dict[str, Dict[str, Any]]:
+        # per-batch stage timings + on-demand stack sampling (app/profiling.py)
+        self.prof = prof
+        self._sp_read = self.prof.stage("read")      # XREADGROUP, incl. blocking
+        self._sp_meta = self.prof.stage("meta")      # lean ticks: static fields
+        self._sp_greeks = self.prof.stage("greeks")
+        self._sp_build = self.prof.stage("build")    # output rows + iv_fit + features
+        self._sp_write = self.prof.stage("write")    # XADD + XACK round trip
+
+    def _missing_meta(self, rows: List[Dict[str, Any]]) -> Optional[List[str]]:
         """
-        Loads latest greeks list from:
-          md:greeks:latest:{UNDERLYING}:{EXPIRY_ISO}
-        Builds map by tradingsymbol -> greeks dict
+        Tokens of lean ticks (no contract fields) whose meta:opt is not cached
+        yet; None if no row is lean.
         """
-        key = f"md:greeks:latest:{underlying}:{expiry}"
-        raw = self.r.get(key)
-        if not raw:
-            return {}
-
-        try:
-            items = json.loads(raw)
-        except Exception:
-            return {}
-
-        m: Dict[str, Dict[str, Any]] = {}
-        for it in items or []:
-            norm = _lower_keys(it or {})
-            tsym = norm.get("tradingsymbol") or norm.get("symbol")
-            if not tsym:
-                continue
-            m[str(tsym)] = norm
-        return m
+        lean = {str(f["token"]) for f in rows if not f.get("expiry") and f.get("token")}
+        if not lean:
+            return None
+        return sorted(lean - self._meta.keys())
+
+    def _store_meta(self, tokens: List[str], metas: List[dict]) -> None:
+        for tok, meta in zip(tokens, metas):
+            if meta:
+                self._meta[tok] = {k: meta[k] for k in STATIC_FIELDS if k in meta}
+
+    def _add_static(self, rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        added = []
+        for f in rows:
+            extra = {}
+            if not f.get("expiry") and f.get("token"):
+                extra = {k: v for k, v in self._meta.get(str(f["token"]), {}).items() if not f.get(k)}
+                f.update(extra)
+            added.append(extra)
+        return added
+
+    def _fill_static(self, rows: List[Dict[str, Any]]) -> Optional[List[Dict[str, str]]]:
+        """
+        Lean ticks carry no contract fields: fill them in place from
+        meta:opt:{token} (cached; one pipelined HGETALL for unseen tokens).
+        -> per row, the fields that were added (None if no row was lean).
+        """
+        missing = self._missing_meta(rows)
+        if missing is None:
+            return None
+        if missing:
+            pipe = self.r.pipeline(transaction=False)
+            for tok in missing:
+                pipe.hgetall(f"meta:opt:{tok}")
+            self._store_meta(missing, pipe.execute())
+        return self._add_static(rows)
+
+    def _lowered(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        self._lower_ok.update(k for k in fields if isinstance(k, str) and k == k.lower())
+        return _lower_keys(fields)
+
+    def _rows_of(self, msgs: List[Tuple[str, Dict[str, Any]]]) -> Tuple[list, list]:
+        outs = [fields for _msg_id, fields in msgs]
+        # producer fields are already lower-case: copy only rows with a key not seen lower-case before
+        ok = self._lower_ok.issuperset
+        return outs, [f if ok(f) else self._lowered(f) for f in outs]
 
-    def _get_greeks_for(self, underlying: str, expiry: str, tradingsymbol: str) -> Dict[str, Any]:
-        k = (underlying, expiry)
-        now = time.time()
-        if (k not in self._cache) or ((now - self._cache_t.get(k, 0)) > GREEKS_REFRESH_SEC):
-            self._cache[k] = self._load_greeks_map(underlying, expiry)
-            self._cache_t[k] = now
-        return self._cache.get(k, {}).get(tradingsymbol, {})
+    def _build(self, outs: list, rows: list, filled: Optional[list], greeks: np.ndarray) -> List[Dict[str, Any]]:
+        if any(map(is_not, rows, outs)):
+            outs = [out if f is out else {**out, **(filled[i] if filled else {})}
+                    for i, (f, out) in enumerate(zip(rows, outs))]
+
+        iv, delta, gamma, theta, vega = greeks.T.tolist()
+        for out, a, b, c, d, e in zip(outs, iv, delta, gamma, theta, vega):
+            out["iv"] = a
+            out["delta"] = b
+            out["gamma"] = c
+            out["theta"] = d
+            out["vega"] = e
+
+        if self.surface is not None:
+            for out, f in zip(outs, rows):
+                strike = safe_float(f.get("strike"))
+                iv_fit = self.surface.iv(str(f.get("underlying", "")), str(f.get("expiry", "")), strike) if strike else None
+                out["iv_fit"] = f"{iv_fit:.6g}" if iv_fit is not None else ""
+
+        if self.features is not None:
+            update, names = self.features.update, self.features.names
+            for out, f in zip(outs, rows):
+                out.update(zip(names, update(str(f.get("token", "")), *tick_numbers(f))))
+        return outs
+
+    def join_batch(self, msgs: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Joined output rows for one XREADGROUP batch, in order: tick fields
+        (+ static fields of lean ticks), greeks, then iv_fit / features.
+        Rows are built in place on the message dicts where possible.
+        """
+        t = clock()
+        n = len(msgs)
+        outs, rows = self._rows_of(msgs)
+        filled = self._fill_static(rows)
+        t = self._sp_meta.lap(t, n)
+        greeks = self.greeks.lookup(rows)
+        t = self._sp_greeks.lap(t, n)
+        outs = self._build(outs, rows, filled, greeks)
+        self._sp_build.lap(t, n)
+        return outs
 
     def run_forever(self):
-        print(f"[JOINER] reading {TICKS_STREAM} -> writing {OUT_STREAM}")
+        print(f"[JOINER] reading {', '.join(self.streams)} -> writing {OUT_STREAM}")
+        self.prof.start()
 
         while True:
-            resp = self.r.xreadgroup(
-                groupname=GROUP,
-                consumername=CONSUMER,
-                streams={TICKS_STREAM: ">"},
-                count=500,
-                block=2000,
-            )
+            t = clock()
+            resp = self.rs.xreadgroup(GROUP, self.consumer, {s: ">" for s in self.streams}, count=500, block_ms=2000)
+            self._sp_read.lap(t, sum(len(msgs) for _s, msgs in resp or ()))
 
             if not resp:
                 continue
 
-            for _stream, msgs in resp:
-                ack_ids = []
-                for msg_id, fields in msgs:
-                    f = _lower_keys(fields)
+            for stream, msgs in resp:
+                outs = self.join_batch(msgs)
+                t = clock()
+                pipe = self.r.pipeline(transaction=False)
+                for out in outs:
+                    pipe.xadd(OUT_STREAM, out, maxlen=OUT_MAXLEN, approximate=True)
+                if outs:
+                    ack_ids = [msg_id for msg_id, _fields in msgs]
+                    ticks = self.rs.client_for(stream)
+                    if ticks is self.r:
+                        pipe.xack(stream, GROUP, *ack_ids)
+                        pipe.execute()
+                    else:
+                        # shard on another endpoint: ACK after the output is written
+                        pipe.execute()
+                        ticks.xack(stream, GROUP, *ack_ids)
+                self._sp_write.lap(t, len(msgs))
+
 
-                    underlying = f.get("underlying", "")
-                    expiry = f.get("expiry", "")
-                    tsym = f.get("tradingsymbol", "")
+class AsyncOptionsGreeksJoiner(OptionsGreeksJoiner):
+    """
+    OptionsGreeksJoiner on redis.asyncio: the same join, with every Redis
+    round trip awaited, so several joiners (e.g. one per shard set) and the
+    greeks poller can share one event loop (run_async.py). `rs` and `prof`
+    may be shared between instances; the join itself runs on the loop, one
+    batch at a time.
+    """
 
-                    greeks = {}
-                    if underlying and expiry and tsym:
-                        greeks = self._get_greeks_for(str(underlying), str(expiry), str(tsym))
+    def __init__(self, shards=JOINER_SHARDS, consumer: str = CONSUMER,
+                 rs: Optional[AsyncRedisStore] = None, prof: Optional[Profiler] = None):
+        self.rs = rs or AsyncRedisStore()
+        self.r = self.rs.r
+        self.consumer = consumer
+        self.streams = self.rs.shard_streams(TICKS_STREAM, shards)
+        # the profiler publishes from its own thread: give it a blocking client
+        self._init_join(prof or Profiler("joiner"))
 
-                    # pick common greeks keys (depends on API response)
-                    out = dict(fields)  # keep original tick fields
-                    out["iv"] = str(greeks.get("iv") or greeks.get("impliedvolatility") or "")
-                    out["delta"] = str(greeks.get("delta") or "")
-                    out["gamma"] = str(greeks.get("gamma") or "")
-                    out["theta"] = str(greeks.get("theta") or "")
-                    out["vega"] = str(greeks.get("vega") or "")
+    async def _fill_static_async(self, rows: List[Dict[str, Any]]) -> Optional[List[Dict[str, str]]]:
+        missing = self._missing_meta(rows)
+        if missing is None:
+            return None
+        if missing:
+            pipe = self.r.pipeline(transaction=False)
+            for tok in missing:
+                pipe.hgetall(f"meta:opt:{tok}")
+            self._store_meta(missing, await pipe.execute())
+        return self._add_static(rows)
 
-                    self.r.xadd(OUT_STREAM, out, maxlen=OUT_MAXLEN, approximate=True)
-                    ack_ids.append(msg_id)
+    async def join_batch_async(self, msgs: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        t = clock()
+        n = len(msgs)
+        outs, rows = self._rows_of(msgs)
+        filled = await self._fill_static_async(rows)
+        t = self._sp_meta.lap(t, n)
+        greeks = await self.greeks.lookup_async(rows)
+        if self.surface is not None and self.surface.due():
+            from .vol_surface import VOLSURF_KEY
+            self.surface.load(await self.r.hgetall(VOLSURF_KEY))
+        t = self._sp_greeks.lap(t, n)
+        outs = self._build(outs, rows, filled, greeks)
+        self._sp_build.lap(t, n)
+        return outs
+
+    async def run(self):
+        for s in self.streams:
+            await self.rs.ensure_group(s, GROUP)
+        print(f"[JOINER] (async) reading {', '.join(self.streams)} as {self.consumer} -> writing {OUT_STREAM}")
+        self.prof.start()
+
+        while True:
+            t = clock()
+            resp = await self.rs.xreadgroup(GROUP, self.consumer, {s: ">" for s in self.streams}, count=500, block_ms=2000)
+            self._sp_read.lap(t, sum(len(msgs) for _s, msgs in resp or ()))
+
+            if not resp:
+                continue
 
-                if ack_ids:
-                    self.r.xack(TICKS_STREAM, GROUP, *ack_ids)
+            for stream, msgs in resp:
+                outs = await self.join_batch_async(msgs)
+                t = clock()
+                pipe = self.r.pipeline(transaction=False)
+                for out in outs:
+                    pipe.xadd(OUT_STREAM, out, maxlen=OUT_MAXLEN, approximate=True)
+                if outs:
+                    ack_ids = [msg_id for msg_id, _fields in msgs]
+                    ticks = self.rs.client_for(stream)
+                    if ticks is self.r:
+                        pipe.xack(stream, GROUP, *ack_ids)
+                        await pipe.execute()
+                    else:
+                        # shard on another endpoint: ACK after the output is written
+                        await pipe.execute()
+                        await ticks.xack(stream, GROUP, *ack_ids)
+                self._sp_write.lap(t, len(msgs))
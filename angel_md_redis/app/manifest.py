@@ -0,0 +1,256 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+MANIFEST_NAME = "_manifest.jsonl"
+WATERMARK_NAME = "_watermark.json"
+
+ZERO_ID = (0, 0)
+
+
+def parse_id(redis_id: str) -> Tuple[int, int]:
+    """
+    "1700000000000-3" -> (1700000000000, 3), ordered like the stream.
+    """
+    ms, _, seq = str(redis_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def format_id(i: Tuple[int, int]) -> str:
+    return f"{i[0]}-{i[1]}"
+
+
+def fsync_path(path: Path) -> None:
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(folder: Path) -> None:
+    """
+    Persist a rename. Not supported on every platform (e.g. Windows); ignore there.
+    """
+    try:
+        fsync_path(folder)
+    except OSError:
+        pass
+
+
+def _append_line(path: Path, rec: dict, fsync: bool) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+
+
+def ids_after(table: pa.Table, after: Tuple[int, int]) -> pa.Array:
+    """
+    Boolean mask: rows whose _redis_id is greater than `after`.
+    """
+    parts = pc.split_pattern(pc.cast(table["_redis_id"], pa.string()), "-", max_splits=1)
+    ms = pc.cast(pc.list_element(parts, 0), pa.int64())
+    seq = pc.cast(pc.list_element(parts, 1), pa.int64())
+    return pc.or_(
+        pc.greater(ms, after[0]),
+        pc.and_(pc.equal(ms, after[0]), pc.greater(seq, after[1])),
+    )
+
+
+class PartitionManifest:
+    """
+    Commit log of one lake partition folder (stream=/dt=/key=), `_manifest.jsonl`:
+
+      {"op": "begin",  "file": ...}                        before the rename
+      {"op": "commit", "file": ..., "min_id", "max_id",    after the file is durable
+       "max_ids": {stream: id}, "rows", "bytes", "min_ts", "max_ts"}
+
+    Files listed by a commit line are complete and hold each Redis ID once:
+    rows at or below the committed max ID of their source stream (`_stream`)
+    are dropped before a write (`new_rows`), so a batch redelivered after a
+    crash is not written twice. IDs are only ordered within one stream, so
+    every stream that wrote into the partition (shards, a moved endpoint)
+    keeps its own max.
+
+    Loading only reads. The folder's writer calls `recover()` before its
+    first write: a begin without a commit (crash mid-write) removes that
+    file, and a folder written before manifests has its files adopted.
+
+    Assumes one writer per folder, so each stream's IDs arrive in order.
+    """
+
+    def __init__(self, folder: Path, fsync: bool = True):
+        self.folder = Path(folder)
+        self.path = self.folder / MANIFEST_NAME
+        self.fsync = fsync
+        self.max_ids: Dict[str, Tuple[int, int]] = {}
+        self.files = 0
+        self.pending: Set[str] = set()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            if rec.get("op") == "begin":
+                self.pending.add(rec["file"])
+            elif rec.get("op") == "commit":
+                self.pending.discard(rec["file"])
+                self.files += 1
+                # commit lines without max_ids predate per-stream tracking: they only cover rows without _stream
+                for stream, i in (rec.get("max_ids") or {"": rec.get("max_id")}).items():
+                    if i:
+                        self._raise_max(stream, parse_id(i))
+
+    def _raise_max(self, stream: str, i: Tuple[int, int]) -> None:
+        if i > self.max_ids.get(stream, ZERO_ID):
+            self.max_ids[stream] = i
+
+    def recover(self) -> None:
+        """
+        Writer-side step before the first write into the folder.
+        """
+        for name in sorted(self.pending):
+            orphan = self.folder / name
+            if orphan.exists():
+                print(f"[MANIFEST] removing uncommitted {orphan}")
+                orphan.unlink()
+        self.pending.clear()
+        if not self.path.exists():
+            # folder written before manifests: adopt its files as committed
+            for p in sorted(self.folder.glob("part-*.parquet")):
+                _append_line(self.path, {"op": "commit", "file": p.name, "legacy": True}, self.fsync)
+                self.files += 1
+
+    def new_rows(self, table: pa.Table) -> pa.Table:
+        if not self.max_ids or "_redis_id" not in table.column_names or table.num_rows == 0:
+            return table
+        if "_stream" not in table.column_names:
+            after = self.max_ids.get("")
+            return table if after is None else table.filter(ids_after(table, after))
+        streams = pc.cast(table["_stream"], pa.string())
+        names = pc.unique(streams).to_pylist()
+        if len(names) == 1:
+            after = self.max_ids.get(names[0] or "")
+            return table if after is None else table.filter(ids_after(table, after))
+        keep = None
+        for name in names:
+            mask = pc.is_null(streams) if name is None else pc.equal(streams, name)
+            after = self.max_ids.get(name or "")
+            if after is not None:
+                mask = pc.and_(mask, ids_after(table, after))
+            keep = mask if keep is None else pc.or_(keep, mask)
+        return table.filter(keep)
+
+    def begin(self, name: str) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        _append_line(self.path, {"op": "begin", "file": name}, self.fsync)
+
+    def commit(self, name: str, table: pa.Table, nbytes: int) -> dict:
+        rec = {"op": "commit", "file": name, "rows": table.num_rows, "bytes": int(nbytes)}
+        if "_redis_id" in table.column_names and table.num_rows:
+            ids = [parse_id(x) for x in table["_redis_id"].to_pylist()]
+            if "_stream" in table.column_names:
+                streams = [x or "" for x in table["_stream"].to_pylist()]
+            else:
+                streams = [""] * len(ids)
+            per: Dict[str, Tuple[int, int]] = {}
+            for stream, i in zip(streams, ids):
+                if i > per.get(stream, ZERO_ID):
+                    per[stream] = i
+            rec["min_id"], rec["max_id"] = format_id(min(ids)), format_id(max(ids))
+            rec["max_ids"] = {k: format_id(v) for k, v in per.items()}
+            for stream, i in per.items():
+                self._raise_max(stream, i)
+        else:
+            rec["min_id"] = rec["max_id"] = format_id(ZERO_ID)
+        for col in ("ts_recv", "ts"):
+            if col in table.column_names and table.num_rows:
+                mm = pc.min_max(table[col])
+                rec["min_ts"], rec["max_ts"] = mm["min"].as_py(), mm["max"].as_py()
+                break
+        _append_line(self.path, rec, self.fsync)
+        self.files += 1
+        return rec
+
+
+class ManifestCache:
+    """
+    PartitionManifest per folder for its writer, loaded and recovered on
+    first use: one O(1) dict lookup per partition per batch afterwards.
+    """
+
+    def __init__(self, fsync: bool = True):
+        self.fsync = fsync
+        self._m: Dict[Path, PartitionManifest] = {}
+        self._lock = threading.Lock()
+
+    def get(self, folder: Path) -> PartitionManifest:
+        with self._lock:
+            m = self._m.get(folder)
+            if m is None:
+                m = self._m[folder] = PartitionManifest(folder, self.fsync)
+                m.recover()
+            return m
+
+
+class StreamWatermark:
+    """
+    Highest Redis ID whose rows are committed in every partition they touch
+    (`stream=.../_watermark.json`). A redelivered batch at or below it is
+    ACKed without being read into a table. A sharded stream keeps one per
+    shard (`_watermark.{shard}.json`): IDs of different shards are unrelated.
+    """
+
+    def __init__(self, folder: Path, fsync: bool = True, name: str = WATERMARK_NAME):
+        self.path = Path(folder) / name
+        self.fsync = fsync
+        self.id = ZERO_ID
+        try:
+            self.id = parse_id(json.loads(self.path.read_text(encoding="utf-8"))["id"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def advance(self, new_id: Tuple[int, int]) -> None:
+        if new_id <= self.id:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".tmp-{self.path.name}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"id": format_id(new_id)}, f)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        tmp.replace(self.path)
+        self.id = new_id
+
+
+def committed_files(folder: Path) -> List[Path]:
+    """
+    For readers: the partition's committed files (no listing, no dedup needed).
+    Folders written before manifests existed fall back to part-*.parquet.
+    """
+    folder = Path(folder)
+    path = folder / MANIFEST_NAME
+    if not path.exists():
+        return sorted(folder.glob("part-*.parquet"))
+    out = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if rec.get("op") == "commit":
+            out.append(folder / rec["file"])
+    return out
@@ -0,0 +1,357 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .config import (
+    STREAM_OPT_FEATURES, EXPORT_DIR, EXPORT_STEP_MS, EXPORT_WINDOW, EXPORT_STRIDE, EXPORT_FFILL_MS,
+    EXPORT_FEATURES, EXPORT_WORKERS,
+)
+from .hot_tier import stream_folder
+from .manifest import committed_files
+
+DATASET_NAME = "dataset.json"
+INDEX_NAME = "index.parquet"
+KEYS_SUFFIX = ".keys.parquet"
+
+# settings every shard of one export directory must share
+_SETTINGS = ("stream", "features", "step_ms", "window", "stride", "ffill_ms", "dtype")
+_NOT_FEATURES = ("ts_recv", "ts_exch")
+
+
+def lake_partitions(lake: str, stream: str, dt_from: Optional[str] = None, dt_to: Optional[str] = None,
+                    underlyings: Optional[List[str]] = None) -> List[Tuple[str, str, List[Path]]]:
+    """
+    -> [(dt, underlying, committed files)] of `stream` in the lake, oldest first.
+    """
+    out = []
+    for day in sorted((Path(lake) / stream_folder(stream)).glob("dt=*")):
+        dt_str = day.name.split("=", 1)[1]
+        if (dt_from and dt_str < dt_from) or (dt_to and dt_str > dt_to):
+            continue
+        parts = sorted(p for p in day.glob("*=*") if p.is_dir()) or [day]
+        for folder in parts:
+            key = folder.name.split("=", 1)[1] if folder is not day else ""
+            if underlyings and key not in underlyings:
+                continue
+            files = committed_files(folder)
+            if files:
+                out.append((dt_str, key, files))
+    return out
+
+
+def numeric_columns(path: Path) -> List[str]:
+    schema = pq.read_schema(path)
+    return [
+        f.name for f in schema
+        if (pa.types.is_floating(f.type) or pa.types.is_integer(f.type))
+        and f.name not in _NOT_FEATURES and not f.name.startswith("_")
+    ]
+
+
+def _read_partition(files: List[str], features: List[str]):
+    """
+    -> (ts, token codes, token names, float64 [rows, features]) sorted by (token, ts),
+    every feature column forward-filled within its token.
+    """
+    tables = []
+    for path in files:
+        names = pq.read_schema(path).names
+        tables.append(pq.read_table(path, columns=[c for c in ["ts_recv", "token"] + features if c in names]))
+    table = pa.concat_tables(tables, promote_options="permissive")
+    n = table.num_rows
+    tok = pc.dictionary_encode(pc.cast(table["token"], pa.string()).combine_chunks())
+    codes = tok.indices.to_numpy(zero_copy_only=False)
+    ts = table["ts_recv"].to_numpy()
+    # stable: rows with equal ts stay in file (Redis ID) order
+    order = np.lexsort((ts, codes))
+    ts, codes = ts[order], codes[order]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.empty(0, dtype=np.int64)
+    first = np.repeat(starts, np.diff(np.r_[starts, n]))
+    rownum = np.arange(n)
+    x = np.full((n, len(features)), np.nan)
+    for j, name in enumerate(features):
+        if name not in table.column_names:
+            continue
+        col = table[name].cast(pa.float64()).to_numpy()[order]
+        # last non-null row of the same token at or before each row
+        pos = np.where(np.isnan(col), -1, rownum)
+        np.maximum.accumulate(pos, out=pos)
+        pos[pos < first] = -1
+        x[:, j] = np.where(pos >= 0, col[np.maximum(pos, 0)], np.nan)
+    return ts, codes, tok.dictionary.to_pylist(), starts, x
+
+
+def export_partition(job: dict) -> dict:
+    """
+    One (day, underlying) partition -> `{name}.npy` [windows, window, features]
+    plus `{name}.keys.parquet` (token, t_end_ms per window). Process pool worker.
+
+    Every contract is sampled on the same grid: t0 + k x step_ms, k >= 1,
+    taking its last row before each grid time (as-of, forward-filled).
+    Windows of `window` steps start every `stride` steps; a window is kept
+    only if each of its steps has a row at most ffill_ms old.
+    """
+    t_start = time.time()
+    out = Path(job["out_dir"])
+    name = job["name"]
+    step, w, stride = int(job["step_ms"]), int(job["window"]), max(1, int(job["stride"]))
+    max_age = max(int(job["ffill_ms"]), step) if job["ffill_ms"] else None
+    features = job["features"]
+
+    ts, codes, tokens, starts, x = _read_partition(job["files"], features)
+    n = len(ts)
+    grid = np.empty(0, dtype=np.int64)
+    if n:
+        t0 = int(ts.min()) // step * step
+        grid = t0 + step * np.arange(1, (int(ts.max()) - t0) // step + 2, dtype=np.int64)
+    g = len(grid)
+    bounds = np.r_[starts, n]
+
+    def asof(k):
+        a, b = bounds[k], bounds[k + 1]
+        idx = np.searchsorted(ts[a:b], grid, side="left") - 1
+        ok = idx >= 0
+        if max_age is not None:
+            ok &= grid - ts[a:b][np.maximum(idx, 0)] <= max_age
+        return a + idx, ok
+
+    # pass 1: valid window starts per contract (sizes the shard)
+    plan = []
+    total = 0
+    cand = np.arange(0, g - w + 1, stride)
+    for k in range(len(starts)):
+        if not len(cand):
+            break
+        _, ok = asof(k)
+        bad = np.r_[0, np.cumsum(~ok)]
+        keep = cand[bad[cand + w] == bad[cand]]
+        if len(keep):
+            plan.append((k, keep))
+            total += len(keep)
+
+    # pass 2: windows straight into the memory-mapped shard
+    tmp = out / f".tmp-{name}.npy"
+    mm = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.dtype(job["dtype"]), shape=(total, w, len(features)))
+    key_tok = np.empty(total, dtype=np.int32)
+    key_end = np.empty(total, dtype=np.int64)
+    off = 0
+    for k, keep in plan:
+        rows, _ = asof(k)
+        lo, hi = keep[0], keep[-1] + w
+        steps = x[rows[lo:hi]]                               # [steps, features]
+        view = np.lib.stride_tricks.sliding_window_view(steps, w, axis=0)   # [starts, features, window]
+        mm[off:off + len(keep)] = view[keep - lo].transpose(0, 2, 1)
+        key_tok[off:off + len(keep)] = codes[bounds[k]]
+        key_end[off:off + len(keep)] = grid[keep + w - 1]
+        off += len(keep)
+    mm.flush()
+    del mm
+
+    keys = pa.table({
+        "token": pa.DictionaryArray.from_arrays(pa.array(key_tok), pa.array(tokens, type=pa.string())),
+        "t_end_ms": pa.array(key_end),
+    })
+    tmp_keys = out / f".tmp-{name}{KEYS_SUFFIX}"
+    pq.write_table(keys, tmp_keys)
+    tmp.replace(out / f"{name}.npy")
+    # the keys file marks the shard complete (reruns skip it)
+    tmp_keys.replace(out / f"{name}{KEYS_SUFFIX}")
+    return {"file": f"{name}.npy", "dt": job["dt"], "underlying": job["underlying"], "rows": total,
+            "contracts": len(starts), "in_rows": n, "sec": round(time.time() - t_start, 2)}
+
+
+def _build_index(out: Path, meta: dict) -> int:
+    """
+    index.parquet over every finished shard in `out`: shard, row, token,
+    underlying, dt, t_end_ms; shard order is (dt, underlying).
+    """
+    shards, tables = [], []
+    for keys_path in sorted(out.glob(f"shard-*{KEYS_SUFFIX}")):
+        name = keys_path.name[:-len(KEYS_SUFFIX)]
+        keys = pq.read_table(keys_path)
+        dt_str, _, underlying = name[len("shard-"):].partition("_")
+        n = keys.num_rows
+        sid = len(shards)
+        shards.append({"file": f"{name}.npy", "dt": dt_str, "underlying": underlying, "rows": n})
+        tables.append(pa.table({
+            "shard": pa.array(np.full(n, sid, dtype=np.int32)),
+            "row": pa.array(np.arange(n, dtype=np.int64)),
+            "token": keys["token"].cast(pa.string()),
+            "underlying": pa.array([underlying] * n, type=pa.string()).dictionary_encode(),
+            "dt": pa.array([dt_str] * n, type=pa.string()).dictionary_encode(),
+            "t_end_ms": keys["t_end_ms"],
+        }))
+    index = pa.concat_tables(tables) if tables else pa.table({
+        "shard": pa.array([], pa.int32()), "row": pa.array([], pa.int64()), "token": pa.array([], pa.string()),
+        "underlying": pa.array([], pa.string()), "dt": pa.array([], pa.string()), "t_end_ms": pa.array([], pa.int64()),
+    })
+    tmp = out / f".tmp-{INDEX_NAME}"
+    pq.write_table(index, tmp)
+    tmp.replace(out / INDEX_NAME)
+    meta = dict(meta, shards=shards, windows=index.num_rows)
+    tmp = out / f".tmp-{DATASET_NAME}"
+    tmp.write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    tmp.replace(out / DATASET_NAME)
+    return index.num_rows
+
+
+def export_windows(
+    dt_from: Optional[str] = None,
+    dt_to: Optional[str] = None,
+    underlyings: Optional[List[str]] = None,
+    stream: str = STREAM_OPT_FEATURES,
+    lake: str = "data_lake",
+    out_dir: str = EXPORT_DIR,
+    features: Optional[List[str]] = None,
+    step_ms: int = EXPORT_STEP_MS,
+    window: int = EXPORT_WINDOW,
+    stride: int = EXPORT_STRIDE,
+    ffill_ms: int = EXPORT_FFILL_MS,
+    workers: int = EXPORT_WORKERS,
+    dtype: str = "float32",
+) -> Dict[str, int]:
+    """
+    Lake partitions of `stream` (dt=/underlying=, committed files only) ->
+    one shard per (day, underlying) in `out_dir`, built by a process pool,
+    then index.parquet + dataset.json over all shards there.
+
+    Shards already in `out_dir` are kept (a rerun or a later date range only
+    adds the missing ones); the settings must match the existing export.
+    """
+    parts = lake_partitions(lake, stream, dt_from, dt_to, underlyings)
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    if features is None:
+        features = [c.strip() for c in EXPORT_FEATURES.split(",") if c.strip()]
+    if not features and parts:
+        features = numeric_columns(parts[0][2][0])
+
+    meta = {"stream": stream, "features": features, "step_ms": int(step_ms), "window": int(window),
+            "stride": int(stride), "ffill_ms": int(ffill_ms), "dtype": np.dtype(dtype).name}
+    meta_path = out / DATASET_NAME
+    if meta_path.exists():
+        old = json.loads(meta_path.read_text(encoding="utf-8"))
+        if not features:
+            features = meta["features"] = old["features"]
+        diff = [k for k in _SETTINGS if old.get(k) != meta[k]]
+        if diff:
+            raise ValueError(f"{out} was exported with different {', '.join(diff)}; use another EXPORT_DIR")
+
+    jobs = []
+    for dt_str, key, files in parts:
+        name = f"shard-{dt_str}_{key or 'all'}"
+        if (out / f"{name}{KEYS_SUFFIX}").exists():
+            continue
+        jobs.append(dict(meta, out_dir=str(out), name=name, dt=dt_str, underlying=key,
+                         files=[str(f) for f in files], size=sum(f.stat().st_size for f in files)))
+    # largest first, so one big day does not finish last on its own
+    jobs.sort(key=lambda j: -j["size"])
+
+    stats = {"partitions": len(parts), "skipped": len(parts) - len(jobs), "exported": 0, "failed": 0, "windows": 0}
+    n_workers = workers or os.cpu_count() or 1
+
+    def done(job, res):
+        stats["exported"] += 1
+        print(f"[EXPORT] dt={job['dt']} underlying={job['underlying']} rows={res['in_rows']} "
+              f"contracts={res['contracts']} windows={res['rows']} in {res['sec']}s")
+
+    if n_workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            done(job, export_partition(job))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(jobs))) as pool:
+            futures = {pool.submit(export_partition, job): job for job in jobs}
+            for fut in as_completed(futures):
+                job = futures[fut]
+                try:
+                    done(job, fut.result())
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"[EXPORT] dt={job['dt']} underlying={job['underlying']} failed: {e!r}")
+
+    stats["windows"] = _build_index(out, meta)
+    return stats
+
+
+class WindowDataset:
+    """
+    Reader for an export directory. Shards are opened with np.load(mmap_mode="r"),
+    so nothing is read until a batch touches it.
+
+      ds = WindowDataset("data_ml")
+      for x, ids in ds.batches(256, seed=1):    # x: [batch, window, features]
+          keys = ds.keys(ids)                   # token / underlying / dt / t_end_ms
+
+    ds[i] is a read-only view into the shard.
+    """
+
+    def __init__(self, path: str = EXPORT_DIR):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / DATASET_NAME).read_text(encoding="utf-8"))
+        self.features: List[str] = self.meta["features"]
+        self.window = int(self.meta["window"])
+        self.step_ms = int(self.meta["step_ms"])
+        self.shards = [np.load(self.path / s["file"], mmap_mode="r") for s in self.meta["shards"]]
+        # global id i = offsets[shard] + row (index.parquet is in this order)
+        self.offsets = np.r_[0, np.cumsum([len(s) for s in self.shards])].astype(np.int64)
+        self._index: Optional[pa.Table] = None
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        s = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        return self.shards[s][i - self.offsets[s]]
+
+    def keys(self, ids: np.ndarray) -> pa.Table:
+        if self._index is None:
+            self._index = pq.read_table(self.path / INDEX_NAME)
+        return self._index.take(pa.array(np.asarray(ids, dtype=np.int64)))
+
+    def batches(self, batch_size: int, shuffle: bool = True, seed: Optional[int] = None,
+                contiguous: bool = False, drop_last: bool = False) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        -> (x, ids) per batch.
+
+        Default: windows shuffled across all shards; each batch is gathered
+        with one np.take per shard it touches, rows in file order, into a
+        buffer reused for every batch (x is overwritten by the next batch;
+        copy what you keep). No per-sample Python work or copies.
+        contiguous=True: batches are runs of consecutive rows of one shard,
+        in shuffled order, yielded as zero-copy mmap views. Cheapest, but
+        a batch holds neighbouring windows of few contracts.
+        """
+        rng = np.random.default_rng(seed)
+        if contiguous:
+            runs = [(s, r) for s, sh in enumerate(self.shards) for r in range(0, len(sh), batch_size)
+                    if not drop_last or r + batch_size <= len(sh)]
+            order = rng.permutation(len(runs)) if shuffle else range(len(runs))
+            for k in order:
+                s, r = runs[k]
+                x = self.shards[s][r:r + batch_size]
+                yield x, np.arange(r, r + len(x), dtype=np.int64) + self.offsets[s]
+            return
+
+        n = len(self)
+        ids_all = rng.permutation(n) if shuffle else np.arange(n)
+        buf = np.empty((batch_size, self.window, len(self.features)), dtype=np.dtype(self.meta["dtype"]))
+        for b in range(0, n, batch_size):
+            ids = np.sort(ids_all[b:b + batch_size])
+            m = len(ids)
+            if m < batch_size and drop_last:
+                break
+            cut = np.searchsorted(ids, self.offsets)
+            for s in np.flatnonzero(np.diff(cut)):
+                i0, i1 = cut[s], cut[s + 1]
+                # mode="clip": ids are in range, and with mode="raise" NumPy buffers `out`
+                np.take(self.shards[s], ids[i0:i1] - self.offsets[s], axis=0, out=buf[i0:i1], mode="clip")
+            yield buf[:m], ids
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import (
+    PRESSURE_SAMPLE_SEC, PRESSURE_MEM_LEVELS, PRESSURE_LAG_LEVELS, PRESSURE_MAX_MEMORY_MB,
+    PRESSURE_HYSTERESIS, PRESSURE_HOLD_SEC, PRESSURE_GROUP_IDLE_MS, STREAM_EVENTS, STREAM_MAXLEN_EVENTS,
+)
+from .redis_store import RedisStore
+from .utils import now_ms
+
+# Degrade levels, each includes the ones before it
+NORMAL = 0
+CONFLATE = 1     # per-token publish interval (PRESSURE_CONFLATE_MS)
+LEAN = 2         # 4x interval, no depth, option payloads without static fields
+LTP_ONLY = 3     # options resubscribed in LTP mode
+
+LEVEL_NAMES = {NORMAL: "normal", CONFLATE: "conflate", LEAN: "lean", LTP_ONLY: "ltp_only"}
+LEVEL_KEY = "md:pressure:level"
+
+
+def _level_for(value: float, thresholds: List[float]) -> int:
+    return sum(1 for t in thresholds if value >= t)
+
+
+class PressureMonitor:
+    """
+    Samples Redis memory (INFO memory, every endpoint incl. shards) and
+    consumer-group lag (XINFO GROUPS) of `streams` every PRESSURE_SAMPLE_SEC
+    on its own thread and sets `level`.
+
+    Memory is measured against maxmemory, or PRESSURE_MAX_MEMORY_MB, or the
+    host's RAM when neither is set. The level is the highest one whose
+    threshold is crossed by memory fraction (PRESSURE_MEM_LEVELS) or by the
+    largest group lag in entries (PRESSURE_LAG_LEVELS). Groups without a
+    consumer active in the last PRESSURE_GROUP_IDLE_MS (dead or abandoned
+    readers) are left out, so they can't hold the producer in a degraded level.
+
+    Escalation is immediate. De-escalation goes one level at a time, only once
+    both metrics are below PRESSURE_HYSTERESIS x that level's thresholds and
+    the level has held for PRESSURE_HOLD_SEC. Every transition is printed,
+    written to STREAM_EVENTS and handed to `on_change(old, new, stats)` on
+    this thread. The WS thread only reads `level`.
+    """
+
+    def __init__(self, rs: RedisStore, streams: List[str], on_change: Optional[Callable[[int, int, dict], None]] = None,
+                 mem_levels: List[float] = PRESSURE_MEM_LEVELS, lag_levels: List[float] = PRESSURE_LAG_LEVELS,
+                 sample_sec: float = PRESSURE_SAMPLE_SEC):
+        self.rs = rs
+        self.streams = list(streams)
+        self.on_change = on_change
+        self.mem_levels = sorted(mem_levels)
+        self.lag_levels = sorted(lag_levels)
+        self.sample_sec = max(0.1, float(sample_sec))
+        self.max_level = min(len(self.mem_levels), len(self.lag_levels))
+        self.level = NORMAL
+        self.stats: Dict[str, float] = {}
+        self._since = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> Tuple[float, int]:
+        """
+        -> (memory fraction, max lag in entries over groups with a live consumer).
+        """
+        mem = 0.0
+        for client in self.rs.endpoints():
+            info = client.info("memory")
+            used = float(info.get("used_memory", 0))
+            limit = (float(info.get("maxmemory", 0)) or PRESSURE_MAX_MEMORY_MB * 1024 * 1024
+                     or float(info.get("total_system_memory", 0)))
+            if limit:
+                mem = max(mem, used / limit)
+        lag = 0
+        for stream in self.streams:
+            lag = max([lag] + list(self.rs.group_lag(stream, idle_ms=PRESSURE_GROUP_IDLE_MS).values()))
+        return mem, lag
+
+    def _target(self, mem: float, lag: int) -> int:
+        target = min(self.max_level, max(_level_for(mem, self.mem_levels), _level_for(lag, self.lag_levels)))
+        if target >= self.level:
+            return target
+        # stepping down: clear the current level's thresholds by the hysteresis margin, after the hold time
+        i = self.level - 1
+        calm = mem < self.mem_levels[i] * PRESSURE_HYSTERESIS and lag < self.lag_levels[i] * PRESSURE_HYSTERESIS
+        if calm and time.monotonic() - self._since >= PRESSURE_HOLD_SEC:
+            return self.level - 1
+        return self.level
+
+    def tick(self) -> int:
+        mem, lag = self.sample()
+        self.stats = {"mem_frac": round(mem, 4), "lag": lag}
+        new = self._target(mem, lag)
+        if new != self.level:
+            old, self.level = self.level, new
+            self._since = time.monotonic()
+            self._event(old, new)
+            if self.on_change is not None:
+                self.on_change(old, new, dict(self.stats))
+        return self.level
+
+    def _event(self, old: int, new: int) -> None:
+        s = self.stats
+        print(f"[PRESSURE] {LEVEL_NAMES[old]} -> {LEVEL_NAMES[new]} (redis mem {s['mem_frac']:.0%}, max group lag {s['lag']})")
+        evt = {
+            "ts": str(now_ms()),
+            "type": "degrade" if new > old else "restore",
+            "from": LEVEL_NAMES[old],
+            "to": LEVEL_NAMES[new],
+            "stats": json.dumps(s, separators=(",", ":")),
+        }
+        try:
+            pipe = self.rs.pipeline()
+            pipe.xadd(STREAM_EVENTS, evt, maxlen=STREAM_MAXLEN_EVENTS, approximate=True)
+            pipe.set(LEVEL_KEY, LEVEL_NAMES[new])
+            pipe.execute()
+        except Exception as e:
+            # a full Redis (maxmemory + noeviction) refuses writes; the log line still stands
+            print(f"[PRESSURE] event not stored: {e!r}")
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.sample_sec):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[PRESSURE] sample failed: {e!r}")
+
+    def start(self) -> "PressureMonitor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="redis-pressure", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
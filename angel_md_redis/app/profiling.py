@@ -0,0 +1,315 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import redis
+
+from .config import (
+    REDIS_URL, PROFILE_PUBLISH_SEC, PROFILE_CONTROL_POLL_SEC, PROFILE_SAMPLE_MS, PROFILE_SECONDS,
+    PROFILE_MAX_SECONDS, PROFILE_MAX_OVERHEAD, PROFILE_MAX_STACKS, PROFILE_DIR, STREAM_EVENTS, STREAM_MAXLEN_EVENTS,
+)
+from .utils import now_ms
+
+SPANS_PREFIX = "md:prof:spans"      # {prefix}:{component}:{pid} -> stage -> json
+CONTROL_PREFIX = "md:prof:ctl"      # {prefix}:{component} = seconds to sample
+
+clock = time.perf_counter_ns
+
+
+class Stage:
+    """
+    Running totals of one timed stage: calls, items, total / max ns and a
+    power-of-two histogram. add() is a handful of int ops; one thread per stage.
+    """
+    __slots__ = ("name", "scale", "n", "items", "total", "max", "hist")
+
+    def __init__(self, name: str, scale: int = 1):
+        self.name = name
+        self.scale = scale      # 1 in `scale` calls is timed
+        self.n = 0
+        self.items = 0
+        self.total = 0
+        self.max = 0
+        self.hist = [0] * 64    # hist[b]: calls that took [2^(b-1), 2^b) ns
+
+    def add(self, ns: int, items: int = 1) -> None:
+        self.n += 1
+        self.items += items
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.hist[ns.bit_length()] += 1
+
+    def lap(self, t0: int, items: int = 1) -> int:
+        """
+        add(now - t0) -> now, to time consecutive stages with one clock read each.
+        """
+        t = clock()
+        self.add(t - t0, items)
+        return t
+
+
+def _pct_us(hist: List[int], n: int, q: float) -> float:
+    # linear within the power-of-two bucket holding the rank
+    rank = q * n
+    seen = 0
+    for b, c in enumerate(hist):
+        if c and seen + c >= rank:
+            lo = (1 << b) >> 1
+            return round((lo + (lo or 1) * (rank - seen) / c) / 1000.0, 2)
+        seen += c
+    return 0.0
+
+
+class StackSampler:
+    """
+    Wall-clock sampler of every thread's Python stack (sys._current_frames()),
+    every PROFILE_SAMPLE_MS, written as folded stacks
+    ("thread;outer (file:line);...;inner (file:line) count"), the input of
+    flamegraph.pl, speedscope and inferno. Frames are counted by code object
+    and only turned into text at the end.
+
+    Overhead is bounded: after each sample the thread sleeps at least
+    (1 / PROFILE_MAX_OVERHEAD - 1) x that sample's cost, and a run lasts at
+    most PROFILE_MAX_SECONDS. One run at a time per process.
+    """
+
+    def __init__(self, out_dir: str = PROFILE_DIR):
+        self.out_dir = Path(out_dir)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, label: str, on_done=None) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+            seconds = min(max(float(seconds), 0.1), PROFILE_MAX_SECONDS)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds, label, on_done),
+                                            name="stack-sampler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, seconds: float, label: str, on_done) -> None:
+        me = threading.get_ident()
+        interval = max(0.001, PROFILE_SAMPLE_MS / 1000.0)
+        backoff = max(0.0, 1.0 / max(PROFILE_MAX_OVERHEAD, 1e-3) - 1.0)
+        counts: Dict[tuple, int] = {}
+        names: Dict[int, str] = {}
+        samples = 0
+        cost = 0.0
+        t_start = time.monotonic()
+        end = t_start + seconds
+        names_at = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= end or self._stop.is_set():
+                break
+            if now - names_at >= 1.0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                names_at = now
+            s0 = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                key = (names.get(ident, str(ident)), tuple(reversed(codes)))
+                if key in counts:
+                    counts[key] += 1
+                elif len(counts) < PROFILE_MAX_STACKS:
+                    counts[key] = 1
+                else:
+                    other = (key[0], ())
+                    counts[other] = counts.get(other, 0) + 1
+            took = time.perf_counter() - s0
+            cost += took
+            samples += 1
+            self._stop.wait(max(interval, took * backoff))
+        wall = time.monotonic() - t_start
+
+        path = self._write(label, counts)
+        info = {"path": str(path), "samples": samples, "stacks": len(counts), "sec": round(wall, 1),
+                "overhead": round(cost / wall, 4) if wall else 0.0}
+        print(f"[PROF] {label}: {samples} samples over {wall:.1f}s ({info['overhead']:.1%} sampler time) -> {path}")
+        if on_done is not None:
+            on_done(info)
+
+    def _write(self, label: str, counts: Dict[tuple, int]) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"{label}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.folded"
+        labels: Dict[object, str] = {}
+        lines = []
+        for (thread, codes), c in counts.items():
+            parts = [thread.replace(";", ":").replace(" ", "_")]
+            for code in codes:
+                s = labels.get(code)
+                if s is None:
+                    s = labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                parts.append(s)
+            if not codes:
+                parts.append("[other]")
+            lines.append(f"{';'.join(parts)} {c}")
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("\n".join(sorted(lines)) + "\n", encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+
+# one sampler per process: it sees every thread, whichever component asked
+SAMPLER = StackSampler()
+_PROFILERS: List["Profiler"] = []
+_signal_installed = False
+
+
+def _on_signal(signum, frame) -> None:
+    label = "+".join(sorted({p.component for p in _PROFILERS})) or "process"
+    on_done = _PROFILERS[0]._dumped if _PROFILERS else None
+    if not SAMPLER.start(PROFILE_SECONDS, label, on_done):
+        print("[PROF] sampler already running")
+
+
+class Profiler:
+    """
+    Profiling surface of one live component (producer, joiner, greeks, archiver).
+
+    Spans: `stage(name)` returns a Stage; the component times its hot path
+    with `t = clock()` ... `t = st.lap(t)`. Every PROFILE_PUBLISH_SEC the
+    last interval goes to md:prof:spans:{component}:{pid}, per stage: calls,
+    items, mean / p50 / p99 / max us (percentiles interpolated in
+    power-of-two buckets) and busy (share of wall time spent in the stage).
+
+    Sampling: SIGUSR1 (main thread only) or
+    `SET md:prof:ctl:{component} <seconds>` starts the stack sampler for that
+    long; every process of the component picks the key up within
+    PROFILE_CONTROL_POLL_SEC. A key is acted on once; set it with EX (or
+    delete it) to trigger again. Each dump is also written to md:events
+    (type profile).
+    """
+
+    def __init__(self, component: str, r: Optional[redis.Redis] = None, tag: str = ""):
+        self.component = component
+        self.tag = tag      # tells processes of one component apart (e.g. the archived stream)
+        self.r = r if r is not None else redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.stages: Dict[str, Stage] = {}
+        self._prev: Dict[str, tuple] = {}
+        self._published = time.monotonic()
+        self._ctl_seen: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        _PROFILERS.append(self)
+
+    def stage(self, name: str, scale: int = 1) -> Stage:
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = Stage(name, scale)
+        return st
+
+    def sample(self, seconds: float = PROFILE_SECONDS) -> bool:
+        return SAMPLER.start(seconds, self.component, self._dumped)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Stats since the previous snapshot; resets each stage's max.
+        """
+        now = time.monotonic()
+        wall = max(now - self._published, 1e-9)
+        self._published = now
+        out = {}
+        for name, st in list(self.stages.items()):
+            n, items, total, hist, mx = st.n, st.items, st.total, list(st.hist), st.max
+            st.max = 0
+            pn, pitems, ptotal, phist = self._prev.get(name, (0, 0, 0, [0] * 64))
+            self._prev[name] = (n, items, total, hist)
+            dn = n - pn
+            if not dn:
+                continue
+            dh = [a - b for a, b in zip(hist, phist)]
+            dt = total - ptotal
+            mx_us = round(mx / 1000.0, 2)
+            out[name] = {
+                "calls": dn * st.scale,
+                "items": (items - pitems) * st.scale,
+                "mean_us": round(dt / dn / 1000.0, 2),
+                "p50_us": min(_pct_us(dh, dn, 0.50), mx_us),
+                "p99_us": min(_pct_us(dh, dn, 0.99), mx_us),
+                "max_us": mx_us,
+                "busy": round(dt * st.scale / (wall * 1e9), 4),
+            }
+        return out
+
+    def publish(self) -> None:
+        stats = self.snapshot()
+        key = f"{SPANS_PREFIX}:{self.component}:{os.getpid()}"
+        pipe = self.r.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.hset(key, mapping={"ts": str(now_ms()), "tag": self.tag,
+                                **{k: json.dumps(v, separators=(",", ":")) for k, v in stats.items()}})
+        pipe.expire(key, int(3 * PROFILE_PUBLISH_SEC) + 1)
+        pipe.execute()
+
+    def _poll_control(self) -> None:
+        raw = self.r.get(f"{CONTROL_PREFIX}:{self.component}")
+        val = raw.decode() if isinstance(raw, bytes) else raw
+        if val is None or val == self._ctl_seen:
+            self._ctl_seen = val
+            return
+        self._ctl_seen = val
+        try:
+            seconds = float(val)
+        except ValueError:
+            seconds = PROFILE_SECONDS
+        if seconds <= 0:
+            SAMPLER.stop()
+        elif not self.sample(seconds):
+            print(f"[PROF] {self.component}: sampler already running")
+
+    def _dumped(self, info: dict) -> None:
+        try:
+            self.r.xadd(STREAM_EVENTS, {"ts": str(now_ms()), "type": "profile", "component": self.component,
+                                        "pid": str(os.getpid()), **{k: str(v) for k, v in info.items()}},
+                        maxlen=STREAM_MAXLEN_EVENTS, approximate=True)
+        except Exception as e:
+            print(f"[PROF] profile event not stored: {e!r}")
+
+    def _loop(self) -> None:
+        while not self._stop.wait(PROFILE_CONTROL_POLL_SEC):
+            try:
+                self._poll_control()
+                if time.monotonic() - self._published >= PROFILE_PUBLISH_SEC:
+                    self.publish()
+            except Exception as e:
+                print(f"[PROF] {self.component}: {e!r}")
+
+    def start(self) -> "Profiler":
+        global _signal_installed
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=f"profiler-{self.component}", daemon=True)
+            self._thread.start()
+        # signal handlers can only be set from the main thread; keep one set by the application
+        if (not _signal_installed and hasattr(signal, "SIGUSR1")
+                and threading.current_thread() is threading.main_thread()
+                and signal.getsignal(signal.SIGUSR1) in (signal.SIG_DFL, None)):
+            signal.signal(signal.SIGUSR1, _on_signal)
+            _signal_installed = True
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
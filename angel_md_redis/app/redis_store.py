@@ -1,14 +1,143 @@
+import heapq
 import json
+import zlib
+from typing import Dict, List, Optional, Tuple
+
 import redis
-from .config import REDIS_URL
+import redis.asyncio
+from .config import REDIS_URL, REDIS_ASYNC_MAX_CONNECTIONS, STREAM_OPT, OPT_SHARDS, SHARD_REDIS_URLS
+
+
+def shard_of(key: str, n: int) -> int:
+    # crc32, not hash(): stable across processes and restarts
+    return zlib.crc32(str(key).encode("utf-8")) % n if n > 1 else 0
+
+
+def shard_stream(base: str, shard: int) -> str:
+    return f"{base}:{shard}"
+
+
+def _id_key(msg_id) -> Tuple[int, int]:
+    ms, _, seq = str(msg_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _group_lag(g: dict) -> int:
+    lag = g.get("lag")
+    return int(lag if lag is not None else g.get("pending") or 0)
+
+
+def _any_live(consumers: list, idle_ms: int) -> bool:
+    return any(int(c.get("idle") or 0) <= idle_ms for c in consumers)
+
+
+class ShardRouter:
+    """
+    Layout of a sharded stream: `{base}:{shard}` for shard in range(n),
+    routed by a stable hash of `key_field` (underlying), so one underlying
+    always lands on the same shard. Shard i lives on urls[i % len(urls)].
+    `connect(url)` opens a client for an endpoint (blocking by default).
+    """
+
+    def __init__(self, base: str, n: int, urls: List[str], key_field: str = "underlying",
+                 clients: Optional[Dict[str, redis.Redis]] = None, connect=None):
+        self.base = base
+        self.n = max(1, int(n))
+        self.urls = list(urls) or [REDIS_URL]
+        self.key_field = key_field
+        self._clients: Dict[str, redis.Redis] = dict(clients or {})
+        self._connect = connect or (lambda url: redis.Redis.from_url(url, decode_responses=True))
+        self._shard_by_key: Dict[str, int] = {}
+        self.streams = [shard_stream(base, i) for i in range(self.n)]
+
+    def url(self, shard: int) -> str:
+        return self.urls[shard % len(self.urls)]
+
+    def client(self, shard: int) -> redis.Redis:
+        url = self.url(shard)
+        c = self._clients.get(url)
+        if c is None:
+            c = self._clients[url] = self._connect(url)
+        return c
+
+    def shard_for(self, key: str) -> int:
+        s = self._shard_by_key.get(key)
+        if s is None:
+            s = self._shard_by_key[key] = shard_of(key, self.n)
+        return s
+
+    def shard_of_stream(self, stream: str) -> Optional[int]:
+        head, _, tail = stream.rpartition(":")
+        if head == self.base and tail.isdigit() and int(tail) < self.n:
+            return int(tail)
+        return None
+
 
 class RedisStore:
+    """
+    Thin wrapper over one Redis connection, plus client-side routing for
+    sharded streams (OPT_SHARDS > 1): the logical name STREAM_OPT stands for
+    all of its shards. xadd routes by payload, ensure_group / xreadgroup /
+    xlen / xrevrange fan out and merge, xack takes the shard name that
+    xreadgroup returned. Unsharded, every call goes to `self.r` as before.
+    """
+
     def __init__(self):
         self.r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.routers: Dict[str, ShardRouter] = {}
+        if OPT_SHARDS > 1:
+            self.routers[STREAM_OPT] = ShardRouter(STREAM_OPT, OPT_SHARDS, SHARD_REDIS_URLS, clients={REDIS_URL: self.r})
+
+    # ---------------------------
+    # Shard routing
+    # ---------------------------
+
+    def route(self, stream: str, payload: dict, maxlen: int = 0) -> Tuple[redis.Redis, str, int]:
+        """
+        -> (client, stream name, maxlen) a payload is written to. Sharded
+        streams split `maxlen` over the shards (same total retention).
+        """
+        rt = self.routers.get(stream)
+        if rt is None:
+            return self.r, stream, maxlen
+        shard = rt.shard_for(str(payload.get(rt.key_field, "")))
+        return rt.client(shard), rt.streams[shard], max(1, maxlen // rt.n)
+
+    def shard_streams(self, stream: str, shards: Optional[List[int]] = None) -> List[str]:
+        """
+        Physical streams behind `stream` (the name itself when unsharded),
+        optionally only the assigned `shards`.
+        """
+        rt = self.routers.get(stream)
+        if rt is None:
+            return [stream]
+        return [rt.streams[i] for i in (range(rt.n) if shards is None else shards)]
+
+    def client_for(self, stream: str) -> redis.Redis:
+        for rt in self.routers.values():
+            shard = rt.shard_of_stream(stream)
+            if shard is not None:
+                return rt.client(shard)
+        if stream in self.routers:
+            raise ValueError(f"{stream} is sharded; use a shard stream name")
+        return self.r
+
+    def _by_client(self, streams: Dict[str, str]) -> List[Tuple[redis.Redis, Dict[str, str]]]:
+        groups: Dict[int, Tuple[redis.Redis, Dict[str, str]]] = {}
+        for name, sid in streams.items():
+            for s in self.shard_streams(name):
+                c = self.client_for(s)
+                groups.setdefault(id(c), (c, {}))[1][s] = sid
+        return list(groups.values())
+
+    # ---------------------------
+    # Commands
+    # ---------------------------
 
     def xadd(self, stream: str, payload: dict, maxlen: int):
         # approx trim for speed
-        self.r.xadd(stream, payload, maxlen=maxlen, approximate=True)
+        client, name, maxlen = self.route(stream, payload, maxlen)
+        client.xadd(name, payload, maxlen=maxlen, approximate=True)
 
     def set_latest(self, key: str, value: str, ex_sec: int = 3600):
         self.r.set(key, value, ex=ex_sec)
@@ -16,18 +145,198 @@ class RedisStore:
     def hset_meta(self, key: str, mapping: dict):
         self.r.hset(key, mapping=mapping)
 
+    def pipeline(self):
+        return self.r.pipeline(transaction=False)
+
     def hgetall(self, key: str) -> dict:
         return self.r.hgetall(key)
 
     def ensure_group(self, stream: str, group: str):
-        try:
-            self.r.xgroup_create(stream, group, id="0-0", mkstream=True)
-        except redis.exceptions.ResponseError as e:
-            if "BUSYGROUP" not in str(e):
-                raise
+        for s in self.shard_streams(stream):
+            try:
+                self.client_for(s).xgroup_create(s, group, id="0-0", mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
 
     def xreadgroup(self, group: str, name: str, streams: dict, count: int = 1000, block_ms: int = 2000):
-        return self.r.xreadgroup(group, name, streams, count=count, block=block_ms)
+        """
+        Sharded names expand to every shard (same id, normally ">"); entries
+        come back under the shard stream name, which is what xack needs.
+        """
+        groups = self._by_client(streams)
+        if len(groups) == 1:
+            c, st = groups[0]
+            return c.xreadgroup(group, name, st, count=count, block=block_ms)
+        # several endpoints: non-blocking sweep, then block on each in turn
+        out = []
+        for c, st in groups:
+            out.extend(c.xreadgroup(group, name, st, count=count) or [])
+        if out or not block_ms:
+            return out
+        for c, st in groups:
+            out.extend(c.xreadgroup(group, name, st, count=count, block=max(1, block_ms // len(groups))) or [])
+            if out:
+                break
+        return out
+
+    def xack(self, stream: str, group: str, *msg_ids: str):
+        if msg_ids:
+            self.client_for(stream).xack(stream, group, *msg_ids)
+
+    def xlen(self, stream: str) -> int:
+        return sum(self.client_for(s).xlen(s) for s in self.shard_streams(stream))
+
+    def endpoints(self) -> List[redis.Redis]:
+        """
+        Every distinct Redis connection in use (REDIS_URL first, then shard endpoints).
+        """
+        out = [self.r]
+        for rt in self.routers.values():
+            for i in range(rt.n):
+                c = rt.client(i)
+                if all(c is not x for x in out):
+                    out.append(c)
+        return out
+
+    def group_lag(self, stream: str, idle_ms: Optional[int] = None) -> Dict[str, int]:
+        """
+        group -> entries not yet delivered to it (XINFO GROUPS lag, Redis 7+;
+        pending count on older servers), summed over shards.
+
+        With `idle_ms`, groups nobody is reading are left out: no consumers, or
+        every consumer idle (XINFO CONSUMERS) for more than `idle_ms`.
+        """
+        out: Dict[str, int] = {}
+        for s in self.shard_streams(stream):
+            client = self.client_for(s)
+            try:
+                groups = client.xinfo_groups(s)
+            except redis.exceptions.ResponseError:
+                continue  # stream not created yet
+            for g in groups:
+                lag = _group_lag(g)
+                if idle_ms is not None and lag:
+                    consumers = client.xinfo_consumers(s, g["name"]) if g.get("consumers") else []
+                    if not _any_live(consumers, idle_ms):
+                        continue
+                out[g["name"]] = out.get(g["name"], 0) + lag
+        return out
+
+    def xrevrange(self, stream: str, count: int) -> list:
+        """
+        Newest `count` entries; over shards merged by ID (arrival ms) descending.
+        """
+        names = self.shard_streams(stream)
+        if len(names) == 1:
+            return self.client_for(names[0]).xrevrange(names[0], count=count)
+        parts = [self.client_for(s).xrevrange(s, count=count) for s in names]
+        merged = heapq.merge(*parts, key=lambda e: _id_key(e[0]), reverse=True)
+        return [e for e, _ in zip(merged, range(count))]
+
+
+def _async_client(url: str) -> redis.asyncio.Redis:
+    return redis.asyncio.Redis.from_url(url, decode_responses=True, max_connections=REDIS_ASYNC_MAX_CONNECTIONS)
+
+
+class AsyncRedisStore(RedisStore):
+    """
+    RedisStore on redis.asyncio, for I/O-bound components that share one
+    event loop (run_async.py). Same routing and method names; commands are
+    coroutines. One connection pool per endpoint (REDIS_ASYNC_MAX_CONNECTIONS),
+    so concurrent coroutines do not queue behind each other's blocking reads.
+    """
+
+    def __init__(self):
+        self.r = _async_client(REDIS_URL)
+        self.routers: Dict[str, ShardRouter] = {}
+        if OPT_SHARDS > 1:
+            self.routers[STREAM_OPT] = ShardRouter(STREAM_OPT, OPT_SHARDS, SHARD_REDIS_URLS,
+                                                   clients={REDIS_URL: self.r}, connect=_async_client)
+
+    async def xadd(self, stream: str, payload: dict, maxlen: int):
+        client, name, maxlen = self.route(stream, payload, maxlen)
+        await client.xadd(name, payload, maxlen=maxlen, approximate=True)
+
+    async def xadd_many(self, stream: str, payloads: List[dict], maxlen: int):
+        """
+        Pipelined XADDs, one round trip per endpoint; order kept per stream.
+        """
+        pipes = {}
+        for payload in payloads:
+            client, name, ml = self.route(stream, payload, maxlen)
+            pipe = pipes.get(id(client))
+            if pipe is None:
+                pipe = pipes[id(client)] = client.pipeline(transaction=False)
+            pipe.xadd(name, payload, maxlen=ml, approximate=True)
+        for pipe in pipes.values():
+            await pipe.execute()
+
+    async def set_latest(self, key: str, value: str, ex_sec: int = 3600):
+        await self.r.set(key, value, ex=ex_sec)
+
+    async def hset_meta(self, key: str, mapping: dict):
+        await self.r.hset(key, mapping=mapping)
+
+    async def hgetall(self, key: str) -> dict:
+        return await self.r.hgetall(key)
+
+    async def ensure_group(self, stream: str, group: str):
+        for s in self.shard_streams(stream):
+            try:
+                await self.client_for(s).xgroup_create(s, group, id="0-0", mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def xreadgroup(self, group: str, name: str, streams: dict, count: int = 1000, block_ms: int = 2000):
+        groups = self._by_client(streams)
+        if len(groups) == 1:
+            c, st = groups[0]
+            return await c.xreadgroup(group, name, st, count=count, block=block_ms)
+        out = []
+        for c, st in groups:
+            out.extend(await c.xreadgroup(group, name, st, count=count) or [])
+        if out or not block_ms:
+            return out
+        for c, st in groups:
+            out.extend(await c.xreadgroup(group, name, st, count=count, block=max(1, block_ms // len(groups))) or [])
+            if out:
+                break
+        return out
+
+    async def xack(self, stream: str, group: str, *msg_ids: str):
+        if msg_ids:
+            await self.client_for(stream).xack(stream, group, *msg_ids)
+
+    async def xlen(self, stream: str) -> int:
+        return sum([await self.client_for(s).xlen(s) for s in self.shard_streams(stream)])
+
+    async def group_lag(self, stream: str, idle_ms: Optional[int] = None) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for s in self.shard_streams(stream):
+            client = self.client_for(s)
+            try:
+                groups = await client.xinfo_groups(s)
+            except redis.exceptions.ResponseError:
+                continue
+            for g in groups:
+                lag = _group_lag(g)
+                if idle_ms is not None and lag:
+                    consumers = await client.xinfo_consumers(s, g["name"]) if g.get("consumers") else []
+                    if not _any_live(consumers, idle_ms):
+                        continue
+                out[g["name"]] = out.get(g["name"], 0) + lag
+        return out
+
+    async def xrevrange(self, stream: str, count: int) -> list:
+        names = self.shard_streams(stream)
+        if len(names) == 1:
+            return await self.client_for(names[0]).xrevrange(names[0], count=count)
+        parts = [await self.client_for(s).xrevrange(s, count=count) for s in names]
+        merged = heapq.merge(*parts, key=lambda e: _id_key(e[0]), reverse=True)
+        return [e for e, _ in zip(merged, range(count))]
 
-    def xack(self, stream: str, group: str, msg_id: str):
-        self.r.xack(stream, group, msg_id)
+    async def close(self):
+        for c in self.endpoints():
+            await c.aclose()
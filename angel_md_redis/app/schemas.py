@@ -0,0 +1,296 @@
+import json
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .config import (
+    STREAM_EQ, STREAM_OPT, STREAM_GREEKS, STREAM_OPT_FEATURES,
+    STREAM_DEPTH_EQ, STREAM_DEPTH_OPT, STREAM_CHAIN,
+)
+from .depth import decode_depth_column
+from .features import FEATURE_PREFIXES
+
+# Low-cardinality strings (symbols, expiries, CE/PE) are dictionary encoded.
+DICT_STR = pa.dictionary(pa.int32(), pa.string())
+
+META_FIELDS = [
+    pa.field("_redis_id", pa.string()),
+    pa.field("_stream", DICT_STR),
+]
+
+_OHLC_FIELDS = [
+    pa.field("o", pa.float64()),
+    pa.field("h", pa.float64()),
+    pa.field("l", pa.float64()),
+    pa.field("c", pa.float64()),
+]
+
+EQ_SCHEMA = pa.schema([
+    pa.field("ts_recv", pa.int64()),
+    pa.field("ts_exch", pa.int64()),
+    pa.field("token", DICT_STR),
+    pa.field("symbol", DICT_STR),
+    pa.field("ltp", pa.float64()),
+    *_OHLC_FIELDS,
+    pa.field("vol", pa.int64()),
+    pa.field("tbq", pa.float64()),
+    pa.field("tsq", pa.float64()),
+    *META_FIELDS,
+])
+
+OPT_SCHEMA = pa.schema([
+    pa.field("ts_recv", pa.int64()),
+    pa.field("ts_exch", pa.int64()),
+    pa.field("token", DICT_STR),
+    pa.field("underlying", DICT_STR),
+    pa.field("tradingsymbol", DICT_STR),
+    pa.field("expiry", DICT_STR),
+    pa.field("strike", pa.float64()),
+    pa.field("cp", DICT_STR),
+    pa.field("ltp", pa.float64()),
+    pa.field("oi", pa.int64()),
+    pa.field("vol", pa.int64()),
+    *_OHLC_FIELDS,
+    pa.field("tbq", pa.float64()),
+    pa.field("tsq", pa.float64()),
+    *META_FIELDS,
+])
+
+_GREEK_FIELDS = [
+    pa.field("iv", pa.float64()),
+    pa.field("delta", pa.float64()),
+    pa.field("gamma", pa.float64()),
+    pa.field("theta", pa.float64()),
+    pa.field("vega", pa.float64()),
+]
+
+FEATURES_SCHEMA = pa.schema(
+    [f for f in OPT_SCHEMA if not f.name.startswith("_")] + _GREEK_FIELDS
+    + [pa.field("iv_fit", pa.float64())]  # fitted smile IV (app/vol_surface.py)
+    + META_FIELDS
+)
+
+# md:greeks:snap exploded to one row per contract (see explode_greeks)
+GREEKS_SCHEMA = pa.schema([
+    pa.field("ts_recv", pa.int64()),
+    pa.field("underlying", DICT_STR),
+    pa.field("expiry", DICT_STR),
+    pa.field("tradingsymbol", DICT_STR),
+    pa.field("strike", pa.float64()),
+    pa.field("cp", DICT_STR),
+    *_GREEK_FIELDS,
+    pa.field("trade_volume", pa.float64()),
+    pa.field("kind", DICT_STR),  # full | delta (see GreeksPoller._publish)
+    pa.field("n_total", pa.int64()),
+    *META_FIELDS,
+])
+
+# md:depth:* with the packed "d" field decoded (see app/depth.py)
+_BOOK5_PX = pa.list_(pa.float64(), 5)
+_BOOK5_QTY = pa.list_(pa.int32(), 5)
+_BOOK5_N = pa.list_(pa.uint16(), 5)
+
+DEPTH_SCHEMA = pa.schema([
+    pa.field("ts_recv", pa.int64()),
+    pa.field("ts_exch", pa.int64()),
+    pa.field("token", DICT_STR),
+    pa.field("symbol", DICT_STR),
+    pa.field("underlying", DICT_STR),
+    pa.field("bid_px", _BOOK5_PX),
+    pa.field("bid_qty", _BOOK5_QTY),
+    pa.field("bid_n", _BOOK5_N),
+    pa.field("ask_px", _BOOK5_PX),
+    pa.field("ask_qty", _BOOK5_QTY),
+    pa.field("ask_n", _BOOK5_N),
+    pa.field("uc", pa.float64()),
+    pa.field("lc", pa.float64()),
+    pa.field("h52", pa.float64()),
+    pa.field("l52", pa.float64()),
+    *META_FIELDS,
+])
+
+# md:chain:agg (app/chain.py)
+CHAIN_SCHEMA = pa.schema([
+    pa.field("ts_recv", pa.int64()),
+    pa.field("underlying", DICT_STR),
+    pa.field("expiry", DICT_STR),
+    pa.field("n_strikes", pa.int32()),
+    pa.field("oi_ce", pa.int64()),
+    pa.field("oi_pe", pa.int64()),
+    pa.field("vol_ce", pa.int64()),
+    pa.field("vol_pe", pa.int64()),
+    pa.field("pcr_oi", pa.float64()),
+    pa.field("pcr_vol", pa.float64()),
+    pa.field("call_wall", pa.float64()),
+    pa.field("call_wall_oi", pa.int64()),
+    pa.field("put_wall", pa.float64()),
+    pa.field("put_wall_oi", pa.int64()),
+    pa.field("max_pain", pa.float64()),
+    *META_FIELDS,
+])
+
+# historical candles from getCandleData (app/backfill.py), not a stream
+CANDLES_SCHEMA = pa.schema([
+    pa.field("ts", pa.int64()),          # candle open, ms UTC
+    pa.field("token", DICT_STR),
+    pa.field("symbol", DICT_STR),
+    pa.field("underlying", DICT_STR),
+    pa.field("exchange", DICT_STR),
+    pa.field("interval", DICT_STR),
+    *_OHLC_FIELDS,
+    pa.field("vol", pa.int64()),
+])
+
+SCHEMAS: Dict[str, pa.Schema] = {
+    "eq": EQ_SCHEMA,
+    "opt": OPT_SCHEMA,
+    "greeks": GREEKS_SCHEMA,
+    "features": FEATURES_SCHEMA,
+    "depth": DEPTH_SCHEMA,
+    "chain": CHAIN_SCHEMA,
+    "candles": CANDLES_SCHEMA,
+}
+
+STREAM_KINDS: Dict[str, str] = {
+    STREAM_EQ: "eq",
+    STREAM_OPT: "opt",
+    STREAM_GREEKS: "greeks",
+    STREAM_OPT_FEATURES: "features",
+    STREAM_DEPTH_EQ: "depth",
+    STREAM_DEPTH_OPT: "depth",
+    STREAM_CHAIN: "chain",
+}
+
+
+def stream_kind(stream: str) -> Optional[str]:
+    return STREAM_KINDS.get(stream)
+
+
+def schema_for_stream(stream: str) -> Optional[pa.Schema]:
+    kind = stream_kind(stream)
+    return SCHEMAS.get(kind) if kind else None
+
+
+# ---------------------------
+# Greeks snapshot explode
+# ---------------------------
+
+# optionGreek response key (lower-cased) -> column
+_GREEKS_KEYS = {
+    "tradingsymbol": "tradingsymbol",
+    "symbol": "tradingsymbol",
+    "strikeprice": "strike",
+    "optiontype": "cp",
+    "delta": "delta",
+    "gamma": "gamma",
+    "theta": "theta",
+    "vega": "vega",
+    "impliedvolatility": "iv",
+    "iv": "iv",
+    "tradevolume": "trade_volume",
+}
+
+
+def explode_greeks(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    One md:greeks:snap entry (whole chain or changed contracts in data_json)
+    -> one row per contract.
+    """
+    out: List[Dict[str, Any]] = []
+    for row in rows:
+        try:
+            items = json.loads(row.get("data_json") or "[]")
+        except Exception:
+            items = []
+        base = {k: v for k, v in row.items() if k != "data_json"}
+        for it in items or []:
+            rec = dict(base)
+            for k, v in (it or {}).items():
+                col = _GREEKS_KEYS.get(str(k).lower())
+                if col and col not in rec:
+                    rec[col] = v
+            out.append(rec)
+    return out
+
+
+# ---------------------------
+# Coercion
+# ---------------------------
+
+def _blank_to_none(s: pd.Series) -> list:
+    return [None if (v is None or v == "" or (isinstance(v, float) and v != v)) else str(v) for v in s.tolist()]
+
+
+def _coerce_column(s: pd.Series, typ: pa.DataType) -> pa.Array:
+    if pa.types.is_integer(typ) or pa.types.is_floating(typ):
+        num = pd.to_numeric(s, errors="coerce")
+        arr = pa.array(num.to_numpy(dtype="float64", na_value=float("nan")), from_pandas=True)
+        return pc.cast(arr, typ, safe=False) if pa.types.is_integer(typ) else arr
+    if pa.types.is_dictionary(typ):
+        return pa.array(_blank_to_none(s), type=typ.value_type).dictionary_encode()
+    return pa.array(_blank_to_none(s), type=typ)
+
+
+# raw stream fields replaced by decoded columns
+_DECODED_FIELDS = {"d"}
+
+
+def _depth_columns(df: pd.DataFrame) -> Dict[str, pa.Array]:
+    book = decode_depth_column(df["d"].tolist())
+    n = len(book)
+    cols: Dict[str, pa.Array] = {}
+    for side in ("bid", "ask"):
+        px = book[f"{side}_px"].astype("float64").ravel() / 100.0
+        cols[f"{side}_px"] = pa.FixedSizeListArray.from_arrays(pa.array(px), 5)
+        cols[f"{side}_qty"] = pa.FixedSizeListArray.from_arrays(pa.array(book[f"{side}_qty"].ravel()), 5)
+        cols[f"{side}_n"] = pa.FixedSizeListArray.from_arrays(pa.array(book[f"{side}_n"].ravel()), 5)
+    levels = book["levels"].astype("float64") / 100.0
+    for i, name in enumerate(("uc", "lc", "h52", "l52")):
+        cols[name] = pa.array(levels[:, i]) if n else pa.array([], pa.float64())
+    return cols
+
+
+def to_table(df: pd.DataFrame, schema: pa.Schema, columns: Optional[Dict[str, pa.Array]] = None) -> pa.Table:
+    """
+    Enforce `schema` on a frame of (mostly string) stream fields: numbers are
+    parsed, "" becomes null, missing columns are all-null. Columns the schema
+    doesn't know are kept as strings after the typed ones (rolling
+    feature columns as float64).
+    `columns`: already-built arrays for some schema fields.
+    """
+    columns = columns or {}
+    n = len(df)
+    fields: List[pa.Field] = []
+    arrays: List[pa.Array] = []
+    for f in schema:
+        if f.name in columns:
+            arrays.append(columns[f.name])
+        elif f.name in df.columns:
+            arrays.append(_coerce_column(df[f.name], f.type))
+        else:
+            arrays.append(pa.nulls(n, f.type))
+        fields.append(f)
+    for name in df.columns:
+        if name not in schema.names and not (columns and name in _DECODED_FIELDS):
+            # rolling features (app/features.py) are numeric, everything else unknown stays a string
+            typ = pa.float64() if str(name).startswith(FEATURE_PREFIXES) else pa.string()
+            arrays.append(_coerce_column(df[name], typ))
+            fields.append(pa.field(str(name), typ))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def stream_table(df: pd.DataFrame, kind: str) -> pa.Table:
+    """
+    Archiver entry point: typed table for a stream kind, decoding packed fields.
+    """
+    columns = _depth_columns(df) if kind == "depth" and "d" in df.columns else None
+    return to_table(df, SCHEMAS[kind], columns)
+
+
+def coerce_table(table: pa.Table, kind: str) -> pa.Table:
+    """
+    For readers: bring a table from older, all-string files to the typed schema.
+    """
+    return to_table(table.to_pandas(), SCHEMAS[kind])
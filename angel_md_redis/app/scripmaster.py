@@ -1,4 +1,5 @@
 import json
+import os
 import time
 import datetime as dt
 from pathlib import Path
@@ -12,6 +13,8 @@ SCRIPMASTER_URL = "https://margincalculator.angelone.in/OpenAPI_File/files/OpenA
 CACHE_PATH = Path("OpenAPIScripMaster.json")
 CACHE_MAX_AGE_HOURS = 24
 
+IST = dt.timezone(dt.timedelta(hours=5, minutes=30))
+
 def parse_expiry(x) -> Optional[dt.date]:
     if not x:
         return None
@@ -29,6 +32,40 @@ def to_float(x) -> Optional[float]:
     except:
         return None
 
+def refresh_scripmaster(cache_path: Path = CACHE_PATH) -> bool:
+    """
+    Conditional download (ETag / Last-Modified kept next to the cache).
+    Returns True if the cache file now holds a different ScripMaster.
+    """
+    validators_path = cache_path.with_name(cache_path.name + ".validators")
+    try:
+        validators = json.loads(validators_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        validators = {}
+    headers = {}
+    if cache_path.exists():
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    r = requests.get(SCRIPMASTER_URL, headers=headers, timeout=120)
+    if r.status_code == 304:
+        return False
+    r.raise_for_status()
+    # servers that ignore the validators: compare content
+    if cache_path.exists() and cache_path.stat().st_size == len(r.content) and cache_path.read_bytes() == r.content:
+        return False
+
+    tmp = cache_path.with_name(cache_path.name + ".tmp")
+    tmp.write_bytes(r.content)
+    os.replace(tmp, cache_path)
+    validators_path.write_text(json.dumps({
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+    }), encoding="utf-8")
+    return True
+
 def load_scripmaster(cache_path: Path = CACHE_PATH) -> pd.DataFrame:
     use_cache = False
     if cache_path.exists():
@@ -102,8 +139,19 @@ def resolve_eq_tokens(df: pd.DataFrame, symbols: List[str]) -> Dict[str, Dict[st
                 out[s] = {"tradingsymbol": r["symbol"], "token": str(r["token"]), "exchange": "NSE"}
     return out
 
-def pick_nearest_expiry(d: pd.DataFrame) -> Optional[dt.date]:
-    today = dt.date.today()
+def planning_date(roll_time: str = "15:30", now: Optional[dt.datetime] = None) -> dt.date:
+    """
+    IST trading date options are planned for: after `roll_time` (HH:MM IST)
+    it is already the next day, so an expiring series rolls at the close.
+    """
+    now = (now or dt.datetime.now(dt.timezone.utc)).astimezone(IST)
+    hh, mm = (int(x) for x in roll_time.split(":"))
+    if (now.hour, now.minute) >= (hh, mm):
+        return now.date() + dt.timedelta(days=1)
+    return now.date()
+
+def pick_nearest_expiry(d: pd.DataFrame, today: Optional[dt.date] = None) -> Optional[dt.date]:
+    today = today or dt.date.today()
     expiries = sorted({e for e in d["expiry_date"].dropna().tolist() if e >= today})
     return expiries[0] if expiries else None
 
@@ -132,12 +180,14 @@ def build_atm_option_tokens(
     df: pd.DataFrame,
     underlying: str,
     spot: float,
-    strikes_around: int
+    strikes_around: int,
+    today: Optional[dt.date] = None
 ) -> tuple[list[dict], Optional[str]]:
     """
     Returns:
       - list of {token, tradingsymbol, underlying, expiry, strike, cp, exchange}
       - expiry_str like '2026-01-27' for greeks poller
+    today: nearest expiry on or after this date (default: today, see planning_date)
     """
     d = df[(df["exch_seg"] == "NFO") & (df["instrumenttype"].str.contains("OPT", na=False))].copy()
     d["sym_u"] = d["symbol"].str.upper()
@@ -147,7 +197,7 @@ def build_atm_option_tokens(
     if d.empty:
         return [], None
 
-    expiry = pick_nearest_expiry(d)
+    expiry = pick_nearest_expiry(d, today)
     if not expiry:
         return [], None
 
@@ -0,0 +1,283 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .config import (
+    ANGEL_API_KEY, ANGEL_CLIENT_CODE, SESSION_CACHE, SESSION_CACHE_FILE,
+    SESSION_REFRESH_MARGIN_SEC, SESSION_TTL_SEC,
+)
+
+# Redis backend: one key per client code, expires with the session
+REDIS_SESSION_PREFIX = "auth:session"
+LOCK_TIMEOUT_SEC = 60
+# a session issued this recently is trusted even when a caller asks for a new one
+# (another process just logged in because of the same failure)
+MIN_RELOGIN_SEC = 60
+
+
+def jwt_expiry(jwt: str) -> Optional[float]:
+    """
+    `exp` claim of a JWT (no signature check), or None.
+    """
+    try:
+        payload = str(jwt).split(" ")[-1].split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+
+class _FileBackend:
+    """
+    JSON file readable by the owner only (0600), replaced atomically.
+    Cross-process single-flight via flock on a sibling lock file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def load(self) -> Optional[dict]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, entry: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".tmp-{self.path.name}")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o600)
+        tmp.replace(self.path)
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def lock(self):
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path.with_name(f"{self.path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+        def release():
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        return release
+
+
+class _RedisBackend:
+    """
+    Session JSON in Redis (EX = remaining lifetime); access control is Redis AUTH/ACL.
+    Cross-process single-flight via SET NX lock.
+    """
+
+    def __init__(self, client_code: str):
+        from .redis_store import RedisStore
+
+        self.r = RedisStore().r
+        self.key = f"{REDIS_SESSION_PREFIX}:{client_code}"
+
+    def load(self) -> Optional[dict]:
+        raw = self.r.get(self.key)
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    def save(self, entry: dict) -> None:
+        ttl = int(entry["expires_at"] - time.time())
+        if ttl > 0:
+            self.r.set(self.key, json.dumps(entry), ex=ttl)
+
+    def clear(self) -> None:
+        self.r.delete(self.key)
+
+    def lock(self):
+        token = f"{os.getpid()}-{threading.get_ident()}-{time.time()}"
+        lock_key = f"{self.key}:lock"
+        while not self.r.set(lock_key, token, nx=True, ex=LOCK_TIMEOUT_SEC):
+            time.sleep(0.2)
+
+        def release():
+            if self.r.get(lock_key) == token:
+                self.r.delete(lock_key)
+        return release
+
+
+class SessionManager:
+    """
+    One Angel session (jwt / refresh / feed token) shared by every component.
+
+    `get()` returns a cached session while it has more than
+    SESSION_REFRESH_MARGIN_SEC left. Otherwise it refreshes: first through
+    generateToken(refresh token), which needs no TOTP, and then with a full
+    login. Refreshes are single-flight. A thread lock covers this process and
+    a file or Redis lock covers other processes. A process that waited on
+    the lock re-reads the cache and uses the session the winner stored.
+
+    Backend: SESSION_CACHE=file (default, SESSION_CACHE_FILE, mode 0600),
+    redis (auth:session:{client_code}) or off.
+    `login_fn()` performs a full login and returns (SmartConnect, session dict).
+    """
+
+    def __init__(self, login_fn: Callable, backend: str = SESSION_CACHE, client_code: str = ANGEL_CLIENT_CODE):
+        self.login_fn = login_fn
+        self.client_code = client_code
+        self.backend = None
+        if backend == "file":
+            self.backend = _FileBackend(Path(SESSION_CACHE_FILE))
+        elif backend == "redis":
+            self.backend = _RedisBackend(client_code)
+        self._lock = threading.Lock()
+        self._entry: Optional[dict] = None
+        self._refresher: Optional[threading.Thread] = None
+
+    def _valid(self, e: Optional[dict], margin: float) -> bool:
+        return bool(
+            e and e.get("jwt") and e.get("feed")
+            and e.get("client_code") == self.client_code
+            and e.get("key_id") == _key_id()
+            and float(e.get("expires_at", 0)) - time.time() > margin
+        )
+
+    def _load(self) -> Optional[dict]:
+        return self.backend.load() if self.backend is not None else None
+
+    def _store(self, entry: dict) -> None:
+        if self.backend is not None:
+            try:
+                self.backend.save(entry)
+            except Exception as e:
+                print(f"[AUTH] session cache write failed: {e!r}")
+
+    def _renew(self, old: Optional[dict]):
+        """
+        generateToken with the refresh token, full login as fallback.
+        """
+        if old and old.get("refresh"):
+            try:
+                obj = session_client(old)
+                res = obj.generateToken(old["refresh"])
+                data = (res or {}).get("data") or {}
+                if data.get("jwtToken") and data.get("feedToken"):
+                    print("[AUTH] session renewed with refresh token")
+                    return obj, make_entry(self.client_code, data["jwtToken"], old["refresh"], data["feedToken"])
+            except Exception as e:
+                print(f"[AUTH] token refresh failed, logging in: {e!r}")
+        print("[AUTH] logging in (generateSession)")
+        return self.login_fn()
+
+    def get(self, force: bool = False):
+        """
+        -> (SmartConnect, session dict). force=True: the caller saw the current
+        session fail, get a new one unless another process just did.
+        """
+        margin = SESSION_REFRESH_MARGIN_SEC
+        with self._lock:
+            e = self._entry if self._valid(self._entry, margin) else self._load()
+            if self._usable(e, margin, force):
+                self._entry = e
+                return session_client(e), e
+
+            release = self.backend.lock() if self.backend is not None else (lambda: None)
+            try:
+                # another process may have renewed while we waited for the lock
+                e = self._load() or e
+                if self._usable(e, margin, force):
+                    self._entry = e
+                    return session_client(e), e
+
+                obj, entry = self._renew(None if force else e)
+                self._store(entry)
+                self._entry = entry
+                return obj, entry
+            finally:
+                release()
+
+    def _usable(self, e: Optional[dict], margin: float, force: bool) -> bool:
+        if not self._valid(e, margin):
+            return False
+        return not force or time.time() - float(e.get("issued_at", 0)) < MIN_RELOGIN_SEC
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+            if self.backend is not None:
+                self.backend.clear()
+
+    def start_refresher(self, on_refresh: Callable[[object, str, str], None]) -> threading.Thread:
+        """
+        Daemon thread: renew SESSION_REFRESH_MARGIN_SEC before expiry and call
+        on_refresh(SmartConnect, auth_token, feed_token) with the new session.
+        """
+        if self._refresher is not None:
+            return self._refresher
+
+        def loop():
+            while True:
+                e = self._entry or self._load() or {}
+                wait = float(e.get("expires_at", 0)) - SESSION_REFRESH_MARGIN_SEC - time.time()
+                time.sleep(min(max(wait, 5.0), 3600.0))
+                try:
+                    cur = (self._entry or {}).get("jwt")
+                    obj, entry = self.get()
+                    if entry.get("jwt") != cur:
+                        on_refresh(obj, auth_header(entry["jwt"]), entry["feed"])
+                except Exception as ex:
+                    print(f"[AUTH] proactive refresh failed: {ex!r}")
+                    time.sleep(30)
+
+        self._refresher = threading.Thread(target=loop, name="session-refresh", daemon=True)
+        self._refresher.start()
+        return self._refresher
+
+
+def _key_id() -> str:
+    # sessions are bound to the API key they were issued for (never stored in clear)
+    return hashlib.sha256(ANGEL_API_KEY.encode("utf-8")).hexdigest()[:16]
+
+
+def auth_header(jwt: str) -> str:
+    return jwt if str(jwt).lower().startswith("bearer ") else f"Bearer {jwt}"
+
+
+def make_entry(client_code: str, jwt: str, refresh: str, feed: str) -> dict:
+    raw = str(jwt).split(" ")[-1]
+    now = time.time()
+    return {
+        "client_code": client_code,
+        "key_id": _key_id(),
+        "jwt": raw,
+        "refresh": refresh or "",
+        "feed": feed,
+        "issued_at": now,
+        "expires_at": jwt_expiry(raw) or (now + SESSION_TTL_SEC),
+    }
+
+
+def session_client(entry: dict):
+    """
+    SmartConnect bound to a cached session (no login call).
+    """
+    from SmartApi import SmartConnect
+
+    return SmartConnect(
+        api_key=ANGEL_API_KEY,
+        access_token=entry["jwt"],
+        refresh_token=entry.get("refresh") or None,
+        feed_token=entry["feed"],
+        userId=entry.get("client_code"),
+    )
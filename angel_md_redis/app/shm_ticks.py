@@ -0,0 +1,291 @@
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import SHM_TICKS_PATH, SHM_TICKS_CAPACITY
+
+# File layout (little-endian):
+#   header   64 bytes   magic, layout version, capacity, used slots, directory changes,
+#                       generation (ms; new on writer start and on every resize)
+#   tokens   capacity x 32 bytes   token (null-padded ascii), kind (0 EQ / 1 OPT), active (0 = retired)
+#   rows     capacity x 80 bytes, 64-aligned   ROW_DTYPE, slot = ContractRegistry slot
+MAGIC = b"AMDTICK1"
+LAYOUT_VERSION = 2
+HEADER = struct.Struct("<8sIIIIq32x")
+_USED_OFF = 16
+_DIR_SEQ_OFF = 20
+# the writer grows the table (2x) once used slots pass this share of capacity
+GROW_AT = 0.9
+
+DIR_DTYPE = np.dtype([("token", "S24"), ("kind", "u1"), ("active", "u1"), ("_pad", "V6")])
+ROW_DTYPE = np.dtype([
+    ("seq", "<u8"),        # seqlock: odd while the writer is inside the row
+    ("ts_recv", "<i8"),    # ms epoch
+    ("ts_exch", "<i8"),
+    ("ltp", "<f8"),        # rupees
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("bid_qty", "<i8"),
+    ("ask_qty", "<i8"),
+    ("oi", "<i8"),
+    ("vol", "<i8"),
+])
+assert (HEADER.size, DIR_DTYPE.itemsize, ROW_DTYPE.itemsize) == (64, 32, 80)
+
+_SEQ = struct.Struct("<Q")
+_BODY = struct.Struct("<qqdddqqqq")    # ROW_DTYPE without seq
+_ROW = struct.Struct("<Qqqdddqqqq")
+FIELDS = ROW_DTYPE.names[1:]
+
+
+def _layout(capacity: int):
+    dir_off = HEADER.size
+    rows_off = (dir_off + capacity * DIR_DTYPE.itemsize + 63) // 64 * 64
+    return dir_off, rows_off, rows_off + capacity * ROW_DTYPE.itemsize
+
+
+def _i(x) -> int:
+    try:
+        return int(x or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ShmTickWriter:
+    """
+    Producer side of the same-host latest-tick table: one fixed 80-byte row
+    per contract slot in an mmap'd file (default /dev/shm, i.e. RAM).
+
+    Single writer. Each update is a seqlock: bump `seq` to odd, write the
+    row body, bump it to even. Three struct writes into the mapping, no
+    syscalls, no allocation beyond the packed values. The file is recreated
+    on start with a new generation, which tells readers to re-attach.
+
+    Registry slots are never reused, so universe rollovers keep adding
+    slots: past GROW_AT of capacity the table is rebuilt at twice the size
+    under a new generation. Retired contracts keep their slot with
+    `active` 0 in the directory.
+    """
+
+    def __init__(self, path: str = SHM_TICKS_PATH, capacity: int = SHM_TICKS_CAPACITY):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.used = 0
+        self.dir_seq = 0
+        self.f = self.mm = None
+        self._seq: List[int] = []
+        self._create(max(1, int(capacity)))
+
+    def _create(self, capacity: int) -> None:
+        """
+        New file of `capacity` slots carrying over the directory and rows in
+        use, renamed over the old one with a new generation.
+        """
+        dir_off, rows_off, size = _layout(capacity)
+        # build aside, rename into place: readers never see a half-initialized file
+        tmp = self.path.with_name(f".tmp-{self.path.name}-{os.getpid()}")
+        with open(tmp, "wb") as f:
+            f.truncate(size)
+        f = open(tmp, "r+b")
+        mm = mmap.mmap(f.fileno(), size)
+        if self.mm is not None:
+            n = self.used
+            mm[dir_off:dir_off + n * DIR_DTYPE.itemsize] = self.mm[self.dir_off:self.dir_off + n * DIR_DTYPE.itemsize]
+            mm[rows_off:rows_off + n * ROW_DTYPE.itemsize] = self.mm[self.rows_off:self.rows_off + n * ROW_DTYPE.itemsize]
+        # a resize within the same millisecond as the start still needs a new generation
+        self.generation = max(int(time.time() * 1000), getattr(self, "generation", 0) + 1)
+        HEADER.pack_into(mm, 0, MAGIC, LAYOUT_VERSION, capacity, self.used, self.dir_seq, self.generation)
+        os.replace(tmp, self.path)
+
+        if self.mm is not None:
+            self.tokens = None
+            self.mm.close()
+            self.f.close()
+        self.f, self.mm = f, mm
+        self.capacity = capacity
+        self.dir_off, self.rows_off = dir_off, rows_off
+        self.tokens = np.ndarray(capacity, dtype=DIR_DTYPE, buffer=mm, offset=dir_off)
+        self._seq.extend([0] * (capacity - len(self._seq)))
+
+    def _reserve(self, slots: int) -> None:
+        if slots <= self.capacity * GROW_AT:
+            return
+        capacity = self.capacity
+        while slots > capacity * GROW_AT:
+            capacity *= 2
+        self._create(capacity)
+        print(f"[SHM] {slots} slots in use: table grown to {capacity} (generation {self.generation})")
+
+    def register(self, slot: int, token: str, kind: int, active: bool = True) -> None:
+        if slot >= self.capacity:
+            self._reserve(slot + 1)
+        self.tokens[slot] = (str(token).encode("ascii"), kind, 1 if active else 0, b"\x00" * 6)
+        if slot >= self.used:
+            self.used = slot + 1
+            # directory entries first, then the count readers poll
+            struct.pack_into("<I", self.mm, _USED_OFF, self.used)
+
+    def sync(self, registry) -> None:
+        """
+        Publish directory entries for contracts registered since the last
+        call, and the active flag of contracts retired or revived since.
+        """
+        self._reserve(len(registry.by_slot))
+        flags = self.tokens["active"]
+        changed = False
+        for c in registry.by_slot[:self.used]:
+            if bool(flags[c.slot]) != c.active:
+                flags[c.slot] = 1 if c.active else 0
+                changed = True
+        if changed:
+            self.dir_seq += 1
+            struct.pack_into("<I", self.mm, _DIR_SEQ_OFF, self.dir_seq)
+        for c in registry.by_slot[self.used:]:
+            self.register(c.slot, c.token, c.kind, c.active)
+
+    def update(self, slot: int, v: tuple, book: Optional[tuple] = None) -> None:
+        """
+        v: producer tick tuple (ts_exch, ltp, o, h, l, c, vol, tbq, tsq, oi), prices in paise.
+        book: (bid_px, bid_qty, ask_px, ask_qty) in paise, None keeps the last quote.
+        """
+        if slot >= self.used:
+            return
+        off = self.rows_off + slot * ROW_DTYPE.itemsize
+        mm = self.mm
+        if book is None:
+            _seq, _r, _e, _l, bid, ask, bq, aq, _oi, _v = _ROW.unpack_from(mm, off)
+        else:
+            bid, bq, ask, aq = book[0] / 100.0, _i(book[1]), book[2] / 100.0, _i(book[3])
+        seq = self._seq[slot] + 1
+        _SEQ.pack_into(mm, off, seq)
+        _BODY.pack_into(
+            mm, off + 8,
+            int(time.time() * 1000), _i(v[0]), (v[1] or 0) / 100.0, bid, ask, bq, aq, _i(v[9]), _i(v[6]),
+        )
+        self._seq[slot] = seq + 1
+        _SEQ.pack_into(mm, off, seq + 1)
+
+    def close(self, remove: bool = False) -> None:
+        self.tokens = None
+        self.mm.close()
+        self.f.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+class ShmTickReader:
+    """
+    Strategy side: attach to the producer's table (read-only mapping).
+
+      r = ShmTickReader()
+      r.get("12345")            -> {"ltp": ..., "bid": ..., ...} (consistent row)
+      r.rows                    -> zero-copy NumPy view of all rows (ROW_DTYPE)
+      r.snapshot()              -> consistent copy of all rows
+
+    Reads never block the writer: a row read while `seq` is odd or changed
+    underneath is simply read again. `refresh()` picks up new and retired
+    contracts and re-attaches after a producer restart or a resize (new
+    generation). Retired slots keep their last row; `tokens["active"]` is 0
+    for them and they are left out of `slot_by_token`.
+    """
+
+    def __init__(self, path: str = SHM_TICKS_PATH):
+        self.path = Path(path)
+        self.mm = None
+        self._attach()
+
+    def _attach(self) -> None:
+        if self.mm is not None:
+            self.close()
+        with open(self.path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.capacity, _used, _dir_seq, self.generation = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise RuntimeError(f"{self.path} is not a v{LAYOUT_VERSION} tick table")
+        self.dir_off, self.rows_off, _ = _layout(self.capacity)
+        self.tokens = np.ndarray(self.capacity, dtype=DIR_DTYPE, buffer=self.mm, offset=self.dir_off)
+        self.rows = np.ndarray(self.capacity, dtype=ROW_DTYPE, buffer=self.mm, offset=self.rows_off)
+        self.used = 0
+        self.dir_seq = -1
+        self.slot_by_token: Dict[str, int] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                gen = HEADER.unpack(f.read(HEADER.size))[5]
+        except (OSError, struct.error):
+            gen = self.generation
+        if gen != self.generation:
+            self._attach()
+            return
+        used, dir_seq = struct.unpack_from("<II", self.mm, _USED_OFF)
+        start = self.used
+        if dir_seq != self.dir_seq:
+            # contracts retired or revived: rebuild the index
+            self.slot_by_token = {}
+            self.dir_seq = dir_seq
+            start = 0
+        for slot in range(start, used):
+            entry = self.tokens[slot]
+            if entry["active"]:
+                self.slot_by_token[entry["token"].decode("ascii")] = slot
+        self.used = used
+
+    def slot_of(self, token: str) -> int:
+        slot = self.slot_by_token.get(token)
+        if slot is None:
+            self.refresh()
+            slot = self.slot_by_token.get(token, -1)
+        return slot
+
+    def read(self, slot: int) -> tuple:
+        """
+        Consistent row tuple (ROW_DTYPE order, seq first).
+        """
+        off = self.rows_off + slot * ROW_DTYPE.itemsize
+        mm = self.mm
+        spins = 0
+        while True:
+            row = _ROW.unpack_from(mm, off)
+            if row[0] & 1 == 0 and _SEQ.unpack_from(mm, off)[0] == row[0]:
+                return row
+            spins += 1
+            if spins % 64 == 0:
+                # writer preempted mid-row (more runnable threads than cores): let it finish
+                os.sched_yield()
+
+    def get(self, token: str) -> Optional[Dict[str, float]]:
+        slot = self.slot_of(token)
+        if slot < 0:
+            return None
+        return dict(zip(FIELDS, self.read(slot)[1:]))
+
+    def snapshot(self) -> np.ndarray:
+        """
+        Consistent copy of rows[:used]: seq before, one bulk copy, seq after.
+        Only rows whose seq was odd or moved during the copy are read again.
+        """
+        n = self.used
+        rows = self.rows[:n]
+        before = rows["seq"].copy()
+        out = rows.copy()
+        after = rows["seq"]
+        for i in np.nonzero((before & 1 == 1) | (before != after) | (out["seq"] != before))[0]:
+            out[i] = np.frombuffer(_ROW.pack(*self.read(int(i))), dtype=ROW_DTYPE)[0]
+        return out
+
+    def tokens_list(self) -> List[str]:
+        return list(self.slot_by_token)
+
+    def close(self) -> None:
+        self.rows = self.tokens = None
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # a caller still holds a view of the old mapping; freed with it
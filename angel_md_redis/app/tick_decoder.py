@@ -0,0 +1,194 @@
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# SmartAPI WebSocket V2 binary tick layout (little-endian, packed).
+# LTP (51 bytes) is a prefix of QUOTE (123), which is a prefix of SNAP_QUOTE (379).
+MODE_LTP = 1
+MODE_QUOTE = 2
+MODE_SNAP = 3
+
+_LTP_FIELDS = [
+    ("mode", "u1"),
+    ("exch", "u1"),
+    ("token", "S25"),           # null-padded ascii
+    ("seq", "<i8"),
+    ("ts_exch", "<i8"),         # ms epoch
+    ("ltp", "<i8"),             # paise
+]
+_QUOTE_FIELDS = _LTP_FIELDS + [
+    ("ltq", "<i8"),
+    ("atp", "<i8"),
+    ("vol", "<i8"),
+    ("tbq", "<f8"),
+    ("tsq", "<f8"),
+    ("open", "<i8"),
+    ("high", "<i8"),
+    ("low", "<i8"),
+    ("close", "<i8"),
+]
+DEPTH_DTYPE = np.dtype([
+    ("flag", "<u2"),            # 1 = buy, 0 = sell
+    ("qty", "<i8"),
+    ("price", "<i8"),           # paise
+    ("orders", "<u2"),
+])
+_SNAP_FIELDS = _QUOTE_FIELDS + [
+    ("ltt", "<i8"),
+    ("oi", "<i8"),
+    ("oi_chg_pct", "<i8"),
+    ("depth", DEPTH_DTYPE, (10,)),
+    ("uc", "<i8"),              # upper circuit, paise
+    ("lc", "<i8"),              # lower circuit, paise
+    ("h52", "<i8"),
+    ("l52", "<i8"),
+]
+
+LTP_DTYPE = np.dtype(_LTP_FIELDS)
+QUOTE_DTYPE = np.dtype(_QUOTE_FIELDS)
+SNAP_DTYPE = np.dtype(_SNAP_FIELDS)
+
+FRAME_DTYPES = {MODE_LTP: LTP_DTYPE, MODE_QUOTE: QUOTE_DTYPE, MODE_SNAP: SNAP_DTYPE}
+
+assert (LTP_DTYPE.itemsize, QUOTE_DTYPE.itemsize, SNAP_DTYPE.itemsize) == (51, 123, 379)
+
+# mode, ts_exch, ltp, vol, tbq, tsq, open, high, low, close, oi straight out of a slot
+_VALUES = struct.Struct("<B34xqq16xqddqqqq8xq")
+
+
+def decode_frame(buf) -> Optional[np.void]:
+    """
+    Zero-copy structured view of one binary tick frame (None if not a tick).
+    """
+    if len(buf) < LTP_DTYPE.itemsize:
+        return None
+    dtype = FRAME_DTYPES.get(buf[0])
+    if dtype is None or len(buf) < dtype.itemsize:
+        return None
+    return np.frombuffer(buf, dtype=dtype, count=1)[0]
+
+
+def frame_token(buf) -> bytes:
+    return bytes(buf[2:27]).split(b"\x00", 1)[0]
+
+
+class TickSlots:
+    """
+    Latest decoded tick per subscribed token, in one preallocated SNAP-layout
+    array indexed by slot. A frame is copied in with a single memcpy of its
+    bytes (LTP/QUOTE frames fill the prefix); no per-field Python objects.
+    `rows` is the NumPy view for vectorized readers.
+
+    `values(slot)` returns the tuple the producer's emit path consumes:
+      (ts_exch, ltp, open, high, low, close, vol, tbq, tsq, oi)
+    prices in paise, None for fields the frame's mode doesn't carry.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        capacity = max(1, int(capacity))
+        self.rows = np.zeros(capacity, dtype=SNAP_DTYPE)
+        self._mv = memoryview(self.rows.view(np.uint8))
+        self.tokens: List[str] = []
+        self._slot_by_token: Dict[bytes, int] = {}
+
+    def register(self, token: str) -> int:
+        key = str(token).encode("ascii")
+        slot = self._slot_by_token.get(key)
+        if slot is not None:
+            return slot
+        slot = len(self.tokens)
+        if slot >= len(self.rows):
+            self._grow(2 * len(self.rows))
+        self._slot_by_token[key] = slot
+        self.tokens.append(str(token))
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        rows = np.zeros(capacity, dtype=SNAP_DTYPE)
+        rows[: len(self.rows)] = self.rows
+        self.rows = rows
+        self._mv = memoryview(rows.view(np.uint8))
+
+    def slot_of(self, token: str) -> int:
+        return self._slot_by_token.get(str(token).encode("ascii"), -1)
+
+    def decode_into(self, buf) -> int:
+        """
+        Copy one frame into its token's slot. Returns slot, or -1 for frames
+        that aren't ticks or belong to unregistered tokens.
+        """
+        n = len(buf)
+        if n < LTP_DTYPE.itemsize or buf[0] not in FRAME_DTYPES:
+            return -1
+        slot = self._slot_by_token.get(frame_token(buf), -1)
+        if slot < 0:
+            return -1
+        n = min(n, FRAME_DTYPES[buf[0]].itemsize)
+        off = slot * SNAP_DTYPE.itemsize
+        self._mv[off:off + n] = buf[:n]
+        return slot
+
+    def raw(self, slot: int) -> memoryview:
+        """
+        Zero-copy bytes of one slot (SNAP_QUOTE frame layout).
+        """
+        off = slot * SNAP_DTYPE.itemsize
+        return self._mv[off:off + SNAP_DTYPE.itemsize]
+
+    def values(self, slot: int) -> tuple:
+        mode, ts_exch, ltp, vol, tbq, tsq, o, h, l, c, oi = _VALUES.unpack_from(self._mv, slot * SNAP_DTYPE.itemsize)
+        if mode < MODE_QUOTE:
+            return (ts_exch, ltp, None, None, None, None, None, None, None, None)
+        return (ts_exch, ltp, o, h, l, c, vol, tbq, tsq, oi if mode >= MODE_SNAP else None)
+
+
+def dict_values(data: dict) -> tuple:
+    """
+    Same tuple as TickSlots.values() from a SmartWebSocketV2 parsed dict.
+    """
+    return (
+        data.get("exchange_timestamp"),
+        data.get("last_traded_price"),
+        data.get("open_price_of_the_day"),
+        data.get("high_price_of_the_day"),
+        data.get("low_price_of_the_day"),
+        data.get("closed_price"),
+        data.get("volume_trade_for_the_day"),
+        data.get("total_buy_quantity"),
+        data.get("total_sell_quantity"),
+        data.get("open_interest"),
+    )
+
+
+# ---------------------------
+# Frame recording (validation / benchmarks)
+# ---------------------------
+
+class FrameRecorder:
+    """
+    Appends raw frames as <u32 length><bytes> records.
+    """
+
+    def __init__(self, path: str):
+        self.f = open(path, "ab")
+
+    def write(self, buf) -> None:
+        self.f.write(struct.pack("<I", len(buf)))
+        self.f.write(buf)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+def iter_frames(path: str) -> Iterator[bytes]:
+    data = Path(path).read_bytes()
+    i = 0
+    while i + 4 <= len(data):
+        (n,) = struct.unpack_from("<I", data, i)
+        i += 4
+        if i + n > len(data):
+            break
+        yield data[i:i + n]
+        i += n
@@ -0,0 +1,159 @@
+import datetime as dt
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .config import (
+    SYMBOLS_FILE, STRIKES_AROUND, UNIVERSE_REFRESH_SEC, SCRIPMASTER_CHECK_SEC, EXPIRY_ROLL_TIME, load_symbols,
+)
+from .scripmaster import (
+    CACHE_PATH, load_scripmaster, refresh_scripmaster, resolve_eq_tokens, build_atm_option_tokens, planning_date,
+)
+
+
+def _file_sig(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class UniversePlan:
+    """
+    A rebuilt instrument universe for MarketDataProducer.apply_universe().
+    `options` / `expiry` only hold the underlyings to (re)plan; the others
+    keep their subscribed contracts.
+    """
+
+    def __init__(self, df: pd.DataFrame, symbols: List[str], eq_map: Dict[str, Dict[str, str]],
+                 options: Dict[str, List[dict]], expiry: Dict[str, str], reasons: List[str]):
+        self.df = df
+        self.symbols = symbols
+        self.eq_map = eq_map
+        self.options = options
+        self.expiry = expiry
+        self.reasons = reasons
+
+
+class UniverseRefresher:
+    """
+    Producer background thread. Every UNIVERSE_REFRESH_SEC it looks for:
+      - a changed symbols.txt (mtime / size)
+      - a new ScripMaster: the cache file changed, or the conditional
+        download (every SCRIPMASTER_CHECK_SEC) fetched a new one
+      - a new planning date: past EXPIRY_ROLL_TIME IST, expiring series roll
+      - spot prices for underlyings added earlier without one
+    and, if any, rebuilds the universe on this thread and hands the plan
+    to producer.apply_universe(), which swaps it in and applies the
+    subscription diff.
+
+    Only underlyings whose option plan can have changed are re-planned:
+    new ones, ones whose nearest expiry moved, and ones whose subscribed
+    tokens are gone from a new ScripMaster. ATM strikes are not re-centered.
+    """
+
+    def __init__(self, producer, interval_sec: float = UNIVERSE_REFRESH_SEC,
+                 scrip_check_sec: int = SCRIPMASTER_CHECK_SEC, roll_time: str = EXPIRY_ROLL_TIME):
+        self.p = producer
+        self.interval_sec = max(1.0, float(interval_sec))
+        self.scrip_check_sec = scrip_check_sec
+        self.roll_time = roll_time
+        self._symbols_sig = _file_sig(SYMBOLS_FILE)
+        self._scrip_sig = _file_sig(CACHE_PATH)
+        self._scrip_checked = time.time()
+        self._date = planning_date(roll_time)
+        self._awaiting_spot: Optional[Set[str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _changes(self) -> List[str]:
+        reasons = []
+        if _file_sig(SYMBOLS_FILE) != self._symbols_sig:
+            reasons.append("symbols")
+        if self.scrip_check_sec and time.time() - self._scrip_checked >= self.scrip_check_sec:
+            self._scrip_checked = time.time()
+            try:
+                refresh_scripmaster(CACHE_PATH)
+            except Exception as e:
+                print(f"[UNIVERSE] ScripMaster check failed: {e!r}")
+        if _file_sig(CACHE_PATH) != self._scrip_sig:
+            reasons.append("scripmaster")
+        if planning_date(self.roll_time) != self._date:
+            reasons.append("date")
+        if self._awaiting_spot is None:
+            # underlyings the initial plan skipped (no spot price yet at the time)
+            self._awaiting_spot = set(self.p.symbols) - set(self.p.option_plan())
+        if self._awaiting_spot & set(self.p.spot_ltp):
+            reasons.append("spot")
+        return reasons
+
+    def build(self, reasons: List[str], today: dt.date) -> UniversePlan:
+        p = self.p
+        df = load_scripmaster(CACHE_PATH) if "scripmaster" in reasons else p.df
+        symbols = load_symbols() if "symbols" in reasons else list(p.symbols)
+        if not symbols:
+            raise RuntimeError("symbols.txt is empty")
+        eq_map = resolve_eq_tokens(df, symbols)
+
+        current = p.option_plan()
+        if "scripmaster" in reasons or "date" in reasons:
+            candidates = [s for s in symbols if s in eq_map]
+        else:
+            candidates = [s for s in symbols if s in eq_map and s not in current]
+        listed = set(df["token"]) if "scripmaster" in reasons else None
+
+        spot = dict(p.spot_ltp)
+        options: Dict[str, List[dict]] = {}
+        expiry: Dict[str, str] = {}
+        awaiting = set()
+        for sym in candidates:
+            if sym not in spot:
+                # equity goes live now; its options once a spot price arrives
+                awaiting.add(sym)
+                continue
+            contracts, expiry_iso = build_atm_option_tokens(df, sym, spot[sym], STRIKES_AROUND, today=today)
+            cur = current.get(sym)
+            if cur is not None and cur[0] == expiry_iso and (listed is None or cur[1] <= listed):
+                continue  # same series, tokens still listed: keep the subscribed strikes
+            options[sym] = contracts
+            if expiry_iso:
+                expiry[sym] = expiry_iso
+        self._awaiting_spot = awaiting
+        return UniversePlan(df, symbols, eq_map, options, expiry, reasons)
+
+    def run_once(self) -> bool:
+        if not self.p.options_subscribed:
+            return False  # initial plan still pending; it already uses the latest inputs
+        reasons = self._changes()
+        if not reasons:
+            return False
+        sigs = _file_sig(SYMBOLS_FILE), _file_sig(CACHE_PATH), planning_date(self.roll_time)
+        t0 = time.time()
+        plan = self.build(reasons, sigs[2])
+        self.p.apply_universe(plan)
+        self._symbols_sig, self._scrip_sig, self._date = sigs
+        print(f"[UNIVERSE] refreshed ({', '.join(reasons)}) in {time.time() - t0:.1f}s")
+        return True
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            try:
+                self.run_once()
+            except Exception as e:
+                # inputs are re-checked next round; the current universe stays live
+                print(f"[UNIVERSE] refresh failed: {e!r}")
+
+    def start(self) -> "UniverseRefresher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="universe-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
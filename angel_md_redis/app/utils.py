@@ -37,3 +37,21 @@ def paise_to_rupees(x):
         return float(x) / 100.0
     except:
         return None
+
+def option_contract_key(strike, cp) -> str:
+    """
+    Fallback contract key when a greeks row has no tradingsymbol: "3900CE".
+    """
+    f = safe_float(strike)
+    if f is None:
+        return ""
+    return f"{f:g}{str(cp or '').upper()}"
+
+def greeks_contract_key(item: dict) -> str:
+    """
+    item: optionGreek row with lower-cased keys.
+    """
+    tsym = item.get("tradingsymbol") or item.get("symbol")
+    if tsym:
+        return str(tsym)
+    return option_contract_key(item.get("strikeprice"), item.get("optiontype"))
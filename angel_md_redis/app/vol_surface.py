@@ -0,0 +1,286 @@
+import datetime as dt
+import json
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import STREAM_GREEKS, VOLSURF_MIN_POINTS, VOLSURF_REFRESH_SEC
+from .redis_store import RedisStore
+from .utils import safe_float, greeks_contract_key
+
+# hash "{UNDERLYING}:{EXPIRY_ISO}" -> json SmileFit (see SmileFit.to_dict)
+VOLSURF_KEY = "md:volsurf"
+
+# SVI raw parameter bounds: a, b, rho, m, sigma
+_LO = np.array([-1.0, 1e-6, -0.999, -2.0, 1e-4])
+_HI = np.array([4.0, 10.0, 0.999, 2.0, 4.0])
+_P0 = np.array([0.01, 0.1, -0.3, 0.0, 0.1])
+
+# expiry settles at 15:30 IST
+_EXPIRY_UTC = dt.time(10, 0)
+_YEAR_SEC = 365.0 * 86400.0
+
+
+def year_fraction(expiry_iso: str, now: Optional[float] = None) -> float:
+    d = dt.date.fromisoformat(expiry_iso)
+    exp = dt.datetime.combine(d, _EXPIRY_UTC, tzinfo=dt.timezone.utc).timestamp()
+    return max((exp - (now or time.time())) / _YEAR_SEC, 1e-4)
+
+
+def svi_w(p: np.ndarray, k):
+    """
+    SVI raw total variance: a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2))
+    """
+    a, b, rho, m, sig = p
+    d = k - m
+    return a + b * (rho * d + np.sqrt(d * d + sig * sig))
+
+
+def _svi_jac(p: np.ndarray, k: np.ndarray) -> np.ndarray:
+    a, b, rho, m, sig = p
+    d = k - m
+    s = np.sqrt(d * d + sig * sig)
+    return np.stack([np.ones_like(k), rho * d + s, b * d, -b * (rho + d / s), b * sig / s], axis=1)
+
+
+def fit_svi(k: np.ndarray, w: np.ndarray, p0: Optional[np.ndarray] = None, max_iter: int = 50) -> Tuple[np.ndarray, float, int]:
+    """
+    Levenberg-Marquardt least squares on total variance, bounds by clipping.
+    Warm-started from `p0` (the previous fit) it usually converges in a few steps.
+    Returns (params, rmse, iterations).
+    """
+    p = np.clip(_P0.copy() if p0 is None else np.asarray(p0, dtype=np.float64), _LO, _HI)
+    if p0 is None:
+        p[0] = max(float(np.min(w)) * 0.5, 1e-6)
+    r = svi_w(p, k) - w
+    loss = float(r @ r)
+    lam = 1e-3
+    it = 0
+    for it in range(1, max_iter + 1):
+        J = _svi_jac(p, k)
+        A = J.T @ J
+        g = J.T @ r
+        try:
+            step = np.linalg.solve(A + lam * np.diag(np.diag(A) + 1e-12), -g)
+        except np.linalg.LinAlgError:
+            break
+        p_new = np.clip(p + step, _LO, _HI)
+        r_new = svi_w(p_new, k) - w
+        loss_new = float(r_new @ r_new)
+        if loss_new < loss:
+            done = (loss - loss_new) <= 1e-10 * max(loss, 1e-16)
+            p, r, loss = p_new, r_new, loss_new
+            lam = max(lam / 3.0, 1e-9)
+            if done:
+                break
+        else:
+            lam *= 4.0
+            if lam > 1e8:
+                break
+    return p, math.sqrt(loss / max(len(k), 1)), it
+
+
+class SmileFit:
+    __slots__ = ("underlying", "expiry", "params", "fwd", "t", "scale", "rmse", "n", "version", "ts_ms")
+
+    def __init__(self, underlying, expiry, params, fwd, t, scale, rmse, n, version, ts_ms):
+        self.underlying = underlying
+        self.expiry = expiry
+        self.params = np.asarray(params, dtype=np.float64)
+        self.fwd = float(fwd)
+        self.t = float(t)
+        self.scale = float(scale)
+        self.rmse = float(rmse)
+        self.n = int(n)
+        self.version = int(version)
+        self.ts_ms = int(ts_ms)
+
+    def iv(self, strike: float) -> Optional[float]:
+        """
+        Fitted IV at any strike, O(1), in the units the greeks feed uses.
+        """
+        if strike <= 0 or self.fwd <= 0:
+            return None
+        w = float(svi_w(self.params, math.log(strike / self.fwd)))
+        if w <= 0:
+            return None
+        return math.sqrt(w / self.t) * self.scale
+
+    def to_dict(self) -> dict:
+        return {
+            "params": [round(float(x), 10) for x in self.params],
+            "fwd": self.fwd, "t": self.t, "scale": self.scale, "rmse": self.rmse,
+            "n": self.n, "version": self.version, "ts_ms": self.ts_ms,
+        }
+
+    @classmethod
+    def from_dict(cls, underlying: str, expiry: str, d: dict) -> "SmileFit":
+        return cls(underlying, expiry, d["params"], d["fwd"], d["t"], d["scale"], d.get("rmse", 0.0),
+                   d.get("n", 0), d.get("version", 0), d.get("ts_ms", 0))
+
+
+def smile_points(rows: List[dict]) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    """
+    Greeks rows (lower-cased optionGreek keys) -> (strikes, iv, forward, scale).
+    Uses the OTM side per strike; forward is where call delta crosses 0.5
+    (median strike if deltas are missing). IV quoted in percent gets scale=100.
+    """
+    ce: Dict[float, Tuple[float, float]] = {}
+    pe: Dict[float, float] = {}
+    for it in rows:
+        k = safe_float(it.get("strikeprice"))
+        iv = safe_float(it.get("impliedvolatility") or it.get("iv"))
+        if k is None or iv is None or k <= 0 or iv <= 0:
+            continue
+        if str(it.get("optiontype", "")).upper() == "CE":
+            ce[k] = (iv, safe_float(it.get("delta")) or float("nan"))
+        else:
+            pe[k] = iv
+
+    strikes = np.array(sorted(set(ce) | set(pe)), dtype=np.float64)
+    if len(strikes) == 0:
+        return strikes, strikes, 0.0, 1.0
+
+    fwd = float(np.median(strikes))
+    if ce:
+        ks = np.array(sorted(ce), dtype=np.float64)
+        deltas = np.array([ce[k][1] for k in ks])
+        ok = ~np.isnan(deltas)
+        if ok.sum() >= 2:
+            # call delta decreases with strike
+            order = np.argsort(deltas[ok])
+            fwd = float(np.interp(0.5, deltas[ok][order], ks[ok][order]))
+
+    ivs = np.array([
+        (pe.get(k) if k < fwd and k in pe else (ce[k][0] if k in ce else pe.get(k)))
+        for k in strikes
+    ], dtype=np.float64)
+    scale = 100.0 if float(np.median(ivs)) > 3.0 else 1.0
+    return strikes, ivs, fwd, scale
+
+
+class VolSurfaceFitter:
+    """
+    md:greeks:snap (full/delta rows) -> per-(underlying, expiry) SVI smile.
+
+    Keeps the latest greeks row per contract, refits only chains that changed,
+    warm-started from the previous parameters, and publishes versioned fits to
+    the VOLSURF_KEY hash.
+    """
+
+    def __init__(self, group: str = "volsurf", consumer: str = "volsurf-1"):
+        self.rs = RedisStore()
+        self.group = group
+        self.consumer = consumer
+        self.rs.ensure_group(STREAM_GREEKS, group)
+
+        self.rows: Dict[Tuple[str, str], Dict[str, dict]] = {}
+        self.fits: Dict[Tuple[str, str], SmileFit] = {}
+        self._dirty: set = set()
+
+    def ingest(self, fields: Dict[str, str]) -> None:
+        k = (fields.get("underlying", ""), fields.get("expiry", ""))
+        if not all(k):
+            return
+        try:
+            items = json.loads(fields.get("data_json") or "[]")
+        except Exception:
+            return
+        book = self.rows.setdefault(k, {})
+        if fields.get("kind", "full") == "full":
+            book.clear()
+        for it in items or []:
+            norm = {str(a).lower(): b for a, b in (it or {}).items()}
+            ck = greeks_contract_key(norm)
+            if ck:
+                book[ck] = norm
+        self._dirty.add(k)
+
+    def refit(self, k: Tuple[str, str]) -> Optional[SmileFit]:
+        strikes, ivs, fwd, scale = smile_points(list(self.rows.get(k, {}).values()))
+        if len(strikes) < VOLSURF_MIN_POINTS:
+            return None
+        t = year_fraction(k[1])
+        kk = np.log(strikes / fwd)
+        w = (ivs / scale) ** 2 * t
+
+        prev = self.fits.get(k)
+        params, rmse, _ = fit_svi(kk, w, p0=prev.params if prev is not None else None,
+                                  max_iter=15 if prev is not None else 60)
+        fit = SmileFit(k[0], k[1], params, fwd, t, scale, rmse, len(strikes),
+                       (prev.version + 1) if prev is not None else 1, int(time.time() * 1000))
+        self.fits[k] = fit
+        return fit
+
+    def refit_dirty(self) -> int:
+        if not self._dirty:
+            return 0
+        out = {}
+        for k in list(self._dirty):
+            fit = self.refit(k)
+            if fit is not None:
+                out[f"{k[0]}:{k[1]}"] = json.dumps(fit.to_dict(), separators=(",", ":"))
+        self._dirty.clear()
+        if out:
+            self.rs.hset_meta(VOLSURF_KEY, out)
+        return len(out)
+
+    def run_forever(self):
+        print(f"[VOLSURF] reading {STREAM_GREEKS} -> {VOLSURF_KEY}")
+        while True:
+            resp = self.rs.xreadgroup(self.group, self.consumer, {STREAM_GREEKS: ">"}, count=500, block_ms=1000)
+            for _stream, msgs in resp or []:
+                for _msg_id, fields in msgs:
+                    self.ingest(fields)
+                self.rs.xack(STREAM_GREEKS, self.group, *[m for m, _ in msgs])
+            t0 = time.perf_counter()
+            n = self.refit_dirty()
+            if n:
+                print(f"[VOLSURF] refit {n} chains in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+class VolSurfaceReader:
+    """
+    O(1) IV lookups for the joiner / strategies from the fitted smiles.
+    Reloads VOLSURF_KEY at most every VOLSURF_REFRESH_SEC.
+    """
+
+    def __init__(self, rs: Optional[RedisStore] = None):
+        self.rs = rs or RedisStore()
+        self.fits: Dict[Tuple[str, str], SmileFit] = {}
+        self._loaded = 0.0
+
+    def due(self) -> bool:
+        """
+        True (and the interval restarts) when VOLSURF_KEY should be reloaded.
+        """
+        now = time.time()
+        if (now - self._loaded) < VOLSURF_REFRESH_SEC:
+            return False
+        self._loaded = now
+        return True
+
+    def load(self, mapping: dict) -> None:
+        for field, raw in (mapping or {}).items():
+            underlying, _, expiry = str(field).partition(":")
+            cur = self.fits.get((underlying, expiry))
+            try:
+                d = json.loads(raw)
+                if cur is None or d.get("version", 0) != cur.version or d.get("ts_ms", 0) != cur.ts_ms:
+                    self.fits[(underlying, expiry)] = SmileFit.from_dict(underlying, expiry, d)
+            except Exception:
+                continue
+
+    def refresh(self, force: bool = False) -> None:
+        if force:
+            self._loaded = time.time()
+        elif not self.due():
+            return
+        self.load(self.rs.hgetall(VOLSURF_KEY))
+
+    def iv(self, underlying: str, expiry: str, strike: float) -> Optional[float]:
+        self.refresh()
+        fit = self.fits.get((underlying, expiry))
+        return fit.iv(strike) if fit is not None else None
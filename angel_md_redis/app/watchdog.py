@@ -0,0 +1,225 @@
+import array
+import json
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .config import (
+    WATCHDOG_SWEEP_SEC, WATCHDOG_GAP_MULT, WATCHDOG_MIN_SILENCE_SEC, WATCHDOG_NEVER_SEC,
+    WATCHDOG_COOLDOWN_SEC, WATCHDOG_MAX_SILENT_FRAC, WATCHDOG_PUBLISH_SEC,
+)
+from .redis_store import RedisStore
+from .utils import now_ms
+
+GAPS_KEY = "md:watchdog:gaps"        # token -> json gap stats
+SUMMARY_KEY = "md:watchdog:summary"
+
+_GAP_ALPHA = 0.1                     # EWMA weight of the newest mean gap (plain mean for the first 1/alpha gaps)
+_MIN_GAPS = 5                        # gaps observed before the gap rule applies
+_monotonic = time.monotonic
+
+# per-slot sweep state (watchdog thread only), one contiguous array each; times are monotonic seconds
+STATE_FIELDS = (
+    ("active", np.bool_),
+    ("since", np.float64),        # became active (baseline for tokens that never ticked)
+    ("gap", np.float64),          # EWMA mean inter-tick gap, 0 = unknown
+    ("gaps", np.int64),           # gaps behind it
+    ("deadline", np.float64),     # silent from here on: last tick (or since) + allowed silence
+    ("max_silent", np.float64),   # longest gap seen (mean gap where several ticks fell in one sweep)
+    ("resub_at", np.float64),
+    ("resubs", np.int64),
+    ("retries", np.int64),        # resubscribes since the last tick (cooldown backoff)
+    ("count_prev", np.int64),     # count / last at the previous sweep
+    ("last_prev", np.float64),
+)
+
+
+class SilenceWatchdog:
+    """
+    Finds subscribed tokens that stopped ticking, per contract slot.
+
+    The WS thread calls `seen(slot)` per tick: two stores into array.array
+    buffers (cheaper per item than NumPy scalar stores). Everything else
+    runs on the watchdog thread over zero-copy NumPy views of them:
+    every WATCHDOG_SWEEP_SEC `sweep()` updates each token's EWMA of the
+    mean inter-tick gap and flags active tokens silent for more than
+    max(WATCHDOG_MIN_SILENCE_SEC, WATCHDOG_GAP_MULT x gap); with fewer than
+    5 gaps seen (or none) also at least WATCHDOG_NEVER_SEC. Flagged tokens go to
+    `on_silent(slots)` (resubscribe), at most once per WATCHDOG_COOLDOWN_SEC,
+    doubling while a token stays silent.
+    If more than WATCHDOG_MAX_SILENT_FRAC of the tokens are silent at once
+    (market closed, feed down), nothing is resubscribed.
+
+    Gap statistics go to md:watchdog:gaps every WATCHDOG_PUBLISH_SEC.
+    """
+
+    def __init__(self, rs: RedisStore, on_silent: Optional[Callable[[List[int]], None]] = None,
+                 capacity: int = 1024, sweep_sec: float = WATCHDOG_SWEEP_SEC):
+        self.rs = rs
+        self.on_silent = on_silent
+        self.sweep_sec = max(0.1, float(sweep_sec))
+        self.tokens: List[str] = []
+        self.used = 0
+        self.n_active = 0
+        self.capacity = 0
+        self._alloc(max(1, int(capacity)))
+        self.stats = {"tracked": 0, "silent": 0, "resubscribed": 0, "suppressed": 0}
+        self._published = 0.0
+        self._feed_wide = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _alloc(self, capacity: int) -> None:
+        n = self.capacity
+        last = array.array("d", bytes(8 * capacity))
+        count = array.array("q", bytes(8 * capacity))
+        if n:
+            last[:n] = self._last[:n]
+            count[:n] = self._count[:n]
+        state = {name: np.zeros(capacity, dtype=dtype) for name, dtype in STATE_FIELDS}
+        if n:
+            for name, a in state.items():
+                a[:n] = self.state[name][:n]
+        self._last, self._count = last, count
+        self.last = np.frombuffer(last, dtype=np.float64)      # monotonic s of the last tick, 0 = none yet
+        self.count = np.frombuffer(count, dtype=np.int64)
+        self.state = state
+        self.capacity = capacity
+
+    def seen(self, slot: int) -> None:
+        self._last[slot] = _monotonic()
+        self._count[slot] += 1
+
+    def sync(self, registry) -> None:
+        """
+        Track the registry's contracts (active flags follow retire / revive).
+        Call under the producer's tick lock, before subscribing new tokens.
+        """
+        n = len(registry.by_slot)
+        if n > self.capacity:
+            self._alloc(max(n, 2 * self.capacity))
+        now = _monotonic()
+        for c in registry.by_slot[self.used:]:
+            self.tokens.append(c.token)
+        st = self.state
+        for c in registry.by_slot:
+            if c.active and not st["active"][c.slot]:
+                st["since"][c.slot] = now
+                st["deadline"][c.slot] = now + max(WATCHDOG_NEVER_SEC, WATCHDOG_GAP_MULT * st["gap"][c.slot])
+            st["active"][c.slot] = c.active
+        self.used = n
+        self.n_active = int(st["active"][:n].sum())
+
+    def sweep(self, now: Optional[float] = None) -> np.ndarray:
+        """
+        -> slots to resubscribe (also updates gap statistics).
+        """
+        now = _monotonic() if now is None else now
+        n = self.used
+        st = self.state
+        # only slots that ticked since the last sweep are touched; the silence test is one compare
+        count = self.count[:n].copy()
+        dn = count - st["count_prev"][:n]
+        idx = np.flatnonzero(dn)
+        if len(idx):
+            st["count_prev"][idx] = count[idx]
+            d = dn[idx]
+            last = self.last[idx]
+            # mean gap over those ticks: (newest - previous newest) / count; before the
+            # first tick, time since subscribing stands in. Plain mean while gaps are few, EWMA after.
+            lp = st["last_prev"][idx]
+            span = last - np.where(lp > 0, lp, st["since"][idx])
+            obs = span / d
+            gaps = st["gaps"][idx] + d
+            g = st["gap"][idx]
+            g += np.maximum(_GAP_ALPHA, d / gaps) * (obs - g)
+            limit = np.maximum(WATCHDOG_MIN_SILENCE_SEC, WATCHDOG_GAP_MULT * g)
+            np.maximum(limit, np.where(gaps >= _MIN_GAPS, 0.0, WATCHDOG_NEVER_SEC), out=limit)
+            st["gaps"][idx] = gaps
+            st["gap"][idx] = g
+            st["deadline"][idx] = last + limit
+            st["max_silent"][idx] = np.maximum(st["max_silent"][idx], np.where(d == 1, span, obs))
+            st["last_prev"][idx] = last
+            st["retries"][idx] = 0
+
+        quiet = st["active"][:n] & (st["deadline"][:n] < now)
+        n_active = self.n_active
+        n_quiet = int(quiet.sum())
+        self.stats = {"tracked": n_active, "silent": n_quiet, "resubscribed": 0, "suppressed": 0}
+        if not n_quiet:
+            return np.empty(0, dtype=np.int64)
+        if n_quiet > WATCHDOG_MAX_SILENT_FRAC * n_active:
+            self.stats["suppressed"] = n_quiet
+            return np.empty(0, dtype=np.int64)
+
+        # tokens that stay silent (never-trading strikes) back off: cooldown x 1, 2, 4 .. 32
+        cand = np.flatnonzero(quiet)
+        cooldown = WATCHDOG_COOLDOWN_SEC * np.left_shift(1, np.minimum(st["retries"][cand], 5))
+        slots = cand[now - st["resub_at"][cand] >= cooldown]
+        st["resub_at"][slots] = now
+        st["resubs"][slots] += 1
+        st["retries"][slots] += 1
+        self.stats["resubscribed"] = len(slots)
+        return slots
+
+    def publish(self, now: Optional[float] = None) -> None:
+        now = _monotonic() if now is None else now
+        n = self.used
+        st = self.state
+        idx = np.nonzero(st["active"][:n])[0]
+        last = self.last[idx]
+        age_ms = np.where(last > 0, (now - last) * 1000.0, -1.0)
+        gap_ms = st["gap"][idx] * 1000.0
+        max_ms = np.maximum(st["max_silent"][idx] * 1000.0, age_ms)
+        mapping = {
+            self.tokens[i]: json.dumps({
+                "gap_ms": round(g, 1), "age_ms": round(a), "max_silent_ms": round(m), "ticks": t, "resubs": r,
+            }, separators=(",", ":"))
+            for i, g, a, m, t, r in zip(idx.tolist(), gap_ms.tolist(), age_ms.tolist(), max_ms.tolist(),
+                                        self.count[idx].tolist(), st["resubs"][idx].tolist())
+        }
+        pipe = self.rs.pipeline()
+        pipe.delete(GAPS_KEY)
+        if mapping:
+            pipe.hset(GAPS_KEY, mapping=mapping)
+        pipe.hset(SUMMARY_KEY, mapping={"ts": str(now_ms()), **{k: str(v) for k, v in self.stats.items()}})
+        pipe.execute()
+
+    def tick(self) -> None:
+        slots = self.sweep()
+        if len(slots):
+            print(f"[WATCHDOG] {len(slots)} silent tokens, resubscribing: "
+                  + ", ".join(self.tokens[i] for i in slots[:10].tolist()) + (" ..." if len(slots) > 10 else ""))
+            if self.on_silent is not None:
+                self.on_silent(slots.tolist())
+        feed_wide = bool(self.stats["suppressed"])
+        if feed_wide != self._feed_wide:
+            self._feed_wide = feed_wide
+            if feed_wide:
+                print(f"[WATCHDOG] {self.stats['suppressed']}/{self.stats['tracked']} tokens silent: feed-wide, not resubscribing")
+            else:
+                print("[WATCHDOG] feed-wide silence over")
+        now = _monotonic()
+        if now - self._published >= WATCHDOG_PUBLISH_SEC:
+            self._published = now
+            self.publish(now)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.sweep_sec):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[WATCHDOG] sweep failed: {e!r}")
+
+    def start(self) -> "SilenceWatchdog":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="silence-watchdog", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
@@ -1,16 +1,54 @@
+import threading
 import time
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from SmartApi.smartWebSocketV2 import SmartWebSocketV2
 
 from .config import (
     WS_WARMUP_SEC, STRIKES_AROUND, MAX_WS_SUBS, SUBSCRIBE_MODE,
-    STREAM_EQ, STREAM_OPT,
-    STREAM_MAXLEN_EQ, STREAM_MAXLEN_OPT,
+    WS_NATIVE_DECODE, WS_RECORD_FRAMES, CAPTURE_DEPTH, PRODUCER_HA, SHM_TICKS,
+    PRESSURE_MONITOR, PRESSURE_CONFLATE_MS, UNIVERSE_REFRESH, WATCHDOG, EXPIRY_ROLL_TIME, RETIRED_META_TTL_SEC,
+    STREAM_EVENTS, STREAM_MAXLEN_EVENTS,
+    STREAM_EQ, STREAM_OPT, STREAM_DEPTH_EQ, STREAM_DEPTH_OPT,
+    STREAM_MAXLEN_EQ, STREAM_MAXLEN_OPT, STREAM_MAXLEN_DEPTH, PROFILE_TICK_SAMPLE,
 )
 from .utils import now_ms, paise_to_rupees
 from .redis_store import RedisStore
-from .scripmaster import load_scripmaster, resolve_eq_tokens, build_atm_option_tokens
+from .scripmaster import load_scripmaster, resolve_eq_tokens, build_atm_option_tokens, planning_date
+from .tick_decoder import TickSlots, FrameRecorder, dict_values
+from .depth import (
+    depth_from_dict, depth_from_frame, encode_depth, top_of_book_from_dict, top_of_book_from_frame,
+)
+from .failover import LeaderLease, DedupPublisher
+from .contracts import ContractRegistry, Contract, EQ, OPT
+from .pressure import PressureMonitor, NORMAL, LEAN, LTP_ONLY
+from .shm_ticks import ShmTickWriter
+from .universe import UniversePlan, UniverseRefresher
+from .watchdog import SilenceWatchdog
+from .profiling import Profiler, clock
+
+
+class RawFrameWebSocket(SmartWebSocketV2):
+    """
+    SmartWebSocketV2 that can hand binary tick frames to `on_raw(wsapp, bytes)`
+    before (instead of) its per-field dict parser.
+    """
+    on_raw = None
+
+    def _on_data(self, wsapp, data, data_type, continue_flag):
+        if data_type == 2 and self.on_raw is not None:
+            self.on_raw(wsapp, data)
+            return
+        super()._on_data(wsapp, data, data_type, continue_flag)
+
+
+def _px(paise) -> str:
+    # paise -> rupees string, "" for missing/zero (same as str(paise_to_rupees(x) or ""))
+    return str(paise / 100.0) if paise else ""
+
+
+def _num(x) -> str:
+    return str(x) if x else ""
 
 
 class MarketDataProducer:
@@ -27,8 +65,13 @@ class MarketDataProducer:
         self.eq_map = resolve_eq_tokens(self.df, symbols)
         self.eq_token_to_symbol = {v["token"]: k for k, v in self.eq_map.items()}
 
-        # option token -> meta
-        self.opt_meta: Dict[str, dict] = {}
+        # every subscribed token (EQ first, then options) -> dense slot + static fields.
+        # Tick callbacks hold _universe_lock; the universe refresher takes it to
+        # register / retire contracts (registry, TickSlots and shm slots in step)
+        self._universe_lock = threading.Lock()
+        self.contracts = ContractRegistry()
+        for sym, info in self.eq_map.items():
+            self.contracts.register(EQ, info["token"], symbol=sym, tradingsymbol=info["tradingsymbol"], exchange="NSE")
 
         # ✅ This will be published to Redis for the greeks poller
         self.active_expiry_by_underlying: Dict[str, str] = {}
@@ -37,7 +80,7 @@ class MarketDataProducer:
         self.ws_open_t: Optional[float] = None
         self.options_subscribed = False
 
-        self.sws = SmartWebSocketV2(
+        self.sws = RawFrameWebSocket(
             auth_token=self.auth_token,
             api_key=self.api_key,
             client_code=self.client_code,
@@ -72,23 +115,163 @@ class MarketDataProducer:
         self.sws.on_error = self.on_error
         self.sws.on_close = self.on_close
 
+        # Depth capture: token -> last published packed book (publish on change only)
+        self.capture_depth = bool(CAPTURE_DEPTH) and SUBSCRIBE_MODE == "SNAP_QUOTE"
+        self._last_depth: Dict[str, bytes] = {}
+
+        # Native decode: frames -> preallocated slot arrays, no per-tick dicts
+        self.ticks: Optional[TickSlots] = None
+        self.recorder: Optional[FrameRecorder] = FrameRecorder(WS_RECORD_FRAMES) if WS_RECORD_FRAMES else None
+        if WS_NATIVE_DECODE or self.recorder:
+            self.sws.on_raw = self.on_raw
+        if WS_NATIVE_DECODE:
+            # registered in the same order as self.contracts: TickSlots slot == contract slot
+            self.ticks = TickSlots(capacity=MAX_WS_SUBS)
+            for c in self.contracts.by_slot:
+                self.ticks.register(c.token)
+
+        # Same-host latest-tick table (every node, leader or not: it is local state)
+        self.shm: Optional[ShmTickWriter] = None
+        if SHM_TICKS:
+            self.shm = ShmTickWriter()
+            self.shm.sync(self.contracts)
+            print(f"[WS] latest-tick table at {self.shm.path} (capacity {self.shm.capacity})")
+
+        # Backpressure: a monitor thread samples Redis memory / group lag and sets
+        # the degrade level; the WS thread only reads self.degrade
+        self.degrade = NORMAL
+        self._conflate_sec = 0.0
+        self._opt_mode = self.mode_opt
+        self.pressure: Optional[PressureMonitor] = None
+        if PRESSURE_MONITOR:
+            streams = [STREAM_EQ, STREAM_OPT] + ([STREAM_DEPTH_EQ, STREAM_DEPTH_OPT] if self.capture_depth else [])
+            self.pressure = PressureMonitor(self.rs, streams, on_change=self._on_pressure)
+
+        # Per-slot last-tick tracking; silent tokens are resubscribed (app/watchdog.py)
+        self.watchdog: Optional[SilenceWatchdog] = None
+        if WATCHDOG:
+            self.watchdog = SilenceWatchdog(self.rs, on_silent=self._resubscribe_silent, capacity=MAX_WS_SUBS)
+            self.watchdog.sync(self.contracts)
+
+        # Stage timings of 1 in PROFILE_TICK_SAMPLE ticks, stack sampling on demand (app/profiling.py).
+        # With PROFILE_TICK_SAMPLE=0 the countdown goes negative and never fires.
+        self.prof = Profiler("producer", self.rs.r)
+        self._tick_n = PROFILE_TICK_SAMPLE
+        self._sp_lock = self.prof.stage("lock", PROFILE_TICK_SAMPLE)        # waiting for _universe_lock
+        self._sp_decode = self.prof.stage("decode", PROFILE_TICK_SAMPLE)
+        self._sp_publish = self.prof.stage("publish", PROFILE_TICK_SAMPLE)  # payload + XADD
+        self._sp_side = self.prof.stage("side", PROFILE_TICK_SAMPLE)        # shm table + depth
+
+        # Intraday symbols.txt / ScripMaster changes and expiry rollover (app/universe.py)
+        self.universe: Optional[UniverseRefresher] = UniverseRefresher(self) if UNIVERSE_REFRESH else None
+
+        # Active/standby: every node stays subscribed and decodes; only the
+        # lease holder publishes ticks, de-duplicated across the handover.
+        self.lease: Optional[LeaderLease] = None
+        self.publisher: Optional[DedupPublisher] = None
+        if PRODUCER_HA:
+            self.lease = LeaderLease(self.rs, on_change=self._on_leader_change)
+            self.publisher = DedupPublisher(self.rs, self.lease)
+
     def start(self):
         if not self.eq_map:
             raise RuntimeError("No NSE EQ tokens resolved from ScripMaster.")
         print(f"[WS] EQ tokens resolved: {len(self.eq_map)}")
-        self.sws.connect()
+        if self.lease is not None:
+            self.lease.start()
+        if self.pressure is not None:
+            self.pressure.start()
+        if self.universe is not None:
+            self.universe.start()
+        if self.watchdog is not None:
+            self.watchdog.start()
+        self.prof.start()
+        try:
+            self.sws.connect()
+        finally:
+            self.prof.stop()
+            if self.watchdog is not None:
+                self.watchdog.stop()
+            if self.universe is not None:
+                self.universe.stop()
+            if self.pressure is not None:
+                self.pressure.stop()
+            if self.lease is not None:
+                self.lease.stop()
+
+    def _on_leader_change(self, leader: bool):
+        if leader and self.options_subscribed:
+            # the previous leader's plan may differ; ours is what we publish now
+            self._publish_active_expiry()
+
+    def _on_pressure(self, old: int, new: int, stats: dict):
+        """
+        Runs on the monitor thread: switch conflation / payloads, and move the
+        option subscriptions between LTP and the configured mode.
+        """
+        self._conflate_sec = 0.0 if new == NORMAL else PRESSURE_CONFLATE_MS / 1000.0 * (4 if new >= LEAN else 1)
+        self.degrade = new
+        mode = self.MODE_LTP if new >= LTP_ONLY else self.mode_opt
+        if mode != self._opt_mode and self.options_subscribed:
+            self._resubscribe_options(mode)
+
+    def _resubscribe_options(self, mode: int):
+        tokens = self.contracts.tokens(OPT)
+        BATCH = 50
+        try:
+            for i in range(0, len(tokens), BATCH):
+                token_list = [{"exchangeType": self.EXCH_NFO, "tokens": tokens[i:i + BATCH]}]
+                self.sws.unsubscribe(correlation_id=f"OPX{i//BATCH:02d}", mode=self._opt_mode, token_list=token_list)
+                self.sws.subscribe(correlation_id=f"OPM{i//BATCH:02d}", mode=mode, token_list=token_list)
+            print(f"[WS] options resubscribed mode={'LTP' if mode == self.MODE_LTP else SUBSCRIBE_MODE} ({len(tokens)} tokens)")
+            self._opt_mode = mode
+        except Exception as e:
+            print(f"[WS] option resubscribe failed: {e!r}")
+
+    def _resubscribe_silent(self, slots: List[int]):
+        """
+        Runs on the watchdog thread: unsubscribe + subscribe tokens that went silent.
+        """
+        contracts = [self.contracts.by_slot[i] for i in slots]
+        eq = [c.token for c in contracts if c.kind == EQ and c.active]
+        opt = [c.token for c in contracts if c.kind == OPT and c.active]
+        try:
+            for action, cid in ((self.sws.unsubscribe, "WDX"), (self.sws.subscribe, "WDS")):
+                self._ws_batches(action, self.EXCH_NSE, self.mode_eq, eq, cid + "E")
+                self._ws_batches(action, self.EXCH_NFO, self._opt_mode, opt, cid + "O")
+        except Exception as e:
+            print(f"[WS] resubscribe of silent tokens failed: {e!r}")
+            return
+        try:
+            self.rs.r.xadd(STREAM_EVENTS, {"ts": str(now_ms()), "type": "resubscribe", "eq": str(len(eq)),
+                                           "opt": str(len(opt)), "tokens": ",".join((eq + opt)[:100])},
+                           maxlen=STREAM_MAXLEN_EVENTS, approximate=True)
+        except Exception as e:
+            print(f"[WS] resubscribe event not stored: {e!r}")
+
+    def _conflated(self, ct: Contract) -> bool:
+        # under pressure: at most one XADD per token per conflation interval
+        now = time.monotonic()
+        if now - ct.last_pub < self._conflate_sec:
+            return True
+        ct.last_pub = now
+        return False
+
+    def _xadd(self, stream: str, tok: str, payload: dict, maxlen: int):
+        if self.publisher is None:
+            # sharded streams (OPT_SHARDS) are routed by RedisStore
+            self.rs.xadd(stream, payload, maxlen=maxlen)
+        else:
+            client, name, maxlen = self.rs.route(stream, payload, maxlen)
+            self.publisher.xadd(name, tok, payload, maxlen, client=client)
 
     def on_open(self, wsapp):
         self.ws_open_t = time.time()
         eq_tokens = [info["token"] for info in self.eq_map.values()]
 
         # store meta in redis
-        for sym, info in self.eq_map.items():
-            self.rs.hset_meta(f"meta:eq:{info['token']}", {
-                "symbol": sym,
-                "tradingsymbol": info["tradingsymbol"],
-                "exchange": "NSE",
-            })
+        for c in self.contracts.active(EQ):
+            self.rs.hset_meta(f"meta:eq:{c.token}", c.meta())
 
         token_list = [{"exchangeType": self.EXCH_NSE, "tokens": eq_tokens}]
         self.sws.subscribe(correlation_id="EQ01", mode=self.mode_eq, token_list=token_list)
@@ -100,11 +283,16 @@ class MarketDataProducer:
     def on_close(self, wsapp):
         print("[WS] closed")
 
-    def _publish_active_expiry(self):
+    def _publish_active_expiry(self, removed: List[str] = ()):
         """
         ✅ Publish active expiries for greeks poller to Redis.
         """
-        self.rs.hset_meta("md:active_expiry", self.active_expiry_by_underlying)
+        if self.lease is not None and not self.lease.is_leader:
+            return
+        if removed:
+            self.rs.r.hdel("md:active_expiry", *removed)
+        if self.active_expiry_by_underlying:
+            self.rs.hset_meta("md:active_expiry", self.active_expiry_by_underlying)
         self.rs.set_latest("md:active_expiry:ts_ms", str(now_ms()), ex_sec=3600)
 
     def _maybe_subscribe_options(self):
@@ -118,13 +306,14 @@ class MarketDataProducer:
         if not enough:
             return
 
-        # build option token plan
+        # build option token plan (after the roll time, expiring series are skipped)
+        today = planning_date(EXPIRY_ROLL_TIME)
         planned: List[dict] = []
         for sym in self.symbols:
             if sym not in self.spot_ltp:
                 continue
 
-            contracts, expiry_iso = build_atm_option_tokens(self.df, sym, self.spot_ltp[sym], STRIKES_AROUND)
+            contracts, expiry_iso = build_atm_option_tokens(self.df, sym, self.spot_ltp[sym], STRIKES_AROUND, today=today)
             if not contracts:
                 continue
 
@@ -158,27 +347,25 @@ class MarketDataProducer:
             self._publish_active_expiry()
             return
 
-        # store opt meta in redis + memory
+        # store opt meta in redis + registry
         tokens = []
         for c in unique:
-            tok = c["token"]
-            self.opt_meta[tok] = c
-            tokens.append(tok)
-            self.rs.hset_meta(f"meta:opt:{tok}", {
-                "underlying": c["underlying"],
-                "tradingsymbol": c["tradingsymbol"],
-                "expiry": c["expiry"],
-                "strike": str(c["strike"]),
-                "cp": c["cp"],
-                "exchange": "NFO",
-            })
+            contract = self.contracts.register_option(c)
+            if self.ticks is not None:
+                self.ticks.register(contract.token)
+            tokens.append(contract.token)
+            self.rs.hset_meta(f"meta:opt:{contract.token}", contract.meta())
+        if self.shm is not None:
+            self.shm.sync(self.contracts)
+        if self.watchdog is not None:
+            self.watchdog.sync(self.contracts)
 
         # subscribe in batches
         BATCH = 50
         for i in range(0, len(tokens), BATCH):
             batch = tokens[i:i + BATCH]
             token_list = [{"exchangeType": self.EXCH_NFO, "tokens": batch}]
-            self.sws.subscribe(correlation_id=f"OPT{i//BATCH:02d}", mode=self.mode_opt, token_list=token_list)
+            self.sws.subscribe(correlation_id=f"OPT{i//BATCH:02d}", mode=self._opt_mode, token_list=token_list)
 
         self.options_subscribed = True
 
@@ -187,64 +374,254 @@ class MarketDataProducer:
 
         print(f"[WS] subscribed OPT={len(tokens)} mode={SUBSCRIBE_MODE} (EQ={eq_count}, total={eq_count+len(tokens)})")
 
-    def _emit_eq(self, sym: str, tok: str, data: Dict[str, Any]):
-        ltp = paise_to_rupees(data.get("last_traded_price"))
-        if ltp is not None:
-            self.spot_ltp[sym] = ltp
+    def option_plan(self) -> Dict[str, Tuple[str, set]]:
+        """
+        underlying -> (expiry, tokens) of the subscribed option contracts.
+        """
+        out: Dict[str, Tuple[str, set]] = {}
+        for c in self.contracts.active(OPT):
+            out.setdefault(c.underlying, (c.expiry, set()))[1].add(c.token)
+        return out
 
-        payload = {
-            "ts_recv": str(now_ms()),
-            "ts_exch": str(data.get("exchange_timestamp") or ""),
-            "token": tok,
-            "symbol": sym,
-            "ltp": str(ltp if ltp is not None else ""),
-            "o": str(paise_to_rupees(data.get("open_price_of_the_day")) or ""),
-            "h": str(paise_to_rupees(data.get("high_price_of_the_day")) or ""),
-            "l": str(paise_to_rupees(data.get("low_price_of_the_day")) or ""),
-            "c": str(paise_to_rupees(data.get("closed_price")) or ""),
-            "vol": str(data.get("volume_trade_for_the_day") or ""),
-            "tbq": str(data.get("total_buy_quantity") or ""),
-            "tsq": str(data.get("total_sell_quantity") or ""),
-        }
-        self.rs.xadd(STREAM_EQ, payload, maxlen=STREAM_MAXLEN_EQ)
+    def _ws_batches(self, action, exch: int, mode: int, tokens: List[str], cid: str):
+        BATCH = 50
+        for i in range(0, len(tokens), BATCH):
+            token_list = [{"exchangeType": exch, "tokens": tokens[i:i + BATCH]}]
+            action(correlation_id=f"{cid}{i//BATCH:02d}", mode=mode, token_list=token_list)
 
-    def _emit_opt(self, tok: str, data: Dict[str, Any]):
-        meta = self.opt_meta.get(tok)
-        if not meta:
+    def apply_universe(self, plan: UniversePlan):
+        """
+        Swap in a rebuilt universe (app/universe.py) and apply the diff live:
+        retire / register contracts under the tick lock, then unsubscribe,
+        subscribe, write meta and md:active_expiry. Runs on the refresher thread.
+        """
+        keep_symbols = set(plan.symbols)
+        with self._universe_lock:
+            eq_tokens = {info["token"] for info in plan.eq_map.values()}
+            eq_del = [c for c in self.contracts.active(EQ) if c.token not in eq_tokens]
+            eq_add = []
+            for sym, info in plan.eq_map.items():
+                c = self.contracts.get(info["token"])
+                if c is None or not c.active:
+                    eq_add.append(self.contracts.register(EQ, info["token"], symbol=sym,
+                                                          tradingsymbol=info["tradingsymbol"], exchange="NSE"))
+
+            # options: keep untouched underlyings, replace re-planned ones, drop removed ones
+            current = self.option_plan()
+            wanted = {t for u, (_e, toks) in current.items() if u in keep_symbols and u not in plan.options for t in toks}
+            wanted.update(c["token"] for cs in plan.options.values() for c in cs)
+            opt_del = [c for c in self.contracts.active(OPT) if c.token not in wanted]
+            for c in eq_del + opt_del:
+                self.contracts.retire(c.token)
+            room = MAX_WS_SUBS - len(self.contracts.active())
+            opt_add, capped = [], 0
+            for cs in plan.options.values():
+                for c in cs:
+                    ct = self.contracts.get(c["token"])
+                    if ct is not None and ct.active:
+                        continue
+                    if len(opt_add) >= room:
+                        capped += 1
+                        continue
+                    opt_add.append(self.contracts.register_option(c))
+            if capped:
+                print(f"[WS] dropped {capped} option tokens to stay under MAX_WS_SUBS={MAX_WS_SUBS}")
+
+            if self.ticks is not None:
+                for c in eq_add + opt_add:
+                    self.ticks.register(c.token)
+            if self.shm is not None:
+                self.shm.sync(self.contracts)
+            if self.watchdog is not None:
+                self.watchdog.sync(self.contracts)
+
+            removed = [u for u in self.active_expiry_by_underlying if u not in keep_symbols]
+            rolled = {u: (self.active_expiry_by_underlying.get(u), e) for u, e in plan.expiry.items()
+                      if self.active_expiry_by_underlying.get(u) != e}
+            for u in removed + [u for u in plan.options if u not in plan.expiry]:
+                self.active_expiry_by_underlying.pop(u, None)
+            self.active_expiry_by_underlying.update(plan.expiry)
+            for sym in list(self.spot_ltp):
+                if sym not in keep_symbols:
+                    self.spot_ltp.pop(sym, None)
+            self.df = plan.df
+            self.symbols = plan.symbols
+            self.eq_map = plan.eq_map
+            self.eq_token_to_symbol = {v["token"]: k for k, v in plan.eq_map.items()}
+
+        # unsubscribe first: frees room under the subscription limit
+        self._ws_batches(self.sws.unsubscribe, self.EXCH_NSE, self.mode_eq, [c.token for c in eq_del], "EQX")
+        self._ws_batches(self.sws.unsubscribe, self.EXCH_NFO, self._opt_mode, [c.token for c in opt_del], "OPX")
+
+        pipe = self.rs.pipeline()
+        for c in eq_add:
+            pipe.hset(f"meta:eq:{c.token}", mapping=c.meta())
+        for c in opt_add:
+            pipe.hset(f"meta:opt:{c.token}", mapping=c.meta())
+        for c in opt_del:
+            # in-flight ticks and late consumers still resolve it for a while
+            pipe.expire(f"meta:opt:{c.token}", RETIRED_META_TTL_SEC)
+        pipe.execute()
+
+        self._ws_batches(self.sws.subscribe, self.EXCH_NSE, self.mode_eq, [c.token for c in eq_add], "EQU")
+        self._ws_batches(self.sws.subscribe, self.EXCH_NFO, self._opt_mode, [c.token for c in opt_add], "OPU")
+        self._publish_active_expiry(removed)
+
+        summary = (f"EQ +{len(eq_add)} -{len(eq_del)}, OPT +{len(opt_add)} -{len(opt_del)}"
+                   + "".join(f"; {u} {a} -> {b}" for u, (a, b) in sorted(rolled.items())))
+        print(f"[WS] universe updated: {summary}")
+        try:
+            self.rs.r.xadd(STREAM_EVENTS, {"ts": str(now_ms()), "type": "universe", "reasons": ",".join(plan.reasons),
+                                           "summary": summary}, maxlen=STREAM_MAXLEN_EVENTS, approximate=True)
+        except Exception as e:
+            print(f"[WS] universe event not stored: {e!r}")
+
+    def _emit_eq(self, ct: Contract, v: tuple):
+        """
+        v: (ts_exch, ltp, open, high, low, close, vol, tbq, tsq, oi), prices in paise
+        (see tick_decoder.dict_values / TickSlots.values)
+        """
+        ts_exch, ltp_p, _o, _h, _l, _c, vol, tbq, tsq, _oi = v
+        ltp = paise_to_rupees(ltp_p)
+        if ltp is not None:
+            self.spot_ltp[ct.symbol] = ltp
+        if self.degrade and self._conflated(ct):
             return
 
+        # static fields (token, symbol) and o/h/l/c come pre-filled from the contract template
+        ohlc = v[2:6]
+        if ohlc != ct.ohlc:
+            ct.set_ohlc(ohlc, _px)
+        payload = ct.template.copy()
+        payload["ts_recv"] = str(now_ms())
+        payload["ts_exch"] = _num(ts_exch)
+        payload["ltp"] = str(ltp if ltp is not None else "")
+        payload["vol"] = _num(vol)
+        payload["tbq"] = _num(tbq)
+        payload["tsq"] = _num(tsq)
+        self._xadd(STREAM_EQ, ct.token, payload, STREAM_MAXLEN_EQ)
+
+    def _emit_opt(self, ct: Contract, v: tuple):
+        ts_exch, ltp_p, _o, _h, _l, _c, vol, tbq, tsq, oi = v
+        if self.degrade:
+            if self._conflated(ct):
+                return
+            if self.degrade >= LEAN:
+                # static fields stay in meta:opt:{token}; underlying is kept for routing / partitioning
+                payload = {
+                    "ts_recv": str(now_ms()),
+                    "ts_exch": _num(ts_exch),
+                    "token": ct.token,
+                    "underlying": ct.underlying,
+                    "ltp": _px(ltp_p),
+                    "oi": _num(oi),
+                    "vol": _num(vol),
+                    "tbq": _num(tbq),
+                    "tsq": _num(tsq),
+                }
+                self._xadd(STREAM_OPT, ct.token, payload, STREAM_MAXLEN_OPT)
+                return
+        ohlc = v[2:6]
+        if ohlc != ct.ohlc:
+            ct.set_ohlc(ohlc, _px)
+        payload = ct.template.copy()
+        payload["ts_recv"] = str(now_ms())
+        payload["ts_exch"] = _num(ts_exch)
+        payload["ltp"] = _px(ltp_p)
+        payload["oi"] = _num(oi)
+        payload["vol"] = _num(vol)
+        payload["tbq"] = _num(tbq)
+        payload["tsq"] = _num(tsq)
+        self._xadd(STREAM_OPT, ct.token, payload, STREAM_MAXLEN_OPT)
+
+    def _emit_depth(self, ct: Contract, ts_exch, packed: Optional[bytes]):
+        tok = ct.token
+        if packed is None or self._last_depth.get(tok) == packed:
+            return
+        if ct.kind == EQ:
+            stream, key, val = STREAM_DEPTH_EQ, "symbol", ct.symbol
+        else:
+            stream, key, val = STREAM_DEPTH_OPT, "underlying", ct.underlying
+        self._last_depth[tok] = packed
         payload = {
             "ts_recv": str(now_ms()),
-            "ts_exch": str(data.get("exchange_timestamp") or ""),
+            "ts_exch": _num(ts_exch),
             "token": tok,
-            "underlying": meta["underlying"],
-            "tradingsymbol": meta["tradingsymbol"],
-            "expiry": meta["expiry"],
-            "strike": str(meta["strike"]),
-            "cp": meta["cp"],
-            "ltp": str(paise_to_rupees(data.get("last_traded_price")) or ""),
-            "oi": str(data.get("open_interest") or ""),
-            "vol": str(data.get("volume_trade_for_the_day") or ""),
-            "o": str(paise_to_rupees(data.get("open_price_of_the_day")) or ""),
-            "h": str(paise_to_rupees(data.get("high_price_of_the_day")) or ""),
-            "l": str(paise_to_rupees(data.get("low_price_of_the_day")) or ""),
-            "c": str(paise_to_rupees(data.get("closed_price")) or ""),
-            "tbq": str(data.get("total_buy_quantity") or ""),
-            "tsq": str(data.get("total_sell_quantity") or ""),
+            key: val,
+            "d": encode_depth(packed),  # app/depth.py DEPTH_PACK, base64
         }
-        self.rs.xadd(STREAM_OPT, payload, maxlen=STREAM_MAXLEN_OPT)
-
-    def on_data(self, wsapp, data: Dict[str, Any]):
-        tok = str(data.get("token", ""))
+        self._xadd(stream, tok, payload, STREAM_MAXLEN_DEPTH)
 
+    def _dispatch(self, ct: Contract, v: tuple):
         # equity tick
-        if tok in self.eq_token_to_symbol:
-            sym = self.eq_token_to_symbol[tok]
-            self._emit_eq(sym, tok, data)
+        if ct.kind == EQ:
+            self._emit_eq(ct, v)
             self._maybe_subscribe_options()
             return
 
         # option tick
-        if tok in self.opt_meta:
-            self._emit_opt(tok, data)
+        self._emit_opt(ct, v)
+
+    def on_data(self, wsapp, data: Dict[str, Any]):
+        t = 0
+        self._tick_n -= 1
+        if not self._tick_n:
+            self._tick_n = PROFILE_TICK_SAMPLE
+            t = clock()
+        with self._universe_lock:
+            if t:
+                t = self._sp_lock.lap(t)
+            ct = self.contracts.get(str(data.get("token", "")))
+            if ct is None or not ct.active:
+                return
+            if self.watchdog is not None:
+                self.watchdog.seen(ct.slot)
+            v = dict_values(data)
+            if t:
+                t = self._sp_decode.lap(t)
+            self._dispatch(ct, v)
+            if t:
+                t = self._sp_publish.lap(t)
+            if self.shm is not None:
+                self.shm.update(ct.slot, v, top_of_book_from_dict(data))
+            if self.capture_depth and self.degrade < LEAN:
+                self._emit_depth(ct, v[0], depth_from_dict(data))
+            if t:
+                self._sp_side.lap(t)
+
+    def on_raw(self, wsapp, frame: bytes):
+        if self.recorder is not None:
+            self.recorder.write(frame)
+        if self.ticks is None:
+            # recording only: continue with the SDK parser
+            self.on_data(wsapp, self.sws._parse_binary_data(frame))
             return
+
+        t = 0
+        self._tick_n -= 1
+        if not self._tick_n:
+            self._tick_n = PROFILE_TICK_SAMPLE
+            t = clock()
+        with self._universe_lock:
+            if t:
+                t = self._sp_lock.lap(t)
+            slot = self.ticks.decode_into(frame)
+            if slot < 0:
+                return
+            ct = self.contracts.by_slot[slot]
+            if not ct.active:
+                return  # unsubscribed by the universe refresher; late frame
+            if self.watchdog is not None:
+                self.watchdog.seen(slot)
+            v = self.ticks.values(slot)
+            if t:
+                t = self._sp_decode.lap(t)
+            self._dispatch(ct, v)
+            if t:
+                t = self._sp_publish.lap(t)
+            if self.shm is not None:
+                self.shm.update(slot, v, top_of_book_from_frame(self.ticks.raw(slot)))
+            if self.capture_depth and self.degrade < LEAN:
+                self._emit_depth(ct, v[0], depth_from_frame(self.ticks.raw(slot)))
+            if t:
+                self._sp_side.lap(t)
@@ -0,0 +1,171 @@
+"""
+Producer emit path: ContractRegistry (slot-indexed, pre-stringified templates)
+vs the previous opt_meta dict-of-dicts payload build. No Redis: XADDs go to a
+counting sink, so only the per-tick Python cost is measured.
+
+  python bench_contracts.py [contracts] [ticks]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from app.contracts import ContractRegistry
+from app.tick_decoder import TickSlots
+from app.utils import now_ms
+from app.ws_producer import MarketDataProducer, _num, _px
+
+
+class Sink:
+    def __init__(self, keep: int = 0):
+        self.n = 0
+        self.keep = keep
+        self.payloads = []
+
+    def xadd(self, stream, payload, maxlen):
+        self.n += 1
+        if len(self.payloads) < self.keep:
+            self.payloads.append(payload)
+
+
+def synth_contracts(n: int, rnd: random.Random) -> list:
+    out = []
+    unders = [f"U{i:03d}" for i in range(max(1, n // 40))]
+    for i in range(n):
+        u = unders[i % len(unders)]
+        strike = 100 + 5 * (i // (2 * len(unders)))
+        cp = "CE" if i % 2 == 0 else "PE"
+        out.append({
+            "token": str(50000 + i), "underlying": u, "tradingsymbol": f"{u}26JAN{strike}{cp}",
+            "expiry": "2026-01-27", "strike": float(strike), "cp": cp, "exchange": "NFO",
+        })
+    return out
+
+
+def legacy_emit_opt(opt_meta: dict, eq_token_to_symbol: dict, rs, tok: str, v: tuple):
+    # the producer's emit before the registry: lookups by string token, payload rebuilt per tick
+    if tok in eq_token_to_symbol:
+        return
+    if tok not in opt_meta:
+        return
+    meta = opt_meta.get(tok)
+    ts_exch, ltp_p, o, h, l, c, vol, tbq, tsq, oi = v
+    payload = {
+        "ts_recv": str(now_ms()),
+        "ts_exch": _num(ts_exch),
+        "token": tok,
+        "underlying": meta["underlying"],
+        "tradingsymbol": meta["tradingsymbol"],
+        "expiry": meta["expiry"],
+        "strike": str(meta["strike"]),
+        "cp": meta["cp"],
+        "ltp": _px(ltp_p),
+        "oi": _num(oi),
+        "vol": _num(vol),
+        "o": _px(o),
+        "h": _px(h),
+        "l": _px(l),
+        "c": _px(c),
+        "tbq": _num(tbq),
+        "tsq": _num(tsq),
+    }
+    rs.xadd("md:ticks:opt", payload, maxlen=1)
+
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * 4
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def footprint(build) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2500
+    n_ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 300_000
+    rnd = random.Random(11)
+    contracts = synth_contracts(n, rnd)
+
+    rss0 = rss_kb()
+    opt_meta, meta_bytes = footprint(lambda: {c["token"]: dict(c) for c in contracts})
+
+    def build_registry():
+        reg = ContractRegistry()
+        for c in contracts:
+            reg.register_option(c)
+        return reg
+    reg, reg_bytes = footprint(build_registry)
+
+    ticks = TickSlots(capacity=n)
+    for c in reg.by_slot:
+        ticks.register(c.token)
+    print(f"contracts={n}  opt_meta dicts: {meta_bytes / 1024:.0f} KiB  "
+          f"registry (incl. payload templates): {reg_bytes / 1024:.0f} KiB  "
+          f"TickSlots: {ticks.rows.nbytes / 1024:.0f} KiB  process RSS: {rss_kb() / 1024:.1f} MiB "
+          f"(+{(rss_kb() - rss0) / 1024:.1f} MiB)")
+
+    # one stream of (slot, values) as the native decoder hands them over: a random
+    # walk per contract, day open/close fixed, high/low move when breached
+    last = [rnd.randint(1000, 500000) for _ in range(n)]
+    day = [[p, p, p, p - 50] for p in last]   # open, high, low, prev close (paise)
+    seq = []
+    for i in range(n_ticks):
+        slot = rnd.randrange(n)
+        px = last[slot] = max(5, last[slot] + rnd.randint(-20, 20))
+        d = day[slot]
+        d[1], d[2] = max(d[1], px), min(d[2], px)
+        seq.append((slot, (1_760_000_000_000 + i, px, d[0], d[1], d[2], d[3],
+                           1000 + i, float(rnd.randint(0, 10**6)), float(rnd.randint(0, 10**6)),
+                           rnd.randint(0, 10**7))))
+
+    # same payloads as before (ts_recv aside)
+    a, b = Sink(keep=5000), Sink(keep=5000)
+    p0 = MarketDataProducer.__new__(MarketDataProducer)
+    p0.contracts, p0.rs, p0.publisher, p0.spot_ltp, p0.degrade = build_registry(), b, None, {}, 0
+    for slot, v in seq[:5000]:
+        legacy_emit_opt(opt_meta, {}, a, ticks.tokens[slot], v)
+        p0._dispatch(p0.contracts.by_slot[slot], v)
+    same = sum(
+        list(x.items())[1:] == list(y.items())[1:] and list(x) == list(y)
+        for x, y in zip(a.payloads, b.payloads)
+    )
+    print(f"payloads identical to legacy (field order + values, ts_recv aside): {same}/{len(a.payloads)}")
+
+    sink = Sink()
+    p = MarketDataProducer.__new__(MarketDataProducer)  # emit path only, no WS / ScripMaster
+    p.contracts, p.rs, p.publisher, p.spot_ltp, p.degrade = reg, sink, None, {}, 0
+    eq_map = {}
+    tokens = ticks.tokens
+
+    gc.collect()
+    t0 = time.perf_counter()
+    for slot, v in seq:
+        legacy_emit_opt(opt_meta, eq_map, sink, tokens[slot], v)
+    t_legacy = time.perf_counter() - t0
+
+    by_slot = reg.by_slot
+    gc.collect()
+    t0 = time.perf_counter()
+    for slot, v in seq:
+        p._dispatch(by_slot[slot], v)
+    t_reg = time.perf_counter() - t0
+
+    assert sink.n == 2 * n_ticks
+    print(f"ticks={n_ticks}")
+    print(f"legacy opt_meta emit:  {t_legacy / n_ticks * 1e9:7.0f} ns/tick")
+    print(f"ContractRegistry emit: {t_reg / n_ticks * 1e9:7.0f} ns/tick ({t_legacy / t_reg:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Measure active/standby producer failover (app/failover.py) against REDIS_URL.
+
+Two simulated nodes receive the same tick feed (the standby's copy slightly
+delayed, like a second WS connection) and publish through LeaderLease +
+DedupPublisher. The leader is then crashed (lease not released) or stopped
+cleanly, and the stream is checked for lost and duplicated ticks (the standby
+replays its buffer on takeover, so both should be 0).
+
+  python bench_failover.py [crash|clean] [ticks_per_sec]
+"""
+import random
+import sys
+import threading
+import time
+
+from app.failover import LeaderLease, DedupPublisher
+from app.redis_store import RedisStore
+
+STREAM = "bench:failover:ticks"
+LEASE_KEY = "bench:failover:leader"
+TOKENS = [str(1000 + i) for i in range(50)]
+
+
+class Node:
+    def __init__(self, name: str, delay_ms: float):
+        self.rs = RedisStore()
+        self.lease = LeaderLease(self.rs, key=LEASE_KEY, node_id=name)
+        self.pub = DedupPublisher(self.rs, self.lease)
+        self.delay_ms = delay_ms
+        self.first_publish = None
+        self.alive = True
+
+    def on_tick(self, tok: str, ts_exch: int, px: int):
+        if not self.alive:
+            return
+        payload = {"ts_recv": str(int(time.time() * 1000)), "ts_exch": str(ts_exch), "token": tok, "ltp": str(px / 100.0)}
+        if self.pub.xadd(STREAM, tok, payload, 1_000_000) and self.first_publish is None:
+            self.first_publish = time.time()
+
+
+def feed(nodes, rate: float, stop: threading.Event, sent: list):
+    rnd = random.Random(7)
+    seq = 0
+    interval = 1.0 / rate
+    nxt = time.time()
+    while not stop.is_set():
+        tok = TOKENS[seq % len(TOKENS)]
+        ts_exch = 1_700_000_000_000 + seq
+        px = rnd.randint(10_000, 20_000)
+        sent.append((time.time(), tok, ts_exch))
+        for n in nodes:
+            if n.delay_ms:
+                threading.Timer(n.delay_ms / 1000.0, n.on_tick, (tok, ts_exch, px)).start()
+            else:
+                n.on_tick(tok, ts_exch, px)
+        seq += 1
+        nxt += interval
+        time.sleep(max(0.0, nxt - time.time()))
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "crash"
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 500.0
+
+    rs = RedisStore()
+    rs.r.delete(STREAM, LEASE_KEY, *rs.r.keys(f"md:dedupe:{STREAM}:*"))
+
+    a = Node("node-a", 0.0)
+    a.lease.start()
+    time.sleep(0.2)
+    b = Node("node-b", 3.0)
+    b.lease.start()
+    print(f"[BENCH] leader={rs.r.get(LEASE_KEY)} mode={mode} rate={rate:.0f}/s lease={a.lease.ttl_ms}ms")
+
+    stop = threading.Event()
+    sent: list = []
+    t = threading.Thread(target=feed, args=([a, b], rate, stop, sent), daemon=True)
+    t.start()
+    time.sleep(2.0)
+
+    t_fail = time.time()
+    if mode == "clean":
+        a.lease.stop(release=True)
+    else:
+        a.alive = False                # process gone: no publish, no renew, no release
+        a.lease._stop.set()
+    while not b.lease.is_leader:
+        time.sleep(0.001)
+    t_take = time.time()
+    time.sleep(2.0)
+    stop.set()
+    t.join()
+    time.sleep(0.1)
+
+    entries = rs.r.xrange(STREAM)
+    keys = [(f["token"], f["ts_exch"]) for _, f in entries]
+    uniq = set(keys)
+    lost = [s for s in sent if (s[1], str(s[2])) not in uniq]
+    lost_after_takeover = [s for s in lost if s[0] > t_take + 0.01]
+
+    print(f"[BENCH] failover: lease acquired by standby after {(t_take - t_fail) * 1000:.0f} ms, "
+          f"first standby publish after {((b.first_publish or t_take) - t_fail) * 1000:.0f} ms")
+    print(f"[BENCH] ticks sent={len(sent)} in stream={len(keys)} unique={len(uniq)} "
+          f"duplicates={len(keys) - len(uniq)} lost={len(lost)} (after takeover: {len(lost_after_takeover)})")
+    print(f"[BENCH] node-a published={a.pub.published} dup_skipped={a.pub.duplicates}; "
+          f"node-b published={b.pub.published} (replayed {b.pub.replayed}) dup_skipped={b.pub.duplicates}")
+    b.lease.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Joiner core (OptionsGreeksJoiner.join_batch): batch join against the
+GreeksTable vs the previous per-message join (lower-case copy, pipelined
+HMGET + json.loads per batch, five str() conversions per row). No Redis:
+greeks hashes sit in an in-memory stand-in, so only the Python cost per
+message is measured.
+
+  python bench_joiner.py [contracts] [batches] [batch_size]
+"""
+import gc
+import json
+import random
+import sys
+import time
+
+from app.joiner import GREEKS_HASH_PREFIX, GREEKS_UPDATED_KEY, GreeksTable, OptionsGreeksJoiner, _lower_keys
+from app.features import RollingFeatureEngine, tick_numbers
+from app.profiling import Stage
+from app.utils import option_contract_key
+
+
+class MemRedis:
+    """
+    hgetall / hmget / pipeline over a dict of hashes.
+    """
+    def __init__(self, hashes: dict):
+        self.hashes = hashes
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, keys):
+        h = self.hashes.get(key, {})
+        return [h.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        return MemPipe(self)
+
+
+class MemPipe:
+    def __init__(self, r):
+        self.r = r
+        self.calls = []
+
+    def hgetall(self, key):
+        self.calls.append((self.r.hgetall, (key,)))
+
+    def hmget(self, key, keys):
+        self.calls.append((self.r.hmget, (key, keys)))
+
+    def execute(self):
+        out = [fn(*args) for fn, args in self.calls]
+        self.calls = []
+        return out
+
+
+def legacy_join(r, features, msgs):
+    # the joiner's loop before join_batch: per-message copies, greeks fetched and decoded per batch
+    rows = [_lower_keys(fields) for _msg_id, fields in msgs]
+    wanted = {}
+    for f in rows:
+        underlying, expiry = f.get("underlying", ""), f.get("expiry", "")
+        if not (underlying and expiry):
+            continue
+        keys = wanted.setdefault((str(underlying), str(expiry)), [])
+        tsym = f.get("tradingsymbol", "")
+        if tsym:
+            keys.append(str(tsym))
+        alt = option_contract_key(f.get("strike"), f.get("cp"))
+        if alt:
+            keys.append(alt)
+    groups = [(k, list(dict.fromkeys(v))) for k, v in wanted.items() if v]
+    pipe = r.pipeline(transaction=False)
+    for (underlying, expiry), keys in groups:
+        pipe.hmget(f"{GREEKS_HASH_PREFIX}:{underlying}:{expiry}", keys)
+    found, decoded = {}, {}
+    for ((underlying, expiry), keys), vals in zip(groups, pipe.execute()):
+        for key, raw in zip(keys, vals):
+            if not raw:
+                continue
+            if raw not in decoded:
+                try:
+                    decoded[raw] = json.loads(raw) or {}
+                except Exception:
+                    decoded[raw] = {}
+            found[(underlying, expiry, key)] = decoded[raw]
+
+    outs = []
+    for (_msg_id, fields), f in zip(msgs, rows):
+        u, e = str(f.get("underlying", "")), str(f.get("expiry", ""))
+        greeks = found.get((u, e, str(f.get("tradingsymbol", ""))))
+        if greeks is None:
+            greeks = found.get((u, e, option_contract_key(f.get("strike"), f.get("cp"))), {})
+        out = dict(fields)
+        out["iv"] = str(greeks.get("iv") or greeks.get("impliedvolatility") or "")
+        out["delta"] = str(greeks.get("delta") or "")
+        out["gamma"] = str(greeks.get("gamma") or "")
+        out["theta"] = str(greeks.get("theta") or "")
+        out["vega"] = str(greeks.get("vega") or "")
+        if features is not None:
+            out.update(zip(features.names, features.update(str(f.get("token", "")), *tick_numbers(f))))
+        outs.append(out)
+    return outs
+
+
+def synth(n: int, rnd: random.Random):
+    contracts, hashes = [], {}
+    unders = [f"U{i:02d}" for i in range(max(1, n // 200))]
+    for i in range(n):
+        u = unders[i % len(unders)]
+        strike = 100 + 5 * (i // (2 * len(unders)))
+        cp = "CE" if i % 2 == 0 else "PE"
+        c = {"token": str(50000 + i), "underlying": u, "tradingsymbol": f"{u}26JAN{strike}{cp}",
+             "expiry": "2026-01-27", "strike": str(float(strike)), "cp": cp, "exchange": "NFO"}
+        contracts.append(c)
+        g = {"tradingsymbol": c["tradingsymbol"], "strikeprice": c["strike"], "optiontype": cp,
+             "impliedvolatility": f"{rnd.uniform(10, 40):.2f}", "delta": f"{rnd.uniform(-1, 1):.4f}",
+             "gamma": f"{rnd.uniform(0, 0.01):.6f}", "theta": f"{-rnd.uniform(0, 20):.4f}",
+             "vega": f"{rnd.uniform(0, 30):.4f}"}
+        hashes.setdefault(f"{GREEKS_HASH_PREFIX}:{u}:2026-01-27", {})[c["tradingsymbol"]] = \
+            json.dumps(g, separators=(",", ":"), sort_keys=True)
+    hashes[GREEKS_UPDATED_KEY] = {f"{u}:2026-01-27": "1767240000000" for u in unders}
+    return contracts, hashes
+
+
+def new_joiner(r, features):
+    j = OptionsGreeksJoiner.__new__(OptionsGreeksJoiner)  # join core only, no streams / groups
+    j.r, j._meta, j._lower_ok, j.surface, j.features = r, {}, set(), None, features
+    j.greeks = GreeksTable(r)
+    j._sp_meta, j._sp_greeks, j._sp_build = Stage("meta"), Stage("greeks"), Stage("build")
+    return j
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_batches = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    rnd = random.Random(5)
+    contracts, hashes = synth(n, rnd)
+    r = MemRedis(hashes)
+
+    batches = []
+    for b in range(n_batches):
+        msgs = []
+        for i in range(size):
+            c = contracts[rnd.randrange(n)]
+            msgs.append((f"{b}-{i}", {"ts_recv": str(1767240000000 + b * 1000 + i), "ts_exch": str(1767240000000 + b * 1000),
+                                      **c, "ltp": f"{rnd.uniform(1, 500):.2f}", "oi": str(rnd.randint(0, 10**6)),
+                                      "vol": str(b * size + i), "tbq": str(rnd.randint(0, 10**5)),
+                                      "tsq": str(rnd.randint(0, 10**5))}))
+        batches.append(msgs)
+    total = n_batches * size
+
+    def fresh(msgs):
+        # join_batch writes into the message dicts
+        return [(msg_id, dict(fields)) for msg_id, fields in msgs]
+
+    same = sum(a == b and list(a) == list(b) for msgs in batches[:5]
+               for a, b in zip(legacy_join(r, None, msgs), new_joiner(r, None).join_batch(fresh(msgs))))
+    print(f"contracts={n}  batches={n_batches} x {size}")
+    print(f"rows identical to the per-message join (fields, order, values): {same}/{5 * size}")
+
+    for label, with_features in (("join only", False), ("join + features", True)):
+        res = {}
+        for name in ("legacy", "batch"):
+            features = RollingFeatureEngine() if with_features else None
+            j = new_joiner(r, features)
+            run = (lambda msgs: legacy_join(r, features, msgs)) if name == "legacy" else j.join_batch
+            run(fresh(batches[0]))  # warm: greeks table loaded, tokens resolved
+            todo = [fresh(msgs) for msgs in batches]
+            gc.collect()
+            t0 = time.perf_counter()
+            for msgs in todo:
+                run(msgs)
+            res[name] = (time.perf_counter() - t0) / total
+        print(f"{label:>16}: per-message {res['legacy'] * 1e9:6.0f} ns/msg   "
+              f"batch {res['batch'] * 1e9:6.0f} ns/msg ({res['legacy'] / res['batch']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Training-set export (app/ml_export.py) over a synthetic md:features:opt lake.
+
+Writes `days` x `underlyings` partitions of Poisson ticks (contracts with mean
+gaps from 0.3 s to 20 s, a few missing greeks), exports them with
+EXPORT_WORKERS processes and reads shuffled batches back off the mmap
+(the page cache is warm right after the export).
+
+  python bench_ml_export.py [days] [underlyings] [contracts] [hours]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.config import STREAM_OPT_FEATURES
+from app.hot_tier import stream_folder
+from app.ml_export import WindowDataset, export_windows
+
+FEATURES = ["ltp", "oi", "vol", "tbq", "tsq", "iv", "delta", "gamma", "theta", "vega", "ret_10t", "rv_30s", "imb_30s"]
+
+
+def write_lake(root: Path, days: int, underlyings: int, contracts: int, hours: float, rnd) -> int:
+    rows = 0
+    t_open = 1767240000000  # 2026-01-01 04:00 UTC
+    for d in range(days):
+        dt_str = f"2026-01-{d + 1:02d}"
+        for u in range(underlyings):
+            gap = np.exp(rnd.uniform(np.log(0.3), np.log(20.0), contracts))
+            n = rnd.poisson(hours * 3600 / gap)
+            tok = np.repeat(np.arange(contracts), n)
+            ts = t_open + d * 86_400_000 + (rnd.random(len(tok)) * hours * 3_600_000).astype(np.int64)
+            order = np.argsort(ts, kind="stable")
+            tok, ts = tok[order], ts[order]
+            cols = {"ts_recv": ts, "token": [str(40000 + u * 1000 + t) for t in tok.tolist()]}
+            for f in FEATURES:
+                v = rnd.standard_normal(len(tok))
+                if f in ("iv", "delta"):
+                    v[rnd.random(len(tok)) < 0.05] = np.nan
+                cols[f] = v
+            table = pa.table(cols)
+            folder = root / stream_folder(STREAM_OPT_FEATURES) / f"dt={dt_str}" / f"underlying=U{u}"
+            folder.mkdir(parents=True)
+            pq.write_table(table, folder / "part-0-1.parquet")
+            rows += len(tok)
+    return rows
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    underlyings = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    contracts = int(sys.argv[3]) if len(sys.argv) > 3 else 80
+    hours = float(sys.argv[4]) if len(sys.argv) > 4 else 2.0
+    rnd = np.random.default_rng(3)
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_ml_"))
+    try:
+        rows = write_lake(tmp / "lake", days, underlyings, contracts, hours, rnd)
+        print(f"lake: {days} days x {underlyings} underlyings x {contracts} contracts, {rows} rows")
+
+        t0 = time.perf_counter()
+        stats = export_windows(lake=str(tmp / "lake"), out_dir=str(tmp / "ml"), features=FEATURES,
+                               step_ms=1000, window=60, stride=5, ffill_ms=30_000)
+        sec = time.perf_counter() - t0
+        print(f"export: {stats} in {sec:.1f}s ({rows / sec / 1e6:.2f} M rows/s)")
+
+        ds = WindowDataset(str(tmp / "ml"))
+        nbytes = sum(s.nbytes for s in ds.shards)
+        print(f"dataset: {len(ds)} windows x {ds.window} steps x {len(ds.features)} features, {nbytes / 1e6:.0f} MB")
+        for label, kw in (("shuffled", {}), ("contiguous", {"contiguous": True})):
+            t0 = time.perf_counter()
+            n = 0
+            for x, ids in ds.batches(256, seed=1, **kw):
+                n += len(x)
+                x.sum()  # touch every value (contiguous batches are lazy views)
+            sec = time.perf_counter() - t0
+            print(f"batches(256) {label:>10}: {n / sec / 1e3:.0f} k windows/s, {nbytes / sec / 1e9:.2f} GB/s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Cost of app/profiling.py on a per-tick hot path: native frame decode plus the
+rolling feature update, timed as the producer does it (three stage laps on
+1 in PROFILE_TICK_SAMPLE ticks), on every tick, and with the stack sampler
+running (PROFILE_SAMPLE_MS).
+
+  python bench_profiling.py [ticks]
+"""
+import math
+import random
+import sys
+import time
+
+from app.config import PROFILE_TICK_SAMPLE, PROFILE_SAMPLE_MS
+from app.features import RollingFeatureEngine
+from app.profiling import Profiler, SAMPLER, clock
+from app.tick_decoder import TickSlots, MODE_SNAP
+from bench_tick_decoder import synth_frame
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rnd = random.Random(11)
+    tokens = [str(40000 + i) for i in range(500)]
+    frames = [synth_frame(MODE_SNAP, rnd.choice(tokens), rnd) for _ in range(n)]
+    prof = Profiler("bench")  # not started: nothing is published
+    sample_every = max(1, PROFILE_TICK_SAMPLE)
+    sp_decode = prof.stage("decode", sample_every)
+    sp_features = prof.stage("features", sample_every)
+    sp_rest = prof.stage("rest", sample_every)
+
+    def run(every):
+        ticks = TickSlots(capacity=len(tokens))
+        for tok in tokens:
+            ticks.register(tok)
+        feats = RollingFeatureEngine(capacity=len(tokens))
+        nan = math.nan
+        countdown = every
+        t0 = time.perf_counter()
+        for frame in frames:
+            t = 0
+            countdown -= 1
+            if not countdown:
+                countdown = every
+                t = clock()
+            slot = ticks.decode_into(frame)
+            v = ticks.values(slot)
+            if t:
+                t = sp_decode.lap(t)
+            feats.update(tokens[slot], float(v[0]), v[1] / 100.0, float(v[6]), nan, float(v[7]), float(v[8]))
+            if t:
+                t = sp_features.lap(t)
+            ticks.raw(slot)
+            if t:
+                sp_rest.lap(t)
+        return (time.perf_counter() - t0) / len(frames) * 1e9
+
+    run(0)  # warm up
+    # modes interleaved, best of 5 each (the machine's noise is larger than the effect)
+    modes = [("no spans", 0), (f"spans 1/{sample_every}", sample_every), ("spans every tick", 1)]
+    best = {label: run(every) for label, every in modes}
+    for _ in range(4):
+        for label, every in modes:
+            best[label] = min(best[label], run(every))
+    base = best["no spans"]
+    print(f"ticks={n}  no spans: {base:.0f} ns/tick")
+    for label, _every in modes[1:]:
+        print(f"{label:>18}: {best[label]:.0f} ns/tick ({(best[label] - base) / base:+.1%})")
+
+    SAMPLER.start(300, "bench")
+    time.sleep(0.05)
+    ns = min(run(0) for _ in range(5))
+    SAMPLER.stop()
+    SAMPLER._thread.join()
+    print(f"{'sampler @' + format(PROFILE_SAMPLE_MS, 'g') + ' ms':>18}: {ns:.0f} ns/tick ({(ns - base) / base:+.1%})")
+
+if __name__ == "__main__":
+    main()
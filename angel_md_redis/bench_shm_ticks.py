@@ -0,0 +1,130 @@
+"""
+Latest-tick reads: shared-memory table (app/shm_ticks.py) vs Redis GET / HGET.
+
+A writer process updates random slots as fast as it can while this process
+reads; every row carries an invariant (vol == ts_exch, ltp == ts_exch / 100)
+so a torn read would be counted.
+
+  python bench_shm_ticks.py [contracts] [reads]      # Redis at REDIS_URL
+"""
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.redis_store import RedisStore
+from app.shm_ticks import ShmTickReader, ShmTickWriter
+
+
+def writer_proc(path: str, n: int, ready, stop, counter):
+    w = ShmTickWriter(path, capacity=n)
+    for slot in range(n):
+        w.register(slot, str(60000 + slot), 1)
+    ready.set()
+    rnd = random.Random(3)
+    i = 0
+    while not stop.is_set():
+        for _ in range(1000):
+            i += 1
+            slot = rnd.randrange(n)
+            # v: (ts_exch, ltp paise, o, h, l, c, vol, tbq, tsq, oi)
+            w.update(slot, (i, i, 0, 0, 0, 0, i, 0, 0, slot), (i - 5, 10, i + 5, 20))
+        counter.value = i
+    w.close()
+
+
+def pct(lat: list) -> str:
+    a = np.array(lat) * 1e9
+    return f"p50 {np.percentile(a, 50):8.0f} ns  p99 {np.percentile(a, 99):8.0f} ns"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    path = os.path.join(tempfile.gettempdir() if not os.path.isdir("/dev/shm") else "/dev/shm", f"bench_ticks_{os.getpid()}")
+
+    ctx = mp.get_context("spawn")
+    ready, stop, counter = ctx.Event(), ctx.Event(), ctx.Value("q", 0)
+    proc = ctx.Process(target=writer_proc, args=(path, n, ready, stop, counter), daemon=True)
+    proc.start()
+    ready.wait(30)
+
+    r = ShmTickReader(path)
+    tokens = [str(60000 + i) for i in range(n)]
+    rnd = random.Random(5)
+    picks = [rnd.randrange(n) for _ in range(reads)]
+
+    torn = 0
+    lat = []
+    c0 = counter.value
+    t_start = time.perf_counter()
+    for slot in picks:
+        t0 = time.perf_counter()
+        d = r.get(tokens[slot])
+        lat.append(time.perf_counter() - t0)
+        if d["vol"] and (d["vol"] != d["ts_exch"] or abs(d["ltp"] - d["ts_exch"] / 100.0) > 1e-6 or d["oi"] != slot):
+            torn += 1
+    writes = counter.value - c0
+    el = time.perf_counter() - t_start
+    print(f"contracts={n} reads={reads}, writer did {writes / el:,.0f} updates/s meanwhile")
+    print(f"shm get(token) -> dict: {pct(lat)}  torn rows: {torn}")
+
+    lat = []
+    for slot in picks:
+        t0 = time.perf_counter()
+        r.read(slot)
+        lat.append(time.perf_counter() - t0)
+    print(f"shm read(slot) -> tuple: {pct(lat)}")
+
+    lat = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        snap = r.snapshot()
+        lat.append(time.perf_counter() - t0)
+    bad = int(((snap["vol"] != snap["ts_exch"]) & (snap["vol"] != 0)).sum())
+    print(f"shm snapshot() all {n} rows: {pct(lat)}  torn rows: {bad}")
+
+    stop.set()
+    proc.join(10)
+
+    rs = RedisStore()
+    try:
+        pipe = rs.pipeline()
+        for i, tok in enumerate(tokens):
+            pipe.set(f"bench:shm:{tok}", f'{{"ltp": {i}, "oi": {i}, "vol": {i}}}', ex=600)
+            pipe.hset(f"bench:shm:h:{tok}", mapping={"ltp": i, "oi": i, "vol": i})
+            pipe.expire(f"bench:shm:h:{tok}", 600)
+        pipe.execute()
+    except Exception as e:
+        print(f"Redis at REDIS_URL unavailable ({e!r}); skipping GET/HGET")
+        r.close()
+        os.unlink(path)
+        return
+
+    m = min(reads, 20_000)
+    for name, fn in (
+        ("Redis GET", lambda tok: rs.r.get(f"bench:shm:{tok}")),
+        ("Redis HGET", lambda tok: rs.r.hget(f"bench:shm:h:{tok}", "ltp")),
+        ("Redis HGETALL", lambda tok: rs.r.hgetall(f"bench:shm:h:{tok}")),
+    ):
+        lat = []
+        for slot in picks[:m]:
+            t0 = time.perf_counter()
+            fn(tokens[slot])
+            lat.append(time.perf_counter() - t0)
+        print(f"{name + ':':24s} {pct(lat)}")
+
+    pipe = rs.pipeline()
+    for tok in tokens:
+        pipe.delete(f"bench:shm:{tok}", f"bench:shm:h:{tok}")
+    pipe.execute()
+    r.close()
+    os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
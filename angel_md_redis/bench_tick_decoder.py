@@ -0,0 +1,110 @@
+"""
+Validate app/tick_decoder.py against SmartWebSocketV2's parser and time both.
+
+  python bench_tick_decoder.py                 # synthetic SNAP_QUOTE/QUOTE/LTP frames
+  python bench_tick_decoder.py frames.bin      # frames recorded with WS_RECORD_FRAMES=frames.bin
+"""
+import random
+import struct
+import sys
+import time
+
+from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+
+from app.tick_decoder import (
+    TickSlots, decode_frame, dict_values, frame_token, iter_frames,
+    LTP_DTYPE, QUOTE_DTYPE, MODE_LTP, MODE_QUOTE, MODE_SNAP,
+)
+
+
+def synth_frame(mode: int, token: str, rnd: random.Random) -> bytes:
+    px = rnd.randint(1_000, 5_000_000)
+    b = struct.pack("<BB25sqqq", mode, 2, token.encode(), rnd.randint(1, 10**9), 1_700_000_000_000 + rnd.randint(0, 10**7), px)
+    if mode == MODE_LTP:
+        return b
+    b += struct.pack(
+        "<qqqddqqqq",
+        rnd.randint(1, 500), px, rnd.randint(0, 10**8),
+        float(rnd.randint(0, 10**6)), float(rnd.randint(0, 10**6)),
+        px - 500, px + 900, px - 1200, px - 100,
+    )
+    if mode == MODE_QUOTE:
+        return b
+    b += struct.pack("<qqq", 1_700_000_000_000, rnd.randint(0, 10**7), rnd.randint(-100, 100))
+    for i in range(10):
+        b += struct.pack("<HqqH", 1 if i < 5 else 0, rnd.randint(1, 5000), px + (i - 5) * 5, rnd.randint(1, 50))
+    b += struct.pack("<qqqq", px * 2, px // 2, px * 3, px // 3)
+    return b
+
+
+def sdk_parser():
+    ws = SmartWebSocketV2.__new__(SmartWebSocketV2)  # parser only, no connection
+    return ws._parse_binary_data
+
+
+def validate(frames, parse) -> int:
+    bad = 0
+    for fr in frames:
+        ref = parse(fr)
+        rec = decode_frame(fr)
+        if rec is None:
+            continue
+        if str(ref["token"]) != frame_token(fr).decode():
+            bad += 1
+            continue
+        if int(rec["ltp"]) != ref["last_traded_price"] or int(rec["ts_exch"]) != ref["exchange_timestamp"]:
+            bad += 1
+            continue
+        if fr[0] >= MODE_QUOTE:
+            if (int(rec["vol"]), float(rec["tbq"]), int(rec["close"])) != (
+                ref["volume_trade_for_the_day"], ref["total_buy_quantity"], ref["closed_price"]
+            ):
+                bad += 1
+                continue
+        if fr[0] == MODE_SNAP:
+            buy = sorted((int(d["price"]), int(d["qty"])) for d in rec["depth"] if d["flag"] == 1)
+            ref_buy = sorted((d["price"], d["quantity"]) for d in ref.get("best_5_buy_data", []))
+            if int(rec["oi"]) != ref["open_interest"] or int(rec["uc"]) != ref["upper_circuit_limit"] or buy != ref_buy:
+                bad += 1
+    return bad
+
+
+def main():
+    rnd = random.Random(7)
+    tokens = [str(40000 + i) for i in range(2000)]
+    if len(sys.argv) > 1:
+        frames = list(iter_frames(sys.argv[1]))
+    else:
+        modes = [MODE_SNAP] * 8 + [MODE_QUOTE] + [MODE_LTP]
+        frames = [synth_frame(rnd.choice(modes), rnd.choice(tokens), rnd) for _ in range(100_000)]
+    print(f"frames={len(frames)} (ltp={sum(len(f) == LTP_DTYPE.itemsize for f in frames)}, "
+          f"quote={sum(len(f) == QUOTE_DTYPE.itemsize for f in frames)})")
+
+    parse = sdk_parser()
+    bad = validate(frames, parse)
+    print(f"validation vs SmartWebSocketV2: mismatches={bad}")
+
+    slots = TickSlots(capacity=len(tokens))
+    for fr in frames:
+        slots.register(frame_token(fr).decode())
+    bad_values = sum(slots.values(slots.decode_into(fr)) != dict_values(parse(fr)) for fr in frames)
+    print(f"TickSlots.values vs dict_values(SmartWebSocketV2): mismatches={bad_values}")
+
+    t0 = time.perf_counter()
+    for fr in frames:
+        dict_values(parse(fr))
+    t_sdk = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for fr in frames:
+        s = slots.decode_into(fr)
+        slots.values(s)
+    t_native = time.perf_counter() - t0
+
+    n = len(frames)
+    print(f"SmartWebSocketV2 parse + dict_values: {t_sdk / n * 1e6:.2f} us/frame")
+    print(f"TickSlots.decode_into + values:      {t_native / n * 1e6:.2f} us/frame ({t_sdk / t_native:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
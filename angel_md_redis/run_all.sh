@@ -37,6 +37,12 @@ start "greeks" python3 run_greeks_only.py
 # 3) Joiner: opt ticks + latest greeks -> features stream
 start "joiner" python3 run_joiner.py
 
+# 3a) IV smile fits: greeks -> md:volsurf
+start "volsurf" python3 run_vol_surface.py
+
+# 3b) Chain aggregates: opt ticks -> PCR / OI walls / max pain
+start "chain" python3 run_chain.py
+
 # 4) Archivers: Redis streams -> data_lake/stream=.../dt=YYYY-MM-DD/...
 start "arch_eq"       python3 run_archiver_all.py eq
 start "arch_opt"      python3 run_archiver_all.py opt
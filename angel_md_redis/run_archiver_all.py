@@ -1,3 +1,4 @@
+import os
 import sys
 from app.archiver import StreamParquetArchiver
 
@@ -6,15 +7,22 @@ STREAMS = {
     "opt": ("md:ticks:opt", "arch-opt-1", 8000),
     "greeks": ("md:greeks:snap", "arch-greeks-1", 2000),
     "features": ("md:features:opt", "arch-features-1", 5000),
+    "depth_eq": ("md:depth:eq", "arch-depth-eq-1", 5000),
+    "depth_opt": ("md:depth:opt", "arch-depth-opt-1", 8000),
+    "chain": ("md:chain:agg", "arch-chain-1", 2000),
 }
 
 def main():
     if len(sys.argv) < 2 or sys.argv[1] not in STREAMS:
-        print("Usage: python run_archiver_all.py [eq|opt|greeks|features]")
+        print(f"Usage: python run_archiver_all.py [{'|'.join(STREAMS)}] [shard]")
         raise SystemExit(1)
 
     key = sys.argv[1]
     stream, consumer, batch = STREAMS[key]
+    # opt with OPT_SHARDS > 1: one archiver per shard, e.g. run_archiver_all.py opt 3
+    shard = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if shard is not None:
+        consumer = f"{consumer}-s{shard}"
 
     StreamParquetArchiver(
         stream=stream,
@@ -24,6 +32,9 @@ def main():
         batch_size=batch,
         flush_sec=10,
         partition_by_symbol=True,
+        # intraday Arrow IPC hot tier instead of Parquet parts (compact with run_hot_compact.py)
+        hot_dir=os.getenv("ARCHIVE_HOT_DIR") or None,
+        shard=shard,
     ).run_forever()
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+"""
+I/O-bound pipelines on one event loop (app/redis_store.py AsyncRedisStore):
+joiners and the greeks poller share one process, one connection pool per
+Redis endpoint and one profiler per component.
+
+  python run_async.py [joiner[:SHARDS]] ... [greeks]
+
+  python run_async.py                        # one joiner (JOINER_SHARDS) + greeks poller
+  python run_async.py joiner:0,1 joiner:2,3  # two joiners over disjoint shards, no greeks
+"""
+import asyncio
+import sys
+
+from app.config import GREEKS_POLL_SEC, GREEKS_SCHEDULER
+from app.joiner import AsyncOptionsGreeksJoiner, CONSUMER, JOINER_SHARDS
+from app.profiling import Profiler
+from app.redis_store import AsyncRedisStore
+
+# Sleep between each underlying REST call to avoid rate limits
+PER_REQUEST_SLEEP = 0.12
+
+
+async def run_greeks(rs: AsyncRedisStore):
+    from app.angel_auth import login, session_manager
+    from app.greeks_poller import AsyncGreeksPoller, GreeksAuthError
+
+    print("[GREEKS] logging in...")
+    _, auth_token, _ = await asyncio.to_thread(login)
+    poller = AsyncGreeksPoller(auth_token=auth_token, rs=rs)
+
+    def on_refresh(_obj, token, _feed):
+        poller.auth_token = token
+
+    session_manager().start_refresher(on_refresh)
+    errors = 0
+    fetched = 0  # poller.fetched at the last error
+
+    print("[GREEKS] started. Waiting for md:active_expiry from producer...")
+    while True:
+        try:
+            active = await rs.hgetall("md:active_expiry")
+            if not active:
+                await asyncio.sleep(2)
+                continue
+            if GREEKS_SCHEDULER:
+                await poller.run_scheduled_async(lambda: rs.hgetall("md:active_expiry"))
+                continue
+            await poller.poll_once_async(active_expiry=active, per_request_sleep=PER_REQUEST_SLEEP)
+            errors = 0
+            await asyncio.sleep(GREEKS_POLL_SEC)
+        except Exception as e:
+            print("[GREEKS] error:", repr(e))
+            print("[GREEKS] re-login in 3s...")
+            await asyncio.sleep(3)
+            # run_scheduled_async only returns by raising: chains fetched since the last error end the streak
+            if poller.fetched > fetched:
+                errors = 0
+            fetched = poller.fetched
+            errors += 1
+            try:
+                _, auth_token, _ = await asyncio.to_thread(login, errors > 1 or isinstance(e, GreeksAuthError))
+                poller.auth_token = auth_token
+            except Exception as e2:
+                print("[GREEKS] relogin failed:", repr(e2))
+                await asyncio.sleep(5)
+
+
+async def main(args):
+    rs = AsyncRedisStore()
+    joiners = [a for a in args if a.split(":", 1)[0] == "joiner"]
+    prof = Profiler("joiner") if joiners else None
+    tasks = []
+    for i, arg in enumerate(joiners):
+        _, _, spec = arg.partition(":")
+        shards = [int(x) for x in spec.split(",") if x.strip()] or JOINER_SHARDS
+        consumer = CONSUMER if len(joiners) == 1 else f"{CONSUMER}-{i + 1}"
+        tasks.append(AsyncOptionsGreeksJoiner(shards, consumer, rs=rs, prof=prof).run())
+    if "greeks" in args:
+        tasks.append(run_greeks(rs))
+    if not tasks:
+        raise SystemExit(__doc__)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await rs.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(sys.argv[1:] or ["joiner", "greeks"]))
+    except KeyboardInterrupt:
+        print("\n[ASYNC] stopped by user.")
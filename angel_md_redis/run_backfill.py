@@ -0,0 +1,39 @@
+import sys
+import datetime as dt
+
+from app.config import load_symbols
+from app.angel_auth import login
+from app.backfill import CandleBackfiller, MAX_DAYS, equity_instruments, option_instruments
+from app.redis_store import RedisStore
+
+
+def main():
+    """
+    python run_backfill.py FROM TO [INTERVAL] [--options]
+
+    FROM/TO: YYYY-MM-DD (inclusive). INTERVAL defaults to ONE_MINUTE.
+    --options also fetches the option contracts the producer resolved (meta:opt:*).
+    Rerunning the same command resumes from the checkpoint.
+    """
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) < 2 or (len(args) > 2 and args[2] not in MAX_DAYS):
+        print(f"Usage: python run_backfill.py FROM TO [{'|'.join(MAX_DAYS)}] [--options]")
+        raise SystemExit(1)
+
+    start = dt.date.fromisoformat(args[0])
+    end = dt.date.fromisoformat(args[1])
+    interval = args[2] if len(args) > 2 else "ONE_MINUTE"
+
+    instruments = equity_instruments(load_symbols())
+    if "--options" in sys.argv:
+        instruments += option_instruments(RedisStore())
+
+    obj, _auth_token, _feed = login()
+    stats = CandleBackfiller(obj, interval=interval).run(instruments, start, end)
+    print(f"[BACKFILL] done: {stats}")
+    if stats["failed"]:
+        raise SystemExit(2)
+
+
+if __name__ == "__main__":
+    main()
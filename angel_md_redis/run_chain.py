@@ -0,0 +1,7 @@
+from app.chain import ChainAggregator
+
+def main():
+    ChainAggregator().run_forever()
+
+if __name__ == "__main__":
+    main()
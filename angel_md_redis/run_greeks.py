@@ -2,7 +2,7 @@ import time
 from app.config import ANGEL_CLIENT_CODE, ANGEL_API_KEY
 from app.angel_auth import login
 from app.ws_producer import MarketDataProducer
-from app.greeks_poller import GreeksPoller
+from app.greeks_poller import GreeksAuthError, GreeksPoller
 from app.config import load_symbols
 
 def main():
@@ -30,8 +30,19 @@ def main():
     while not producer.options_subscribed:
         time.sleep(1.0)
 
-    poller = GreeksPoller(auth_token=auth_token, active_expiry_by_underlying=producer.active_expiry_by_underlying)
-    poller.run_forever()
+    poller = GreeksPoller(auth_token=auth_token)
+    while True:
+        try:
+            poller.run_scheduled(lambda: dict(producer.active_expiry_by_underlying))
+        except Exception as e:
+            # rejected token or a run of failed polls: log in again and resume
+            print("[GREEKS] error:", repr(e))
+            time.sleep(3)
+            try:
+                _, poller.auth_token, _ = login(force=isinstance(e, GreeksAuthError))
+            except Exception as e2:
+                print("[GREEKS] relogin failed:", repr(e2))
+                time.sleep(5)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,15 @@
 import time
 
-from app.angel_auth import login
+from app.angel_auth import login, session_manager
 from app.redis_store import RedisStore
-from app.greeks_poller import GreeksPoller
+from app.greeks_poller import GreeksAuthError, GreeksPoller
 
 # If you already have these in app/config.py, import them from there instead
 try:
-    from app.config import GREEKS_POLL_SEC
+    from app.config import GREEKS_POLL_SEC, GREEKS_SCHEDULER
 except Exception:
     GREEKS_POLL_SEC = 5  # seconds between polling cycles
+    GREEKS_SCHEDULER = 0
 
 # Sleep between each underlying REST call to avoid rate limits
 PER_REQUEST_SLEEP = 0.12
@@ -21,6 +22,14 @@ def main():
     rs = RedisStore()
     poller = GreeksPoller(auth_token=auth_token)
 
+    def on_refresh(_obj, token, _feed):
+        poller.auth_token = token
+
+    # renew the session before it expires instead of waiting for a failed request
+    session_manager().start_refresher(on_refresh)
+    errors = 0
+    fetched = 0  # poller.fetched at the last error
+
     print("[GREEKS] started. Waiting for md:active_expiry from producer...")
 
     while True:
@@ -32,8 +41,14 @@ def main():
                 time.sleep(2)
                 continue
 
+            if GREEKS_SCHEDULER:
+                # Priority scheduler: REST budget goes to the most stale, most active chains
+                poller.run_scheduled(lambda: rs.hgetall("md:active_expiry"))
+                continue
+
             # Poll greeks once for all active underlyings/expiries
             poller.poll_once(active_expiry=active, per_request_sleep=PER_REQUEST_SLEEP)
+            errors = 0
 
             # Sleep between cycles
             time.sleep(GREEKS_POLL_SEC)
@@ -46,9 +61,16 @@ def main():
             print("[GREEKS] error:", repr(e))
             print("[GREEKS] re-login in 3s...")
             time.sleep(3)
+            # run_scheduled only returns by raising: chains fetched since the last error end the streak
+            if poller.fetched > fetched:
+                errors = 0
+            fetched = poller.fetched
+            errors += 1
             try:
-                _, auth_token, _ = login()
-                poller = GreeksPoller(auth_token=auth_token)
+                # first retry reuses the cached session (likely a network blip); repeated failures
+                # or a rejected token force a new one
+                _, auth_token, _ = login(force=errors > 1 or isinstance(e, GreeksAuthError))
+                poller.auth_token = auth_token
             except Exception as e2:
                 print("[GREEKS] relogin failed:", repr(e2))
                 time.sleep(5)
@@ -0,0 +1,56 @@
+import os
+import sys
+from datetime import datetime
+
+from app.catalog import Catalog
+from app.hot_tier import compact_hot_day, hot_days
+from run_archiver_all import STREAMS
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+HOT_DIR = os.getenv("ARCHIVE_HOT_DIR", "data_hot")
+OUT_DIR = "data_lake"
+
+
+def today_str() -> str:
+    tz_name = os.getenv("ARCHIVE_TZ", "UTC")
+    if ZoneInfo is None or tz_name.upper() == "UTC":
+        return datetime.utcnow().strftime("%Y-%m-%d")
+    return datetime.now(ZoneInfo(tz_name)).strftime("%Y-%m-%d")
+
+
+def main():
+    """
+    python run_hot_compact.py [eq|opt|greeks|features|depth_eq|depth_opt|chain|all] [YYYY-MM-DD]
+
+    Without a date, every finished day (before today in ARCHIVE_TZ) that has
+    hot segments is compacted, including late rows for days compacted before.
+    Today (or later) is refused: archivers are still appending to it.
+    """
+    which = sys.argv[1] if len(sys.argv) > 1 else "all"
+    if which != "all" and which not in STREAMS:
+        print("Usage: python run_hot_compact.py [eq|opt|greeks|features|depth_eq|depth_opt|chain|all] [YYYY-MM-DD]")
+        raise SystemExit(1)
+
+    keys = list(STREAMS) if which == "all" else [which]
+    today = today_str()
+    catalog = Catalog(OUT_DIR)
+
+    if len(sys.argv) > 2 and sys.argv[2] >= today:
+        # archivers still append to today's open segments; those rows would be unlinked unread
+        print(f"[HOT] refusing to compact {sys.argv[2]}: not finished yet (today is {today} in ARCHIVE_TZ)")
+        raise SystemExit(1)
+
+    for key in keys:
+        stream = STREAMS[key][0]
+        days = [sys.argv[2]] if len(sys.argv) > 2 else [d for d in hot_days(HOT_DIR, stream) if d < today]
+        for dt_str in days:
+            n = compact_hot_day(HOT_DIR, OUT_DIR, stream, dt_str, partition_by_symbol=True, catalog=catalog)
+            print(f"[HOT] compacted stream={stream} dt={dt_str} rows={n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import sys
+
+from app.config import EXPORT_DIR
+from app.ml_export import export_windows
+
+
+def main():
+    """
+    python run_ml_export.py [FROM] [TO] [--underlying=NIFTY,BANKNIFTY] [--out=DIR]
+
+    FROM/TO: YYYY-MM-DD (inclusive, default: every day in the lake).
+    Grid, window, stride, forward-fill and features come from EXPORT_* settings.
+    Rerunning skips (day, underlying) shards that are already exported.
+    """
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    if len(args) > 2:
+        print("Usage: python run_ml_export.py [FROM] [TO] [--underlying=SYM,...] [--out=DIR]")
+        raise SystemExit(1)
+
+    underlyings = [s.strip().upper() for s in opts.get("underlying", "").split(",") if s.strip()] or None
+    stats = export_windows(
+        dt_from=args[0] if args else None,
+        dt_to=args[1] if len(args) > 1 else None,
+        underlyings=underlyings,
+        out_dir=opts.get("out", EXPORT_DIR),
+    )
+    print(f"[EXPORT] done: {stats}")
+    if stats["failed"]:
+        raise SystemExit(2)
+
+
+if __name__ == "__main__":
+    main()
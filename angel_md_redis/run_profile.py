@@ -0,0 +1,51 @@
+import json
+import sys
+
+from app.config import PROFILE_SECONDS
+from app.profiling import CONTROL_PREFIX, SPANS_PREFIX
+from app.redis_store import RedisStore
+
+COMPONENTS = ("producer", "joiner", "greeks", "archiver")
+
+
+def show(r, component: str = "*") -> None:
+    for key in sorted(r.scan_iter(match=f"{SPANS_PREFIX}:{component}:*")):
+        h = r.hgetall(key)
+        tag = f" ({h['tag']})" if h.get("tag") else ""
+        print(f"{key}{tag}")
+        print(f"  {'stage':<10}{'calls':>9}{'items':>10}{'mean_us':>10}{'p50_us':>10}{'p99_us':>10}{'max_us':>10}{'busy':>8}")
+        for stage, raw in sorted(h.items()):
+            if stage in ("ts", "tag"):
+                continue
+            s = json.loads(raw)
+            print(f"  {stage:<10}{s['calls']:>9}{s['items']:>10}{s['mean_us']:>10}{s['p50_us']:>10}"
+                  f"{s['p99_us']:>10}{s['max_us']:>10}{s['busy']:>8.1%}")
+
+
+def main():
+    """
+    python run_profile.py show [producer|joiner|greeks|archiver]
+    python run_profile.py sample COMPONENT [SECONDS]
+
+    show: the latest stage timings of every running process (md:prof:spans:*).
+    sample: every process of COMPONENT dumps folded stacks to PROFILE_DIR
+    (also listed in md:events, type profile). SECONDS=0 stops a running sample.
+    """
+    args = sys.argv[1:]
+    if not args or args[0] not in ("show", "sample") or (args[0] == "sample" and (len(args) < 2 or args[1] not in COMPONENTS)):
+        print(f"Usage: python run_profile.py show [{'|'.join(COMPONENTS)}]\n"
+              f"       python run_profile.py sample [{'|'.join(COMPONENTS)}] [SECONDS]")
+        raise SystemExit(1)
+
+    r = RedisStore().r
+    if args[0] == "show":
+        show(r, args[1] if len(args) > 1 else "*")
+        return
+    seconds = args[2] if len(args) > 2 else str(PROFILE_SECONDS)
+    # EX: the key disappears again, so the same command triggers the next run
+    r.set(f"{CONTROL_PREFIX}:{args[1]}", seconds, ex=10)
+    print(f"[PROF] requested {seconds}s of stack samples from every {args[1]} process")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+from app.vol_surface import VolSurfaceFitter
+
+def main():
+    VolSurfaceFitter().run_forever()
+
+if __name__ == "__main__":
+    main()